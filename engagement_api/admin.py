@@ -1,6 +1,9 @@
 from django.contrib import admin
 
-from .models import SocialMediaProfile, AlertSettings, FollowerCountHistory, AlertNotification
+from .models import (
+    SocialMediaProfile, AlertSettings, Milestone,
+    FollowerCountHistory, FollowerCountBucket, AlertNotification
+)
 
 
 @admin.register(SocialMediaProfile)
@@ -19,6 +22,14 @@ class AlertSettingsAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
 
 
+@admin.register(Milestone)
+class MilestoneAdmin(admin.ModelAdmin):
+    list_display = ['profile', 'threshold', 'is_custom', 'fired_at', 'created_at']
+    list_filter = ['is_custom', 'fired_at']
+    search_fields = ['profile__username']
+    readonly_fields = ['created_at']
+
+
 @admin.register(FollowerCountHistory)
 class FollowerCountHistoryAdmin(admin.ModelAdmin):
     list_display = ['profile', 'follower_count', 'recorded_at']
@@ -26,11 +37,23 @@ class FollowerCountHistoryAdmin(admin.ModelAdmin):
     search_fields = ['profile__username']
     readonly_fields = ['recorded_at']
     date_hierarchy = 'recorded_at'
+    # Counting every row of a large history table on each changelist page is expensive
+    show_full_result_count = False
+
+
+@admin.register(FollowerCountBucket)
+class FollowerCountBucketAdmin(admin.ModelAdmin):
+    list_display = ['profile', 'resolution', 'bucket_start', 'min_count', 'max_count', 'last_count', 'samples']
+    list_filter = ['resolution']
+    search_fields = ['profile__username']
+    show_full_result_count = False
 
 
 @admin.register(AlertNotification)
 class AlertNotificationAdmin(admin.ModelAdmin):
-    list_display = ['profile', 'milestone_followers', 'follower_count_at_alert', 'telegram_sent', 'sent_at']
-    list_filter = ['telegram_sent', 'sent_at']
+    list_display = [
+        'profile', 'milestone_followers', 'follower_count_at_alert', 'telegram_sent', 'delivery_status', 'sent_at'
+    ]
+    list_filter = ['telegram_sent', 'delivery_status', 'sent_at']
     search_fields = ['profile__username', 'message']
-    readonly_fields = ['sent_at']
+    readonly_fields = ['sent_at', 'delivery_attempts', 'last_error']
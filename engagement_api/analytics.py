@@ -0,0 +1,341 @@
+"""
+Vectorized follower analytics
+The history of any number of profiles is read with one query into flat
+NumPy arrays ordered by (profile, time), and every statistic is computed on
+those arrays at once: per profile segments are told apart by index, never
+by a Python loop. Periods reaching past the raw history retention start in
+the hourly or daily buckets and continue with raw history past the last
+compaction, like follower_changes.
+
+For each point: the moving average and growth rate over the trailing
+``window`` and an anomaly flag, raised when the growth rate since the
+previous point is more than ANOMALY_THRESHOLD robust deviations away from
+the profile's median rate, unless the rates hardly spread at all. For each
+profile: the least squares trend over the period and, from it, when the
+next milestone of its AlertSettings (milestone_followers or the next
+milestone_step multiple) will be reached.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db import connections
+from django.db.models import F, FloatField, Func
+
+from .compaction import RAW, history_tiers, watermarks
+from .models import FollowerCountHistory, FollowerCountBucket
+from .rollups import format_timestamp
+
+DEFAULT_ANALYTICS_PERIOD = '7d'
+DEFAULT_ANALYTICS_WINDOW = '24h'
+
+SECONDS_PER_DAY = 86400
+# Robust z-score above which a step is an anomaly
+ANOMALY_THRESHOLD = 3.5
+# Fewer steps than this give no meaningful spread, nothing is flagged
+MIN_ANOMALY_STEPS = 8
+# Scales the median absolute deviation, or else the mean absolute deviation, to a standard deviation
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+# Step rates spread less than this, in followers a day or as a share of the
+# profile's median rate, are steady growth: nothing is flagged
+MIN_ANOMALY_SPREAD = 1.0
+MIN_RELATIVE_SPREAD = 0.01
+
+PROFILE_FIELDS = ('id', 'username', 'platform', 'current_follower_count', 'last_checked')
+
+
+class Epoch(Func):
+    """
+    Seconds since the epoch of a datetime column, computed by the database:
+    decoding a datetime per row costs more than all the analytics
+    """
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='(julianday(%(expressions)s) - 2440587.5) * 86400.0', **extra_context
+        )
+
+
+def analytics_rows(profiles):
+    """Columns of ``profiles`` and their active alert settings needed by the analytics"""
+    return profiles.values(
+        *PROFILE_FIELDS,
+        milestone_followers=F('alert_settings__milestone_followers'),
+        milestone_step=F('alert_settings__milestone_step'),
+        alerts_active=F('alert_settings__is_active'),
+    ).order_by('id')
+
+
+def _tier_points(resolution, start, end):
+    """Points of one history tier from ``start`` up to ``end``, as (profile id, epoch, count, id)"""
+    if resolution == RAW:
+        rows = FollowerCountHistory.objects.filter(recorded_at__gte=start)
+        time_field, count_field = 'recorded_at', 'follower_count'
+    else:
+        rows = FollowerCountBucket.objects.filter(resolution=resolution, bucket_start__gte=start)
+        time_field, count_field = 'bucket_start', 'last_count'
+    if end is not None:
+        rows = rows.filter(**{f'{time_field}__lt': end})
+    # No model ordering: compound statements take none, load_series sorts the points
+    return rows.order_by().annotate(epoch=Epoch(time_field), count=F(count_field)).values_list(
+        'profile_id', 'epoch', 'count', 'id'
+    )
+
+
+def load_series(profiles, since, now):
+    """
+    History of ``profiles`` since ``since`` in one query, from each tier of
+    compaction.history_tiers joined with UNION ALL
+    Returns the tier the period starts in and arrays of profile ids,
+    seconds since the epoch and follower counts, ordered by (profile, time)
+    """
+    tiers = history_tiers(since, now, watermarks())
+    parts = [_tier_points(*tier).filter(profile_id__in=profiles.values('id')) for tier in tiers]
+    query = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    # Plain tuples straight from the cursor: the ORM's per value converters are not needed for numbers
+    with connections[query.db].cursor() as cursor:
+        cursor.execute(*query.query.sql_with_params())
+        points = cursor.fetchall()
+    resolution = tiers[0][0]
+    if not points:
+        return resolution, np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    profile_ids, times, counts, row_ids = np.array(points, dtype=np.float64).T
+    # Whole seconds: julianday() arithmetic leaves float noise that would show up as uneven steps
+    times = np.round(times)
+    # Tiers do not overlap in time, the row id only orders points of the same second
+    order = np.lexsort((row_ids, times, profile_ids))
+    return resolution, profile_ids[order].astype(np.int64), times[order], counts[order]
+
+
+def _segment_median(values, segments, segment_count):
+    """Median of ``values`` per segment, NaN for empty segments"""
+    order = np.lexsort((values, segments))
+    ordered = values[order]
+    sizes = np.bincount(segments, minlength=segment_count)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    medians = np.full(segment_count, np.nan)
+    present = sizes > 0
+    low = starts[present] + (sizes[present] - 1) // 2
+    high = starts[present] + sizes[present] // 2
+    medians[present] = (ordered[low] + ordered[high]) / 2
+    return medians
+
+
+def analyze(profile_ids, times, counts, window_seconds):
+    """
+    Per point and per profile statistics of load_series arrays
+    Returns (profile ids, point statistics, profile statistics), the
+    statistics being dicts of arrays aligned with the points and with the
+    profile ids respectively
+    """
+    size = len(counts)
+    if not size:
+        values, positions = np.zeros(0), np.zeros(0, dtype=np.int64)
+        points = {'moving_average': values, 'growth_rate': values, 'anomaly': np.zeros(0, dtype=bool)}
+        summary = {
+            **{name: positions for name in ('points', 'first', 'last', 'anomalies', 'last_anomaly')},
+            **{name: values for name in ('trend', 'growth_rate', 'growth_percentage', 'moving_average')},
+        }
+        return profile_ids, points, summary
+
+    boundaries = np.flatnonzero(np.diff(profile_ids)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [size]))
+    segment_count = len(starts)
+    segments = np.repeat(np.arange(segment_count), ends - starts)
+    index = np.arange(size)
+
+    # First point of each trailing window: segments are laid out on one time
+    # axis far enough apart that a window never reaches into the previous one
+    elapsed = times - times.min()
+    spacing = elapsed.max() + 2 * window_seconds + 1
+    axis = segments * spacing + elapsed
+    window_start = np.searchsorted(axis, axis - window_seconds, side='left')
+
+    totals = np.concatenate(([0.0], np.cumsum(counts)))
+    moving_average = (totals[index + 1] - totals[window_start]) / (index - window_start + 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        window_span = times - times[window_start]
+        window_change = counts - counts[window_start]
+        growth_rate = np.where(window_span > 0, window_change / window_span * SECONDS_PER_DAY, np.nan)
+        window_base = counts[window_start]
+        growth_percentage = np.where(
+            (window_span > 0) & (window_base > 0), window_change / window_base * 100, np.nan
+        )
+
+        # Growth rate of each step from the previous point of the same profile
+        step = np.zeros(size, dtype=bool)
+        step[1:] = segments[1:] == segments[:-1]
+        step_span = np.zeros(size)
+        step_span[1:] = times[1:] - times[:-1]
+        step &= step_span > 0
+        step_rate = np.full(size, np.nan)
+        step_rate[step] = (counts[step] - counts[np.flatnonzero(step) - 1]) / step_span[step] * SECONDS_PER_DAY
+
+    # Robust z-score of the step rates: distance from the profile's median
+    # in median absolute deviations, so the outliers do not mask themselves
+    step_segments = segments[step]
+    step_count = np.bincount(step_segments, minlength=segment_count)
+    median = _segment_median(step_rate[step], step_segments, segment_count)
+    deviation = np.abs(step_rate[step] - median[step_segments])
+    spread = MAD_SCALE * _segment_median(deviation, step_segments, segment_count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_deviation = np.bincount(step_segments, deviation, minlength=segment_count) / step_count
+    spread = np.where(spread > 0, spread, MEAN_AD_SCALE * mean_deviation)
+    anomaly = np.zeros(size, dtype=bool)
+    min_spread = np.maximum(MIN_ANOMALY_SPREAD, MIN_RELATIVE_SPREAD * np.abs(median))
+    flagged = (step_count[step_segments] >= MIN_ANOMALY_STEPS) & (spread >= min_spread)[step_segments]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        flagged &= deviation / spread[step_segments] > ANOMALY_THRESHOLD
+    anomaly[step] = flagged
+
+    # Least squares trend per profile, time in days before the profile's last point
+    last = ends - 1
+    days = (times - times[last][segments]) / SECONDS_PER_DAY
+    n = np.bincount(segments, minlength=segment_count).astype(np.float64)
+    sum_x = np.bincount(segments, days, minlength=segment_count)
+    sum_y = np.bincount(segments, counts, minlength=segment_count)
+    sum_xx = np.bincount(segments, days * days, minlength=segment_count)
+    sum_xy = np.bincount(segments, days * counts, minlength=segment_count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = n * sum_xx - sum_x * sum_x
+        trend = np.where(denominator > 0, (n * sum_xy - sum_x * sum_y) / denominator, np.nan)
+
+    last_anomaly = np.maximum.reduceat(np.where(anomaly, index, -1), starts)
+
+    points = {
+        'moving_average': moving_average,
+        'growth_rate': growth_rate,
+        'anomaly': anomaly,
+    }
+    summary = {
+        'points': n.astype(np.int64),
+        'first': starts,
+        'last': last,
+        'trend': trend,
+        'growth_rate': growth_rate[last],
+        'growth_percentage': growth_percentage[last],
+        'moving_average': moving_average[last],
+        'anomalies': np.bincount(segments, anomaly, minlength=segment_count).astype(np.int64),
+        'last_anomaly': last_anomaly,
+    }
+    return profile_ids[starts], points, summary
+
+
+def next_milestones(current, milestone_followers, milestone_step):
+    """
+    Next milestone above each current count, the nearer of
+    milestone_followers (when still ahead) and the next milestone_step
+    multiple; 0 when there is none.
+    Arguments are integer arrays, 0 standing for no setting.
+    """
+    followers = np.where(milestone_followers > current, milestone_followers, 0)
+    safe_step = np.where(milestone_step > 0, milestone_step, 1)
+    stepped = np.where(milestone_step > 0, (current // safe_step + 1) * safe_step, 0)
+    both = (followers > 0) & (stepped > 0)
+    return np.where(both, np.minimum(followers, stepped), np.maximum(followers, stepped))
+
+
+def _number(value, digits=2):
+    return None if np.isnan(value) else round(value, digits)
+
+
+def _timestamp(seconds):
+    # Epoch values are rounded to the second by load_series
+    return format_timestamp(datetime.fromtimestamp(round(seconds), tz=dt_timezone.utc))
+
+
+def profile_analytics(profiles, since, window, now, series=False):
+    """
+    Analytics payloads of ``profiles`` over the period since ``since``,
+    ``window`` (a timedelta) being the span of the moving averages and
+    growth rates. With ``series`` each payload lists its points too.
+    Three queries whatever the number of profiles.
+    Returns (resolution of the data read, payloads in profile id order).
+    """
+    rows = list(analytics_rows(profiles))
+    resolution, profile_ids, times, counts = load_series(profiles, since, now)
+    segment_ids, points, summary = analyze(profile_ids, times, counts, window.total_seconds())
+
+    # Segment of each profile row, -1 for profiles without points in the period
+    row_ids = np.array([row['id'] for row in rows], dtype=np.int64)
+    found = np.searchsorted(segment_ids, row_ids)
+    has_points = found < len(segment_ids)
+    has_points[has_points] = segment_ids[found[has_points]] == row_ids[has_points]
+    segment_of = np.where(has_points, found, -1)
+
+    # Next milestone and when the trend reaches it
+    current = np.array([row['current_follower_count'] for row in rows], dtype=np.int64)
+    milestone_followers = np.array(
+        [(row['milestone_followers'] or 0) if row['alerts_active'] else 0 for row in rows], dtype=np.int64
+    )
+    milestone_step = np.array(
+        [(row['milestone_step'] or 0) if row['alerts_active'] else 0 for row in rows], dtype=np.int64
+    )
+    targets = next_milestones(current, milestone_followers, milestone_step)
+    trend = np.full(len(rows), np.nan)
+    trend[has_points] = summary['trend'][segment_of[has_points]]
+    last_time = np.full(len(rows), np.nan)
+    last_time[has_points] = times[summary['last'][segment_of[has_points]]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reachable = (targets > 0) & (trend > 0)
+        milestone_days = np.where(reachable, (targets - current) / trend, np.nan)
+
+    summary = {name: values.tolist() for name, values in summary.items()}
+    points = {name: values.tolist() for name, values in points.items()}
+    times_list, counts_list = times.tolist(), counts.tolist()
+    segment_of, targets = segment_of.tolist(), targets.tolist()
+    milestone_days, last_time = milestone_days.tolist(), last_time.tolist()
+
+    payloads = []
+    for position, row in enumerate(rows):
+        segment = segment_of[position]
+        payload = {
+            'profile_id': row['id'],
+            'username': row['username'],
+            'platform': row['platform'],
+            'current_follower_count': row['current_follower_count'],
+            'last_checked': format_timestamp(row['last_checked']) if row['last_checked'] else None,
+            'points': 0,
+            'trend_per_day': None,
+            'growth_rate_per_day': None,
+            'growth_percentage': None,
+            'moving_average': None,
+            'anomalies': 0,
+            'last_anomaly_at': None,
+            'next_milestone': targets[position] or None,
+            'milestone_eta_days': None,
+            'milestone_projected_at': None,
+        }
+        if segment >= 0:
+            last_anomaly = summary['last_anomaly'][segment]
+            payload.update({
+                'points': summary['points'][segment],
+                'trend_per_day': _number(summary['trend'][segment]),
+                'growth_rate_per_day': _number(summary['growth_rate'][segment]),
+                'growth_percentage': _number(summary['growth_percentage'][segment]),
+                'moving_average': _number(summary['moving_average'][segment]),
+                'anomalies': summary['anomalies'][segment],
+                'last_anomaly_at': _timestamp(times_list[last_anomaly]) if last_anomaly >= 0 else None,
+            })
+            days = milestone_days[position]
+            if not np.isnan(days):
+                payload['milestone_eta_days'] = round(days, 2)
+                payload['milestone_projected_at'] = _timestamp(last_time[position] + days * SECONDS_PER_DAY)
+        if series:
+            first, last = (summary['first'][segment], summary['last'][segment] + 1) if segment >= 0 else (0, 0)
+            payload['series'] = [
+                {
+                    'recorded_at': _timestamp(times_list[point]),
+                    'follower_count': int(counts_list[point]),
+                    'moving_average': _number(points['moving_average'][point]),
+                    'growth_rate_per_day': _number(points['growth_rate'][point]),
+                    'anomaly': points['anomaly'][point],
+                }
+                for point in range(first, last)
+            ]
+        payloads.append(payload)
+    return resolution, payloads
@@ -0,0 +1,183 @@
+"""
+Async versions of the read endpoints, served under /api/async/
+They return the same JSON as the views in views.py but run as coroutines
+on the ASGI entry point (insight.asgi), so a request waiting on the database
+or the cache does not hold a worker thread. DRF's APIView dispatches
+synchronously: AsyncAPIView runs the same authentication, permission and
+throttle checks (the REST_FRAMEWORK defaults) in a worker thread and awaits
+the handler. The sync views remain the ones used under WSGI.
+"""
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .caching import cache_user_response
+from .insights import DEFAULT_TOP_PERIOD, atop_follower_changes, parse_limit, parse_period
+from .live import event_stream
+from .models import SocialMediaProfile, FollowerCountHistory, AlertNotification
+from .pagination import (
+    CursorPaginatedMixin, ProfileCursorPagination, NotificationCursorPagination, HistoryCursorPagination
+)
+from .payloads import (
+    HISTORY_FIELDS, history_payload, insights_payload, insights_rows, notification_payload, notification_rows
+)
+from .routing import read_from_replica
+from .serializers import SocialMediaProfileSerializer, TopFollowerInsightsSerializer
+
+
+class AsyncAPIView(APIView):
+    """
+    Base for the async read endpoints: APIView with async handlers, checked
+    and rendered as the DRF views are
+    """
+    http_method_names = ['get', 'head', 'options']
+    renderer_classes = [JSONRenderer]
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            # Authenticators and throttles use the ORM and the cache synchronously
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            method = request.method.lower()
+            handler = getattr(self, method, None) if method in self.http_method_names else None
+            if handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        return await sync_to_async(super().options)(request, *args, **kwargs)
+
+
+class AsyncProfileListView(CursorPaginatedMixin, AsyncAPIView):
+    query_budget = 3
+    serializer_class = SocialMediaProfileSerializer
+    pagination_class = ProfileCursorPagination
+
+    @cache_user_response
+    @read_from_replica
+    async def get(self, request):
+        return await self.apaginate(SocialMediaProfile.objects.filter(user=request.user).select_related('user'))
+
+
+class AsyncProfileDetailView(AsyncAPIView):
+    query_budget = 3
+    serializer_class = SocialMediaProfileSerializer
+
+    @read_from_replica
+    async def get(self, request, profile_id):
+        profile = await aget_object_or_404(
+            SocialMediaProfile.objects.select_related('user'), id=profile_id, user=request.user
+        )
+        return Response(self.serializer_class(profile).data)
+
+
+class AsyncEngagementInsightsView(AsyncAPIView):
+    query_budget = 3
+
+    @cache_user_response
+    @read_from_replica
+    async def get(self, request, profile_id=None):
+        rows = insights_rows(SocialMediaProfile.objects.filter(user=request.user))
+        owner = request.user.username
+
+        if profile_id:
+            return Response(insights_payload(await aget_object_or_404(rows, id=profile_id), owner))
+
+        return Response([insights_payload(row, owner) async for row in rows])
+
+
+class AsyncTopFollowerInsightsView(AsyncAPIView):
+    query_budget = 5
+    serializer_class = TopFollowerInsightsSerializer
+
+    @cache_user_response
+    @read_from_replica
+    async def get(self, request):
+        period, period_label = parse_period(request.GET.get('period', DEFAULT_TOP_PERIOD))
+        limit = parse_limit(request.GET.get('limit'))
+
+        now = timezone.now()
+        top_increases, top_decreases = await atop_follower_changes(
+            SocialMediaProfile.objects.filter(user=request.user),
+            since=now - period,
+            now=now,
+            limit=limit
+        )
+
+        serializer = self.serializer_class(data={
+            'top_increases': top_increases,
+            'top_decreases': top_decreases,
+            'period': period_label
+        })
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.data)
+
+
+class AsyncAlertNotificationsView(CursorPaginatedMixin, AsyncAPIView):
+    query_budget = 3
+    pagination_class = NotificationCursorPagination
+
+    @cache_user_response
+    @read_from_replica
+    async def get(self, request, notification_id=None):
+        notifications = notification_rows(AlertNotification.objects.filter(profile__user=request.user))
+
+        if notification_id:
+            return Response(notification_payload(await aget_object_or_404(notifications, id=notification_id)))
+
+        return await self.apaginate(notifications, notification_payload)
+
+
+class AsyncFollowerHistoryView(CursorPaginatedMixin, AsyncAPIView):
+    query_budget = 4
+    pagination_class = HistoryCursorPagination
+
+    @cache_user_response
+    @read_from_replica
+    async def get(self, request, profile_id):
+        profile = await aget_object_or_404(
+            SocialMediaProfile.objects.select_related('user'), id=profile_id, user=request.user
+        )
+        label = str(profile)
+        return await self.apaginate(
+            FollowerCountHistory.objects.filter(profile=profile).values(*HISTORY_FIELDS),
+            lambda row: history_payload(row, label)
+        )
+
+
+class LiveEventsView(AsyncAPIView):
+    """
+    Server-Sent Events stream of the user's follower count updates
+    ('counts' events) and milestone notifications ('notifications' events).
+    Browsers resume with the Last-Event-ID header; clients that cannot set
+    it pass ?last_event_id=.
+    """
+
+    async def get(self, request):
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        if last_event_id is not None:
+            try:
+                last_event_id = int(last_event_id)
+            except ValueError:
+                raise exceptions.ValidationError({'last_event_id': 'Must be an integer.'})
+
+        response = StreamingHttpResponse(
+            event_stream(request.user.pk, last_event_id), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Keep nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,39 @@
+"""
+Benchmarks for the engagement API, run with ``manage.py benchmark``
+Every suite seeds and measures against a throwaway test database, never
+against the configured one
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+
+from ..instrumentation import QueryTimer
+
+
+@contextmanager
+def isolated_database(verbosity=0):
+    """Create the test databases and test environment (for the test client) for the duration of the block"""
+    setup_test_environment()
+    old_config = setup_databases(verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
+        teardown_test_environment()
+
+
+def measure(func, repeat=5):
+    """Best wall time in seconds over ``repeat`` calls and the queries of one call"""
+    best = None
+    for _ in range(repeat):
+        counter = QueryTimer()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, counter.count
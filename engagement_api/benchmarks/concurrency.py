@@ -0,0 +1,119 @@
+"""
+Throughput of one process under concurrent load: the sync and the async
+insights endpoints are requested through the ASGI application, the way an
+ASGI server runs them, with increasing numbers of requests in flight.
+``db_latency`` delays every query, standing in for a database across the
+network; the response cache is disabled so each request does the full work
+"""
+import asyncio
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+
+from ..instrumentation import percentile
+
+# (sync path, async path) pairs compared
+ENDPOINTS = [
+    ('/api/insights/', '/api/async/insights/'),
+    ('/api/insights/top/?period=7d', '/api/async/insights/top/?period=7d'),
+]
+
+
+async def _get(application, path, headers):
+    """GET ``path`` through the ASGI application, returns the status code"""
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    request_sent = False
+    response = {}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; Django cancels this once it responded
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    await application(scope, receive, send)
+    return response.get('status')
+
+
+async def _load(application, path, headers, requests, concurrency):
+    in_flight = asyncio.Semaphore(concurrency)
+    timings = []
+    statuses = set()
+
+    async def request():
+        async with in_flight:
+            started = time.perf_counter()
+            statuses.add(await _get(application, path, headers))
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(request() for _ in range(requests)))
+    return time.perf_counter() - started, timings, statuses
+
+
+def run(requests=200, concurrency=(1, 8, 32), db_latency=0.0):
+    user = User.objects.filter(username__startswith='bench-user-').order_by('id').first()
+    client = Client()
+    client.force_login(user)
+    cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+    headers = [(b'host', b'testserver'), (b'cookie', cookie.encode())]
+    application = get_asgi_application()
+
+    def delay_queries(sender, connection, **kwargs):
+        # Requests run in threads of their own, each opening its own connection
+        def delayed(execute, sql, params, many, context):
+            time.sleep(db_latency)
+            return execute(sql, params, many, context)
+        connection.execute_wrappers.append(delayed)
+
+    if db_latency:
+        connection_created.connect(delay_queries)
+    results = []
+    try:
+        with override_settings(API_CACHE_TIMEOUT=0):
+            for paths in ENDPOINTS:
+                for level in concurrency:
+                    for mode, path in zip(('sync', 'async'), paths):
+                        seconds, timings, statuses = asyncio.run(
+                            _load(application, path, headers, requests, level)
+                        )
+                        results.append({
+                            'suite': 'concurrency',
+                            'mode': mode,
+                            'path': path,
+                            'concurrency': level,
+                            'requests': requests,
+                            'status': sorted(statuses),
+                            'seconds': round(seconds, 3),
+                            'requests_per_second': round(requests / seconds, 1),
+                            'p50_ms': round(percentile(timings, 0.5), 3),
+                            'p99_ms': round(percentile(timings, 0.99), 3),
+                            'db_latency_ms': db_latency * 1000,
+                        })
+    finally:
+        connection_created.disconnect(delay_queries)
+    return results
@@ -0,0 +1,84 @@
+"""
+Latency of every GET endpoint in engagement_api.urls, measured in-process
+with the test client as one seeded user, with the response cache disabled so
+each request does the full work
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from .. import urls
+from ..instrumentation import QueryTimer, percentile
+from ..models import AlertSettings, AlertNotification
+
+# Query strings measured in addition to each endpoint's bare URL
+VARIANTS = {
+    'top-insights': ['?period=7d', '?period=30d&limit=20'],
+    'history-export': ['?output=csv'],
+}
+# Endpoints that never finish a response, or take no GET
+SKIPPED = {'async-events', 'profile-bulk', 'alert-bulk'}
+
+
+def _paths(user):
+    """(name, path) of every endpoint, URL arguments taken from the user's own data"""
+    alert = AlertSettings.objects.filter(profile__user=user).first()
+    notification = AlertNotification.objects.filter(profile__user=user).first()
+    profile = user.profiles.first()
+    arguments = {
+        'profile_id': profile.id if profile else None,
+        'alert_id': alert.id if alert else None,
+        'notification_id': notification.id if notification else None,
+    }
+
+    paths = []
+    for pattern in urls.urlpatterns:
+        if pattern.name in SKIPPED:
+            continue
+        kwargs = {name: arguments.get(name) for name in pattern.pattern.converters}
+        if None in kwargs.values():
+            continue
+        path = reverse(f'{urls.app_name}:{pattern.name}', kwargs=kwargs)
+        paths.append((pattern.name, path))
+        paths.extend((pattern.name, path + query) for query in VARIANTS.get(pattern.name, []))
+    return paths
+
+
+def run(requests=50):
+    # Profiles are spread evenly over the seeded users; staff so the metrics endpoint is measured too
+    user = User.objects.filter(username__startswith='bench-user-').order_by('id').first()
+    user.is_staff = True
+    user.save(update_fields=['is_staff'])
+    client = Client()
+    client.force_login(user)
+
+    results = []
+    with override_settings(API_CACHE_TIMEOUT=0):
+        for name, path in _paths(user):
+            timings = []
+            for _ in range(requests):
+                counter = QueryTimer()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    if response.streaming:
+                        size = sum(len(chunk) for chunk in response.streaming_content)
+                    else:
+                        size = len(response.content)
+                    timings.append((time.perf_counter() - started) * 1000)
+            results.append({
+                'suite': 'endpoints',
+                'endpoint': name,
+                'path': path,
+                'status': response.status_code,
+                'requests': requests,
+                'p50_ms': round(percentile(timings, 0.5), 3),
+                'p99_ms': round(percentile(timings, 0.99), 3),
+                'mean_ms': round(sum(timings) / len(timings), 3),
+                'queries': counter.count,
+                'size': size,
+            })
+    return results
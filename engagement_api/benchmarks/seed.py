@@ -0,0 +1,115 @@
+"""
+Synthetic data for the benchmarks
+Generates users, profiles, alert settings, notifications and a follower
+count history for every profile, all derived from ``seed`` so two runs at
+the same scale produce the same data. History is written with the bulk
+ingest path (COPY on PostgreSQL, batched INSERTs elsewhere), then rolled up
+and compacted the way the running system would
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from ..compaction import compact_daily, compact_hourly
+from ..ingest import insert_history_rows
+from ..models import SocialMediaProfile, AlertSettings, AlertNotification
+from ..rollups import rebuild_rollups
+
+BATCH_SIZE = 5000
+
+
+def _trajectory(rng, days, points_per_day, now):
+    """(recorded_at, count) points of one profile, a noisy linear trend"""
+    count = rng.randint(100, 200000)
+    daily_growth = count * rng.uniform(-0.002, 0.01)
+    step = timedelta(days=1) / points_per_day
+    start = now - timedelta(days=days)
+    points = []
+    for i in range(days * points_per_day):
+        value = count + daily_growth * i / points_per_day + rng.gauss(0, max(1.0, count * 0.0005))
+        points.append((start + step * i, max(0, int(value))))
+    return points
+
+
+def seed(profiles=1000, users=100, history_days=30, points_per_day=4, alert_ratio=0.5, seed=0):
+    """Create the dataset, returns what was created and how long it took"""
+    rng = random.Random(seed)
+    now = timezone.now().replace(microsecond=0)
+    started = time.monotonic()
+    users = max(1, min(users, profiles))
+
+    User.objects.bulk_create(
+        [User(username=f'bench-user-{i}', password='!') for i in range(users)], batch_size=BATCH_SIZE
+    )
+    user_ids = list(User.objects.filter(username__startswith='bench-user-').order_by('id').values_list('id', flat=True))
+
+    history_rows = 0
+    for offset in range(0, profiles, BATCH_SIZE):
+        trajectories = [
+            _trajectory(rng, history_days, points_per_day, now)
+            for _ in range(offset, min(profiles, offset + BATCH_SIZE))
+        ]
+        with transaction.atomic():
+            created = SocialMediaProfile.objects.bulk_create([
+                SocialMediaProfile(
+                    user_id=user_ids[(offset + i) % users],
+                    platform='twitter' if (offset + i) % 2 else 'instagram',
+                    username=f'bench{offset + i}',
+                    current_follower_count=points[-1][1] if points else 0,
+                    last_checked=now if points else None,
+                )
+                for i, points in enumerate(trajectories)
+            ])
+            # SQLite and PostgreSQL both return the new primary keys
+            profile_ids = [profile.id for profile in created]
+
+            rows = [
+                (profile_id, count, recorded_at)
+                for profile_id, points in zip(profile_ids, trajectories)
+                for recorded_at, count in points
+            ]
+            for start in range(0, len(rows), BATCH_SIZE):
+                insert_history_rows(rows[start:start + BATCH_SIZE])
+            history_rows += len(rows)
+
+            alerted = [
+                (profile_id, points[-1][1] if points else 0)
+                for profile_id, points in zip(profile_ids, trajectories)
+                if rng.random() < alert_ratio
+            ]
+            AlertSettings.objects.bulk_create([
+                AlertSettings(
+                    profile_id=profile_id,
+                    milestone_followers=(count // 1000 + 1) * 1000,
+                    telegram_chat_id=str(profile_id) if profile_id % 2 else None,
+                )
+                for profile_id, count in alerted
+            ])
+            AlertNotification.objects.bulk_create([
+                AlertNotification(
+                    profile_id=profile_id,
+                    milestone_followers=count // 1000 * 1000,
+                    follower_count_at_alert=count,
+                    message='Benchmark milestone',
+                )
+                for profile_id, count in alerted
+            ])
+
+        rebuild_rollups(profile_ids, now)
+
+    compact_hourly(max_buckets=history_days * 24 + 24, now=now)
+    compact_daily(max_buckets=history_days + 1, now=now)
+
+    return {
+        'users': users,
+        'profiles': profiles,
+        'history_days': history_days,
+        'points_per_day': points_per_day,
+        'history_rows': history_rows,
+        'seed': seed,
+        'seed_seconds': round(time.monotonic() - started, 3),
+    }
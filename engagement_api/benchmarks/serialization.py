@@ -0,0 +1,69 @@
+"""
+Per-row cost of the DRF ModelSerializer paths against the ``.values()``
+payloads of engagement_api.payloads, for history and notification lists
+"""
+from django.contrib.auth.models import User
+
+from ..models import SocialMediaProfile, FollowerCountHistory, AlertNotification
+from ..payloads import HISTORY_FIELDS, history_payload, notification_payload, notification_rows
+from ..serializers import FollowerCountHistorySerializer, AlertNotificationSerializer
+from . import measure
+
+
+def seed(rows):
+    user = User.objects.create_user('benchmark-serialization')
+    profile = SocialMediaProfile.objects.create(user=user, platform='twitter', username='benchmark')
+    FollowerCountHistory.objects.bulk_create(
+        [FollowerCountHistory(profile=profile, follower_count=1000 + i) for i in range(rows)],
+        batch_size=1000
+    )
+    AlertNotification.objects.bulk_create(
+        [
+            AlertNotification(
+                profile=profile, milestone_followers=1000 + i, follower_count_at_alert=1000 + i, message='benchmark'
+            )
+            for i in range(rows)
+        ],
+        batch_size=1000
+    )
+    return profile
+
+
+def run(rows=2000, repeat=5):
+    profile = seed(rows)
+    history = FollowerCountHistory.objects.filter(profile=profile)
+    notifications = AlertNotification.objects.filter(profile=profile)
+    label = str(profile)
+
+    # Querysets are cloned in every call so no run reuses another's result cache
+    cases = {
+        'history': {
+            'serializer': lambda: FollowerCountHistorySerializer(history.all(), many=True).data,
+            'serializer_select_related': lambda: FollowerCountHistorySerializer(
+                history.select_related('profile__user'), many=True
+            ).data,
+            'values_payload': lambda: [history_payload(row, label) for row in history.values(*HISTORY_FIELDS)],
+        },
+        'notifications': {
+            'serializer': lambda: AlertNotificationSerializer(notifications.all(), many=True).data,
+            'serializer_select_related': lambda: AlertNotificationSerializer(
+                notifications.select_related('profile__user'), many=True
+            ).data,
+            'values_payload': lambda: [notification_payload(row) for row in notification_rows(notifications)],
+        },
+    }
+
+    results = []
+    for payload, paths in cases.items():
+        for path, func in paths.items():
+            seconds, queries = measure(func, repeat)
+            results.append({
+                'suite': 'serialization',
+                'payload': payload,
+                'path': path,
+                'rows': rows,
+                'seconds': round(seconds, 6),
+                'us_per_row': round(seconds / rows * 1e6, 2),
+                'queries': queries,
+            })
+    return results
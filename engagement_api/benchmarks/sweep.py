@@ -0,0 +1,69 @@
+"""
+Sweep throughput: profiles checked per second by the batched sweep, with
+batch lookups and with one lookup per API call, and, on small datasets, by
+the legacy one-profile-at-a-time check_follower_counts (which always uses
+the shared mock service). The mock API charges
+``api_latency`` per call plus ``item_latency`` per account looked up, so
+fewer calls show up as less wall time
+"""
+import time
+
+from django.db import connection
+
+from ..instrumentation import QueryTimer
+from ..models import SocialMediaProfile
+from ..services import FollowerFetchEngine, MockSocialMediaService
+from ..tasks import check_follower_counts, check_follower_counts_batched
+
+# The legacy sweep does several queries per profile, skip it on bigger datasets
+LEGACY_MAX_PROFILES = 10000
+
+
+def _result(path, profiles, seconds, queries, **extra):
+    return {
+        'suite': 'sweep',
+        'path': path,
+        'profiles': profiles,
+        'seconds': round(seconds, 3),
+        'profiles_per_second': round(profiles / seconds, 1) if seconds else None,
+        'queries': queries,
+        'queries_per_profile': round(queries / profiles, 2) if profiles else None,
+        **extra,
+    }
+
+
+def _sweep_result(path, stats, queries, batch_size, fetch_batch_size):
+    return _result(
+        path, stats['profiles'], stats['total_seconds'], queries,
+        batch_size=batch_size,
+        fetch_batch_size=fetch_batch_size,
+        api_calls=stats['api_calls'],
+        history_rows=stats['history_rows'],
+        alerts=stats['alerts'],
+        fetch_seconds=round(stats['fetch_seconds'], 3),
+        write_seconds=round(stats['write_seconds'], 3),
+        alert_seconds=round(stats['alert_seconds'], 3),
+    )
+
+
+def run(profiles, batch_size=500, concurrency=None, seed=0, fetch_batch_size=100,
+        api_latency=0.01, item_latency=0.0002):
+    results = []
+    backend = MockSocialMediaService(
+        latency=api_latency, item_latency=item_latency, seed=seed, max_batch_size=fetch_batch_size
+    )
+
+    for path, lookups in (('per-account', 1), ('batched', fetch_batch_size)):
+        counter = QueryTimer()
+        engine = FollowerFetchEngine(backend, concurrency=concurrency, batch_size=lookups)
+        with connection.execute_wrapper(counter):
+            stats = check_follower_counts_batched(batch_size=batch_size, fetch_engine=engine)
+        results.append(_sweep_result(path, stats, counter.count, batch_size, engine.batch_size))
+
+    if profiles <= LEGACY_MAX_PROFILES:
+        counter = QueryTimer()
+        started = time.monotonic()
+        with connection.execute_wrapper(counter):
+            check_follower_counts()
+        results.append(_result('legacy', SocialMediaProfile.objects.count(), time.monotonic() - started, counter.count))
+    return results
@@ -0,0 +1,302 @@
+"""
+Bulk upserts of profiles and alert settings
+A request carries a JSON array, a CSV or JSON Lines body, or one of those as
+an uploaded file. Every item is validated by one serializer instance; the
+valid ones are written with bulk_create(update_conflicts=True) a chunk at a
+time, each chunk in its own transaction, and the response has a result per
+item: created, updated or its errors. Bulk writes send no signals, the
+owner's cached responses are dropped explicitly.
+"""
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from .caching import invalidate_users
+from .milestones import replace_custom_milestones
+from .models import SocialMediaProfile, AlertSettings
+
+CREATED = 'created'
+UPDATED = 'updated'
+FAILED = 'error'
+
+ALERT_FIELDS = ('milestone_followers', 'milestone_step', 'telegram_chat_id', 'is_active')
+
+
+def max_items():
+    return getattr(settings, 'BULK_MAX_ITEMS', 10000)
+
+
+def chunk_size():
+    return getattr(settings, 'BULK_CHUNK_SIZE', 500)
+
+
+def _limited(items):
+    """``items`` as a list, refusing requests over BULK_MAX_ITEMS before reading the rest"""
+    limit = max_items()
+    collected = []
+    for item in items:
+        if len(collected) == limit:
+            raise ParseError(f'More than {limit} items, split the request.')
+        collected.append(item)
+    return collected
+
+
+def _text_lines(stream, parser_context):
+    encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+    return codecs.getreader(encoding)(stream)
+
+
+class CSVParser(BaseParser):
+    """One item per row, named by the header row; empty cells are left out"""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return _limited(
+                {name: value for name, value in row.items() if name and value not in ('', None)}
+                for row in csv.DictReader(_text_lines(stream, parser_context))
+            )
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ParseError(f'CSV parse error - {exc}')
+
+
+class JSONLinesParser(BaseParser):
+    """One JSON object per line"""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        def items():
+            for number, line in enumerate(_text_lines(stream, parser_context), 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as exc:
+                    raise ParseError(f'JSON Lines parse error on line {number} - {exc}')
+
+        try:
+            return _limited(items())
+        except UnicodeDecodeError as exc:
+            raise ParseError(f'JSON Lines parse error - {exc}')
+
+
+# Parsers of uploaded files, by extension
+FILE_PARSERS = {
+    'csv': CSVParser,
+    'jsonl': JSONLinesParser,
+    'ndjson': JSONLinesParser,
+    'json': JSONParser,
+}
+
+
+def bulk_items(request):
+    """The items of a bulk request: its body, or the file uploaded as ``file``"""
+    upload = request.FILES.get('file') if hasattr(request.data, 'getlist') else None
+    if upload is not None:
+        extension = upload.name.rpartition('.')[2].lower()
+        if extension not in FILE_PARSERS:
+            raise ValidationError({'file': [f"Use a .{', .'.join(FILE_PARSERS)} file."]})
+        data = FILE_PARSERS[extension]().parse(upload, parser_context={'encoding': settings.DEFAULT_CHARSET})
+    else:
+        data = request.data
+    if not isinstance(data, list):
+        raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+    if len(data) > max_items():
+        raise ParseError(f'More than {max_items()} items, split the request.')
+    return data
+
+
+def validate_items(serializer, items):
+    """
+    Run every item through ``serializer``, like many=True does, but keep
+    going past invalid items: returns ({index: validated data}, {index: errors})
+    """
+    valid, errors = {}, {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[index] = {'non_field_errors': ['Expected an object.']}
+            continue
+        try:
+            valid[index] = serializer.run_validation(item)
+        except ValidationError as exc:
+            errors[index] = exc.detail
+    return valid, errors
+
+
+def _last_of_duplicates(valid, errors, key):
+    """Keep the last item for each ``key``, the earlier ones become errors"""
+    latest = {}
+    for index, data in valid.items():
+        latest[key(data)] = index
+    for index in list(valid):
+        later = latest[key(valid[index])]
+        if later != index:
+            del valid[index]
+            errors[index] = {'non_field_errors': [f'Repeated by item {later}, which is used instead.']}
+
+
+def _chunks(indexes):
+    indexes = sorted(indexes)
+    size = chunk_size()
+    return [indexes[start:start + size] for start in range(0, len(indexes), size)]
+
+
+def _results(items, written, errors):
+    """Per item results, in request order"""
+    results = []
+    for index in range(len(items)):
+        if index in errors:
+            results.append({'index': index, 'status': FAILED, 'errors': errors[index]})
+        else:
+            status, object_id = written[index]
+            results.append({'index': index, 'status': status, 'id': object_id})
+    return {
+        CREATED: sum(1 for result in results if result['status'] == CREATED),
+        UPDATED: sum(1 for result in results if result['status'] == UPDATED),
+        'errors': len(errors),
+        'results': results,
+    }
+
+
+def _write_chunks(valid, errors, write_chunk):
+    """Run ``write_chunk`` on each chunk of valid indexes in a transaction of its own"""
+    written = {}
+    for chunk in _chunks(valid):
+        try:
+            with transaction.atomic():
+                written.update(write_chunk(chunk))
+        except DatabaseError as exc:
+            for index in chunk:
+                errors[index] = {'non_field_errors': [f'Could not be saved: {exc}']}
+    return written
+
+
+def upsert_profiles(user, items, serializer):
+    """
+    Create the user's profiles in ``items`` or update the follower count of
+    the ones registered already, like ProfileRegisterView.post per item
+    """
+    valid, errors = validate_items(serializer, items)
+    _last_of_duplicates(valid, errors, lambda data: (data['platform'], data['username']))
+
+    def write_chunk(chunk):
+        # Items without a count keep the stored one
+        stored_counts = dict(
+            (key[:2], key[2]) for key in SocialMediaProfile.objects.select_for_update().filter(
+                user=user,
+                platform__in={valid[index]['platform'] for index in chunk},
+                username__in={valid[index]['username'] for index in chunk},
+            ).values_list('platform', 'username', 'current_follower_count')
+        )
+        profiles = {}
+        for index in chunk:
+            data = valid[index]
+            key = (data['platform'], data['username'])
+            profiles[index] = SocialMediaProfile(
+                user=user,
+                platform=data['platform'],
+                username=data['username'],
+                current_follower_count=data.get('current_follower_count', stored_counts.get(key, 0)),
+            )
+        SocialMediaProfile.objects.bulk_create(
+            profiles.values(),
+            update_conflicts=True,
+            unique_fields=['user', 'platform', 'username'],
+            update_fields=['current_follower_count', 'updated_at'],
+        )
+        return {
+            index: (UPDATED if (profile.platform, profile.username) in stored_counts else CREATED, profile.id)
+            for index, profile in profiles.items()
+        }
+
+    written = _write_chunks(valid, errors, write_chunk)
+    if written:
+        invalidate_users([user.id])
+    return _results(items, written, errors)
+
+
+def _resolve_profiles(user, valid, errors):
+    """
+    Set the profile id of items naming their profile by platform and
+    username, in one query; items giving both must name the same profile
+    """
+    by_name = {
+        (data['platform'], data['username']): None
+        for data in valid.values()
+        if 'profile_id' not in data
+    }
+    names = {}
+    requested_ids = {data['profile_id'] for data in valid.values() if 'profile_id' in data}
+    for profile_id, platform, username in SocialMediaProfile.objects.filter(user=user).filter(
+        Q(id__in=requested_ids) | Q(
+            platform__in={platform for platform, _ in by_name},
+            username__in={username for _, username in by_name},
+        )
+    ).values_list('id', 'platform', 'username'):
+        names[profile_id] = (platform, username)
+        by_name[platform, username] = profile_id
+
+    for index in list(valid):
+        data = valid[index]
+        name = (data.pop('platform', None), data.pop('username', None))
+        if 'profile_id' not in data:
+            data['profile_id'] = by_name.get(name)
+        if data['profile_id'] not in names:
+            del valid[index]
+            errors[index] = {'profile_id': ['No such profile.']}
+        elif name != (None, None) and name != names[data['profile_id']]:
+            del valid[index]
+            errors[index] = {'non_field_errors': ['profile_id and platform/username name different profiles.']}
+
+
+def upsert_alert_settings(user, items, serializer):
+    """
+    Create or update the alert settings of the user's profiles in ``items``,
+    like AlertSettingsView.post per item: only the fields an item carries
+    are changed on existing settings
+    """
+    valid, errors = validate_items(serializer, items)
+    _resolve_profiles(user, valid, errors)
+    _last_of_duplicates(valid, errors, lambda data: data['profile_id'])
+
+    def write_chunk(chunk):
+        # Settings that exist keep the stored value of every field an item leaves out
+        stored = {
+            row['profile_id']: row
+            for row in AlertSettings.objects.select_for_update().filter(
+                profile_id__in=[valid[index]['profile_id'] for index in chunk]
+            ).values('profile_id', *ALERT_FIELDS)
+        }
+        alerts = {}
+        milestones = {}
+        for index in chunk:
+            data = dict(valid[index])
+            thresholds = data.pop('milestones', None)
+            if data['profile_id'] not in stored and 'milestone_followers' not in data:
+                errors[index] = {'milestone_followers': ['This field is required.']}
+                continue
+            alerts[index] = AlertSettings(**{**stored.get(data['profile_id'], {}), **data})
+            if thresholds is not None:
+                milestones[data['profile_id']] = thresholds
+        AlertSettings.objects.bulk_create(
+            alerts.values(),
+            update_conflicts=True,
+            unique_fields=['profile'],
+            update_fields=[*ALERT_FIELDS, 'updated_at'],
+        )
+        replace_custom_milestones(milestones)
+        return {
+            index: (UPDATED if alert.profile_id in stored else CREATED, alert.id)
+            for index, alert in alerts.items()
+        }
+
+    written = _write_chunks(valid, errors, write_chunk)
+    if written:
+        invalidate_users([user.id])
+    return _results(items, written, errors)
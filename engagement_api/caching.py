@@ -0,0 +1,174 @@
+"""
+Per-user response caching for the read endpoints
+Cached responses are keyed by a version token per user plus a global one.
+Writes replace the token instead of deleting entries, so invalidating a user
+is a single cache write however many endpoints and query strings they have
+cached. The tokens also give the ETag and Last-Modified headers, letting
+clients revalidate with a 304 without the view running at all.
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import SocialMediaProfile
+from .routing import GLOBAL_SCOPE as PIN_ALL, pin_to_primary
+
+KEY_PREFIX = 'engagement'
+GLOBAL_SCOPE = 'all'
+
+
+def _cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def cache_timeout():
+    # Off unless configured, see API_CACHE_TIMEOUT in the settings
+    return getattr(settings, 'API_CACHE_TIMEOUT', 0)
+
+
+def _version_key(scope):
+    return f'{KEY_PREFIX}:version:{scope}'
+
+
+def _new_version():
+    return uuid.uuid4().hex, int(time.time())
+
+
+def _versions(user_id):
+    """(token, timestamp) of the global and the user scope, minting missing ones"""
+    cache = _cache()
+    keys = [_version_key(GLOBAL_SCOPE), _version_key(user_id)]
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        for key in keys:
+            if key not in found:
+                # Versions expire with the responses, so a process that misses
+                # an invalidation (a local memory cache, only used when
+                # API_CACHE_TIMEOUT is set for a single process) is stale for
+                # one timeout at most
+                cache.add(key, _new_version(), cache_timeout())
+        found = {**cache.get_many(keys), **found}
+    return [found.get(key) or _new_version() for key in keys]
+
+
+async def _aversions(user_id):
+    """_versions for async views"""
+    cache = _cache()
+    keys = [_version_key(GLOBAL_SCOPE), _version_key(user_id)]
+    found = await cache.aget_many(keys)
+    if len(found) < len(keys):
+        for key in keys:
+            if key not in found:
+                await cache.aadd(key, _new_version(), cache_timeout())
+        found = {**await cache.aget_many(keys), **found}
+    return [found.get(key) or _new_version() for key in keys]
+
+
+def _bump(scopes):
+    _cache().set_many({_version_key(scope): _new_version() for scope in scopes}, cache_timeout())
+
+
+def invalidate_users(user_ids):
+    """
+    Drop the cached responses of ``user_ids`` once the current transaction
+    commits, and read their data from the primary until the replicas caught up
+    """
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: _bump(user_ids))
+        transaction.on_commit(lambda: pin_to_primary(user_ids))
+
+
+def invalidate_profiles(profile_ids):
+    """Drop the cached responses of the owners of ``profile_ids``"""
+    invalidate_users(SocialMediaProfile.objects.filter(id__in=profile_ids).values_list('user_id', flat=True))
+
+
+def invalidate_all():
+    """Drop every cached response, e.g. after history was compacted or rollups rebuilt"""
+    transaction.on_commit(lambda: _bump([GLOBAL_SCOPE]))
+    transaction.on_commit(lambda: pin_to_primary([PIN_ALL]))
+
+
+def _validators(request, versions):
+    """Cache key, ETag and Last-Modified of a request given the scope versions"""
+    digest = hashlib.md5('|'.join([
+        *(token for token, _ in versions),
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ]).encode()).hexdigest()
+    key = f'{KEY_PREFIX}:response:{request.user.pk}:{digest}'
+    return key, f'"{digest}"', max(stamp for _, stamp in versions)
+
+
+def cache_user_response(view_method):
+    """
+    Cache the data of a successful GET handler per user, path and query string
+    Sets ETag and Last-Modified, answering conditional requests with a 304.
+    Works on sync and async handlers.
+    """
+    if iscoroutinefunction(view_method):
+        @wraps(view_method)
+        async def async_wrapper(self, request, *args, **kwargs):
+            timeout = cache_timeout()
+            if not timeout:
+                return await view_method(self, request, *args, **kwargs)
+
+            key, etag, last_modified = _validators(request, await _aversions(request.user.pk))
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return _set_validators(not_modified, etag, last_modified)
+
+            data = await _cache().aget(key)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = await view_method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                await _cache().aset(key, response.data, timeout)
+            return _set_validators(response, etag, last_modified)
+
+        return async_wrapper
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        timeout = cache_timeout()
+        if not timeout:
+            return view_method(self, request, *args, **kwargs)
+
+        key, etag, last_modified = _validators(request, _versions(request.user.pk))
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return _set_validators(not_modified, etag, last_modified)
+
+        cache = _cache()
+        data = cache.get(key)
+        if data is not None:
+            response = Response(data)
+        else:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, timeout)
+        return _set_validators(response, etag, last_modified)
+
+    return wrapper
+
+
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Clients must revalidate, which is what makes the 304s cheap
+    response['Cache-Control'] = 'private, no-cache'
+    return response
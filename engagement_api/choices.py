@@ -6,3 +6,23 @@ class PlatformChoice(models.TextChoices):
     TWITTER = 'twitter', 'Twitter'
     INSTAGRAM = 'instagram', 'Instagram'
 
+
+
+class BucketResolutionChoice(models.TextChoices):
+    """Resolutions of downsampled follower count buckets"""
+    HOUR = 'hour', 'Hour'
+    DAY = 'day', 'Day'
+
+
+class DeliveryStatusChoice(models.TextChoices):
+    """Telegram delivery states of alert notifications"""
+    PENDING = 'pending', 'Pending'
+    SENT = 'sent', 'Sent'
+    FAILED = 'failed', 'Failed'
+    SKIPPED = 'skipped', 'Skipped'
+
+
+class LiveEventKindChoice(models.TextChoices):
+    """Kinds of events pushed to the live event stream"""
+    COUNTS = 'counts', 'Follower counts'
+    NOTIFICATIONS = 'notifications', 'Notifications'
@@ -0,0 +1,245 @@
+"""
+Retention and downsampling for follower count history
+Raw FollowerCountHistory points are rolled up into hourly buckets, hourly
+buckets into daily buckets, and each tier is pruned once it is older than
+its retention window. Reads start from the finest tier that still covers
+the requested range and read the finer tiers past its watermark (see
+history_tiers).
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum, Window
+from django.db.models.expressions import RowRange
+from django.db.models.functions import FirstValue, LastValue, RowNumber
+from django.utils import timezone
+
+from .choices import BucketResolutionChoice
+from .models import SocialMediaProfile, FollowerCountHistory, FollowerCountBucket, HistoryCompactionState
+
+RAW = 'raw'
+BUCKET_SPANS = {
+    BucketResolutionChoice.HOUR: timedelta(hours=1),
+    BucketResolutionChoice.DAY: timedelta(days=1),
+}
+BUCKET_FIELDS = ['first_count', 'min_count', 'max_count', 'last_count', 'samples']
+
+
+def raw_retention():
+    return timedelta(days=getattr(settings, 'FOLLOWER_HISTORY_RAW_RETENTION_DAYS', 7))
+
+
+def hourly_retention():
+    return timedelta(days=getattr(settings, 'FOLLOWER_HISTORY_HOURLY_RETENTION_DAYS', 90))
+
+
+def history_tiers(since, now, done):
+    """
+    Where the history since ``since`` is read from, given ``done``, the
+    watermarks(): (resolution, start, end) spans in time order, the first
+    being the finest tier that still holds data back to ``since`` and each
+    following one taking over where the previous is compacted up to. The
+    last span is always RAW, open ended: raw history is only pruned up to
+    the hourly watermark, so it is complete from there on, and all of it
+    is there while compaction has never run.
+    """
+    hourly_done = done.get(BucketResolutionChoice.HOUR)
+    daily_done = done.get(BucketResolutionChoice.DAY)
+    if hourly_done is None or since >= min(now - raw_retention(), hourly_done):
+        return [(RAW, since, None)]
+    raw = (RAW, hourly_done, None)
+    if daily_done is None or since >= min(now - hourly_retention(), daily_done):
+        return [(BucketResolutionChoice.HOUR, floor_to(since, BucketResolutionChoice.HOUR), hourly_done), raw]
+    return [
+        (BucketResolutionChoice.DAY, floor_to(since, BucketResolutionChoice.DAY), daily_done),
+        (BucketResolutionChoice.HOUR, daily_done, hourly_done),
+        raw,
+    ]
+
+
+def floor_to(value, resolution):
+    value = value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if resolution == BucketResolutionChoice.DAY:
+        value = value.replace(hour=0)
+    return value
+
+
+def _watermark(resolution):
+    state = HistoryCompactionState.objects.filter(resolution=resolution).first()
+    return state.compacted_until if state else None
+
+
+def watermarks():
+    """How far each resolution is compacted, in one query; resolutions never compacted are missing"""
+    return dict(HistoryCompactionState.objects.values_list('resolution', 'compacted_until'))
+
+
+async def awatermarks():
+    """watermarks for async views"""
+    return {
+        resolution: compacted_until
+        async for resolution, compacted_until in HistoryCompactionState.objects.values_list(
+            'resolution', 'compacted_until'
+        )
+    }
+
+
+def _set_watermark(resolution, value):
+    HistoryCompactionState.objects.update_or_create(resolution=resolution, defaults={'compacted_until': value})
+
+
+def _bucket_rows(source, time_field, first_field, last_field, min_field, max_field, samples):
+    """Per-profile first/min/max/last/sample count of ``source``, via windows partitioned by profile"""
+    partition = {
+        'partition_by': F('profile_id'),
+        'order_by': [F(time_field).asc(), F('id').asc()],
+    }
+    return source.annotate(
+        bucket_first=Window(FirstValue(first_field), frame=RowRange(None, None), **partition),
+        bucket_last=Window(LastValue(last_field), frame=RowRange(None, None), **partition),
+        bucket_min=Window(Min(min_field), partition_by=F('profile_id')),
+        bucket_max=Window(Max(max_field), partition_by=F('profile_id')),
+        bucket_samples=Window(samples, partition_by=F('profile_id')),
+        position=Window(RowNumber(), **partition),
+    ).filter(position=1).values_list(
+        'profile_id', 'bucket_first', 'bucket_min', 'bucket_max', 'bucket_last', 'bucket_samples'
+    )
+
+
+def _compact(resolution, source_for, next_source_time, max_buckets, now):
+    """
+    Fill complete ``resolution`` buckets after the stored watermark, at most
+    ``max_buckets`` of them per call. Re-running a bucket overwrites it.
+    """
+    span = BUCKET_SPANS[resolution]
+    start = _watermark(resolution)
+    if start is None:
+        first = next_source_time(None)
+        if first is None:
+            return 0
+        start = floor_to(first, resolution)
+    limit = floor_to(now, resolution)
+
+    compacted = 0
+    while start < limit and compacted < max_buckets:
+        end = start + span
+        rows = list(source_for(start, end))
+        with transaction.atomic():
+            FollowerCountBucket.objects.bulk_create(
+                [
+                    FollowerCountBucket(
+                        profile_id=profile_id,
+                        resolution=resolution,
+                        bucket_start=start,
+                        first_count=first_count,
+                        min_count=min_count,
+                        max_count=max_count,
+                        last_count=last_count,
+                        samples=samples,
+                    )
+                    for profile_id, first_count, min_count, max_count, last_count, samples in rows
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['profile', 'resolution', 'bucket_start'],
+                update_fields=BUCKET_FIELDS,
+            )
+            _set_watermark(resolution, end)
+        compacted += 1
+
+        # Jump over gaps without data instead of walking them bucket by bucket
+        following = next_source_time(end)
+        start = max(end, floor_to(following, resolution)) if following else limit
+
+    return compacted
+
+
+def compact_hourly(max_buckets=24, now=None):
+    """Roll complete hours of raw history into hourly buckets, returns hours processed"""
+    def source_for(start, end):
+        return _bucket_rows(
+            FollowerCountHistory.objects.filter(recorded_at__gte=start, recorded_at__lt=end),
+            'recorded_at', 'follower_count', 'follower_count', 'follower_count', 'follower_count',
+            Count('id'),
+        )
+
+    def next_source_time(after):
+        rows = FollowerCountHistory.objects.all()
+        if after:
+            rows = rows.filter(recorded_at__gte=after)
+        return rows.aggregate(first=Min('recorded_at'))['first']
+
+    return _compact(BucketResolutionChoice.HOUR, source_for, next_source_time, max_buckets, now or timezone.now())
+
+
+def compact_daily(max_buckets=7, now=None):
+    """Roll complete days of hourly buckets into daily buckets, returns days processed"""
+    hourly = FollowerCountBucket.objects.filter(resolution=BucketResolutionChoice.HOUR)
+    # A day can only be rolled up once all of its hours are
+    hourly_done = _watermark(BucketResolutionChoice.HOUR)
+    if hourly_done is None:
+        return 0
+
+    def source_for(start, end):
+        return _bucket_rows(
+            hourly.filter(bucket_start__gte=start, bucket_start__lt=end),
+            'bucket_start', 'first_count', 'last_count', 'min_count', 'max_count',
+            Sum('samples'),
+        )
+
+    def next_source_time(after):
+        rows = hourly if after is None else hourly.filter(bucket_start__gte=after)
+        return rows.aggregate(first=Min('bucket_start'))['first']
+
+    return _compact(
+        BucketResolutionChoice.DAY, source_for, next_source_time, max_buckets,
+        min(now or timezone.now(), hourly_done)
+    )
+
+
+def _prune(rows, time_field, cutoff, profile_batch):
+    """
+    Delete ``rows`` older than ``cutoff``, one chunk of profiles at a time.
+    The latest row before the cutoff is kept for each profile so the series
+    still has a known value at the start of the retained window.
+    """
+    deleted = 0
+    last_id = 0
+    while True:
+        profile_ids = list(
+            SocialMediaProfile.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:profile_batch]
+        )
+        if not profile_ids:
+            return deleted
+        last_id = profile_ids[-1]
+
+        expired = rows.filter(profile_id__in=profile_ids, **{f'{time_field}__lt': cutoff})
+        anchors = SocialMediaProfile.objects.filter(id__in=profile_ids).annotate(
+            anchor_id=Subquery(
+                expired.filter(profile_id=OuterRef('pk')).order_by(f'-{time_field}', '-id').values('id')[:1]
+            )
+        ).exclude(anchor_id=None).values('anchor_id')
+        count, _ = expired.exclude(id__in=anchors).delete()
+        deleted += count
+
+
+def prune_raw_history(profile_batch=500, now=None):
+    """Delete raw history past its retention that is already in hourly buckets"""
+    hourly_done = _watermark(BucketResolutionChoice.HOUR)
+    if hourly_done is None:
+        return 0
+    cutoff = min((now or timezone.now()) - raw_retention(), hourly_done)
+    return _prune(FollowerCountHistory.objects.all(), 'recorded_at', cutoff, profile_batch)
+
+
+def prune_hourly_buckets(profile_batch=500, now=None):
+    """Delete hourly buckets past their retention that are already in daily buckets"""
+    daily_done = _watermark(BucketResolutionChoice.DAY)
+    if daily_done is None:
+        return 0
+    cutoff = min((now or timezone.now()) - hourly_retention(), daily_done)
+    return _prune(
+        FollowerCountBucket.objects.filter(resolution=BucketResolutionChoice.HOUR),
+        'bucket_start', cutoff, profile_batch
+    )
@@ -0,0 +1,158 @@
+"""
+Outbox delivery of alert notifications to Telegram
+The sweep only records notifications as pending; TelegramOutbox claims the
+due ones and sends them from a thread pool over a pooled HTTP session,
+within Telegram's global and per-chat rate limits, retrying failures with
+exponential backoff
+"""
+import math
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import invalidate_profiles
+from .choices import DeliveryStatusChoice
+from .models import AlertNotification
+from .services import TelegramDeliveryError, TelegramNotificationService, TokenBucket
+
+DEFAULT_BATCH_SIZE = 100
+
+# Seconds a claimed notification stays hidden from other senders past the
+# longest its batch may take to send (TelegramOutbox.send_seconds)
+CLAIM_SECONDS = 120
+
+DELIVERY_FIELDS = [
+    'telegram_sent', 'delivery_status', 'delivery_attempts', 'next_attempt_at', 'last_error'
+]
+
+
+class TelegramOutbox:
+    """
+    Sends pending AlertNotification rows
+    Several outboxes (processes) may run at once: each claims its own rows
+    by stamping them with a claim time only it uses
+    """
+
+    def __init__(self, service=None, concurrency=None, global_rate=None, chat_rate=None,
+                 max_attempts=None, backoff=None, max_backoff=3600):
+        self.concurrency = concurrency or getattr(settings, 'TELEGRAM_SEND_CONCURRENCY', 4)
+        self.service = service or TelegramNotificationService(pool_size=self.concurrency)
+        self.max_attempts = max_attempts or getattr(settings, 'TELEGRAM_MAX_ATTEMPTS', 5)
+        self.backoff = backoff if backoff is not None else getattr(settings, 'TELEGRAM_RETRY_BACKOFF', 30)
+        self.max_backoff = max_backoff
+        self.chat_rate = chat_rate or getattr(settings, 'TELEGRAM_CHAT_RATE_LIMIT', 1)
+        self._global_bucket = TokenBucket(global_rate or getattr(settings, 'TELEGRAM_GLOBAL_RATE_LIMIT', 30))
+        self._chat_buckets = {}
+        self._lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            if chat_id not in self._chat_buckets:
+                self._chat_buckets[chat_id] = TokenBucket(self.chat_rate)
+            return self._chat_buckets[chat_id]
+
+    def send_seconds(self, chat_ids):
+        """
+        The longest sending to ``chat_ids`` (one per message) may take: the
+        spacing of the global or busiest chat's rate limit, plus a timed out
+        request for every round of concurrent sends
+        """
+        spacing = max(
+            len(chat_ids) / self._global_bucket.rate, max(Counter(chat_ids).values()) / self.chat_rate
+        )
+        requests = math.ceil(len(chat_ids) / self.concurrency) * self.service.timeout
+        return spacing + requests
+
+    def claim(self, limit, now=None):
+        """
+        Claim up to ``limit`` due pending notifications, oldest first, for
+        as long as sending them may take and CLAIM_SECONDS more
+        """
+        now = now or timezone.now()
+        due = AlertNotification.objects.filter(delivery_status=DeliveryStatusChoice.PENDING).filter(
+            Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now)
+        )
+        with transaction.atomic():
+            rows = list(
+                due.select_for_update(skip_locked=True).order_by('id').values_list('id', 'telegram_chat_id')[:limit]
+            )
+            if not rows:
+                return []
+            ids = [notification_id for notification_id, _ in rows]
+            # Random microseconds make the claim time unique to this call, so rows
+            # re-read with it were claimed by us and not by a concurrent sender
+            claimed_until = now + timedelta(
+                seconds=CLAIM_SECONDS + self.send_seconds([chat_id for _, chat_id in rows]),
+                microseconds=random.randrange(1000000)
+            )
+            due.filter(id__in=ids).update(next_attempt_at=claimed_until)
+        return list(
+            AlertNotification.objects.filter(id__in=ids, next_attempt_at=claimed_until).order_by('id')
+        )
+
+    def _send(self, notification):
+        self._global_bucket.acquire()
+        self._chat_bucket(notification.telegram_chat_id).acquire()
+        try:
+            self.service.deliver(notification.telegram_chat_id, notification.message)
+            return notification, None
+        except TelegramDeliveryError as e:
+            return notification, e
+        except Exception as e:
+            return notification, TelegramDeliveryError(str(e))
+
+    def _record(self, notification, error, now):
+        notification.delivery_attempts += 1
+        if error is None:
+            notification.telegram_sent = True
+            notification.delivery_status = DeliveryStatusChoice.SENT
+            notification.next_attempt_at = None
+            notification.last_error = ''
+            return 'sent'
+
+        notification.last_error = str(error)
+        if error.permanent or notification.delivery_attempts >= self.max_attempts:
+            notification.delivery_status = DeliveryStatusChoice.FAILED
+            notification.next_attempt_at = None
+            return 'failed'
+        delay = min(self.max_backoff, self.backoff * 2 ** (notification.delivery_attempts - 1))
+        notification.next_attempt_at = now + timedelta(seconds=max(delay, error.retry_after or 0))
+        return 'retried'
+
+    def send_batch(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Claim and send one batch, returns counts of sent, retried and failed notifications"""
+        stats = {'sent': 0, 'retried': 0, 'failed': 0}
+        notifications = self.claim(batch_size)
+        if not notifications:
+            return stats
+
+        if self.concurrency <= 1 or len(notifications) == 1:
+            results = [self._send(notification) for notification in notifications]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(notifications))) as executor:
+                results = list(executor.map(self._send, notifications))
+
+        now = timezone.now()
+        for notification, error in results:
+            stats[self._record(notification, error, now)] += 1
+        AlertNotification.objects.bulk_update(notifications, DELIVERY_FIELDS)
+        invalidate_profiles({notification.profile_id for notification in notifications})
+        return stats
+
+    def drain(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Send batches until nothing is due, returns the summed counts"""
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+        while True:
+            stats = self.send_batch(batch_size)
+            if not any(stats.values()):
+                return totals
+            for key, value in stats.items():
+                totals[key] += value
+
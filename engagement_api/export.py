@@ -0,0 +1,48 @@
+"""
+Streaming follower history export
+Rows are read with a server-side cursor (QuerySet.iterator) and written out
+one line at a time, so memory stays flat however much history is exported
+"""
+import csv
+import json
+
+from .rollups import format_timestamp
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = ['profile_id', 'platform', 'username', 'follower_count', 'recorded_at']
+EXPORT_FORMATS = {
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'csv': ('text/csv', 'csv'),
+}
+
+
+def history_rows(history):
+    """``history`` as (profile id, platform, username, count, recorded_at) tuples, oldest first per profile"""
+    return history.order_by('profile_id', 'recorded_at', 'id').values_list(
+        'profile_id', 'profile__platform', 'profile__username', 'follower_count', 'recorded_at'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row))
+        record['recorded_at'] = format_timestamp(record['recorded_at'])
+        yield json.dumps(record) + '\n'
+
+
+class _Line:
+    """File-like object handing back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(EXPORT_FIELDS)
+    for profile_id, platform, username, follower_count, recorded_at in rows:
+        yield writer.writerow([profile_id, platform, username, follower_count, format_timestamp(recorded_at)])
+
+
+def export_lines(output, rows):
+    return jsonl_lines(rows) if output == 'jsonl' else csv_lines(rows)
@@ -0,0 +1,80 @@
+"""
+Bulk writes of follower count history
+On PostgreSQL large batches are streamed with COPY, which skips per-row
+statement parsing and RETURNING; COPY gives no ids back, so the rows a sweep
+needs for its rollups are read back afterwards by (profile, recorded_at).
+Other databases and small batches use batched INSERTs.
+"""
+import csv
+import io
+
+from django.db import connection
+
+from .models import FollowerCountHistory
+
+# Below this many rows a multi-row INSERT is as fast as COPY plus the read back
+COPY_MIN_ROWS = 500
+
+HISTORY_COLUMNS = ('profile_id', 'follower_count', 'recorded_at')
+
+
+def copy_supported():
+    return connection.vendor == 'postgresql'
+
+
+def _copy(cursor, table, columns, rows):
+    quote = connection.ops.quote_name
+    statement = f"COPY {quote(table)} ({', '.join(quote(column) for column in columns)}) FROM STDIN"
+    if hasattr(cursor, 'copy'):
+        # psycopg 3
+        with cursor.copy(statement) as copy:
+            for row in rows:
+                copy.write_row(row)
+        return
+    # psycopg2
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f'{statement} WITH (FORMAT csv)', buffer)
+
+
+def insert_history_rows(rows):
+    """
+    Write (profile_id, follower_count, recorded_at) rows as they are
+    recorded_at is auto_now_add, which bulk_create would overwrite
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    table = FollowerCountHistory._meta.db_table
+    with connection.cursor() as cursor:
+        if copy_supported():
+            _copy(cursor, table, HISTORY_COLUMNS, rows)
+            return
+        adapt = connection.ops.adapt_datetimefield_value
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(HISTORY_COLUMNS)}) VALUES (%s, %s, %s)",
+            [(profile_id, count, adapt(recorded_at)) for profile_id, count, recorded_at in rows]
+        )
+
+
+def create_history(counts, recorded_at):
+    """
+    Record (profile_id, follower_count) pairs at ``recorded_at``
+    Returns the created FollowerCountHistory rows, with their ids. Small
+    batches go through bulk_create, which stamps its own recorded_at.
+    """
+    counts = list(counts)
+    if len(counts) < COPY_MIN_ROWS or not copy_supported():
+        return FollowerCountHistory.objects.bulk_create([
+            FollowerCountHistory(profile_id=profile_id, follower_count=follower_count)
+            for profile_id, follower_count in counts
+        ])
+
+    insert_history_rows(
+        (profile_id, follower_count, recorded_at) for profile_id, follower_count in counts
+    )
+    # A profile is polled by one worker at a time, so (profile, recorded_at) is ours
+    return list(FollowerCountHistory.objects.filter(
+        profile_id__in=[profile_id for profile_id, _ in counts], recorded_at=recorded_at
+    ))
@@ -0,0 +1,130 @@
+"""
+Database-side insights queries
+"""
+import re
+from datetime import timedelta
+
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import ValidationError
+
+from .compaction import RAW, awatermarks, history_tiers, watermarks
+from .models import FollowerCountHistory, FollowerCountBucket
+
+DEFAULT_TOP_PERIOD = '24h'
+DEFAULT_TOP_LIMIT = 5
+MAX_TOP_LIMIT = 100
+# Longest period or window accepted, well short of datetime's range
+MAX_PERIOD_HOURS = 3650 * 24
+
+_PERIOD_RE = re.compile(r'^(\d+)([hd]?)$')
+_PERIOD_UNITS = {'h': ('hours', 1), 'd': ('days', 24)}
+
+
+def parse_period(value, field='period'):
+    """
+    Parse a period such as ``24h``, ``7d`` or ``48`` (hours), of at most
+    MAX_PERIOD_HOURS. Returns (timedelta, human readable label)
+    """
+    match = _PERIOD_RE.match((value or '').strip().lower())
+    amount, unit = (int(match.group(1)), match.group(2) or 'h') if match else (0, 'h')
+    name, hours = _PERIOD_UNITS[unit]
+    if not 0 < amount * hours <= MAX_PERIOD_HOURS:
+        raise ValidationError({field: ['Use a positive number of hours or days, e.g. "24h" or "7d".']})
+    if amount == 1:
+        name = name[:-1]
+    return timedelta(hours=amount * hours), f"{amount} {name}"
+
+
+def parse_limit(value, default=DEFAULT_TOP_LIMIT, maximum=MAX_TOP_LIMIT, field='limit'):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        limit = 0
+    if not 1 <= limit <= maximum:
+        raise ValidationError({field: [f'Use a whole number between 1 and {maximum}.']})
+    return limit
+
+
+def _tier_rows(resolution):
+    """The rows of a history tier and their (time, first count, last count) fields"""
+    if resolution == RAW:
+        return FollowerCountHistory.objects.all(), 'recorded_at', 'follower_count', 'follower_count'
+    return FollowerCountBucket.objects.filter(resolution=resolution), 'bucket_start', 'first_count', 'last_count'
+
+
+def _point(rows, time_field, value_field, latest=False, **bounds):
+    """``value_field`` of each profile's first, or latest, row of ``rows`` within ``bounds``"""
+    order = [f'-{time_field}', '-id'] if latest else [time_field, 'id']
+    return Subquery(rows.filter(profile_id=OuterRef('pk'), **bounds).order_by(*order).values(value_field)[:1])
+
+
+def follower_changes(profiles, since, tiers):
+    """
+    One row per profile with history: the count at ``since``, the newest
+    count and the change between them, each read by a subquery on the
+    (profile, time) indexes, so the cost does not grow with the history in
+    the period.
+    The stored series is read as a step function, so the count at ``since``
+    is the last point at or before it in the first of ``tiers`` (see
+    compaction.history_tiers), falling back to the first point in the
+    period, in whichever tier holds it; this keeps results the same whether
+    history is written on every poll or only on change. The newest count is
+    the latest raw point, which pruning always keeps.
+    """
+    first_resolution, start, _ = tiers[0]
+    rows, time_field, _, last_field = _tier_rows(first_resolution)
+    # A bucket at ``start`` holds the value at the start of the period as its last count
+    start_counts = [_point(rows, time_field, last_field, latest=True, **{f'{time_field}__lte': start})]
+    for position, (resolution, tier_start, tier_end) in enumerate(tiers):
+        rows, time_field, first_field, _ = _tier_rows(resolution)
+        bounds = {f"{time_field}__{'gte' if position else 'gt'}": tier_start}
+        if tier_end is not None:
+            bounds[f'{time_field}__lt'] = tier_end
+        start_counts.append(_point(rows, time_field, first_field, **bounds))
+
+    return profiles.annotate(
+        old_count=Coalesce(*start_counts),
+        new_count=_point(FollowerCountHistory.objects.all(), 'recorded_at', 'follower_count', latest=True),
+    ).annotate(
+        follower_change=F('new_count') - F('old_count')
+    ).values(
+        'old_count', 'new_count', 'follower_change', 'username', 'platform',
+        profile_id=F('id'),
+    )
+
+
+def _insight(row):
+    old_count = row['old_count']
+    change = row['follower_change']
+    change_percentage = (change / old_count * 100) if old_count > 0 else 0
+    return {
+        'profile_id': row['profile_id'],
+        'username': row['username'],
+        'platform': row['platform'],
+        'follower_change': change,
+        'follower_change_percentage': round(change_percentage, 2),
+        'old_count': old_count,
+        'new_count': row['new_count'],
+    }
+
+
+def _top_changes(profiles, since, limit, tiers):
+    changes = follower_changes(profiles, since, tiers)
+    top_increases = changes.filter(follower_change__gt=0).order_by('-follower_change', 'profile_id')[:limit]
+    top_decreases = changes.filter(follower_change__lt=0).order_by('follower_change', 'profile_id')[:limit]
+    return top_increases, top_decreases
+
+
+def top_follower_changes(profiles, since, now, limit=DEFAULT_TOP_LIMIT):
+    """Top ``limit`` increases and decreases since ``since``, three queries in total"""
+    top_increases, top_decreases = _top_changes(profiles, since, limit, history_tiers(since, now, watermarks()))
+    return [_insight(row) for row in top_increases], [_insight(row) for row in top_decreases]
+
+
+async def atop_follower_changes(profiles, since, now, limit=DEFAULT_TOP_LIMIT):
+    """top_follower_changes for async views"""
+    top_increases, top_decreases = _top_changes(profiles, since, limit, history_tiers(since, now, await awatermarks()))
+    return [_insight(row) async for row in top_increases], [_insight(row) async for row in top_decreases]
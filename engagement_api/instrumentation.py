@@ -0,0 +1,199 @@
+"""
+Per-request instrumentation for the API views
+InstrumentationMiddleware counts the SQL queries of every request and times
+the database, the view and response rendering. The figures go out as a
+Server-Timing header and are aggregated per view in ``metrics`` (per
+process), which the metrics endpoint serves. Views may declare a
+``query_budget``, the most queries one GET request may take including
+session authentication; requests over it are logged.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Recent samples kept per view for percentiles
+SAMPLE_SIZE = 1000
+
+
+class QueryTimer:
+    """``execute_wrapper`` counting queries and their total duration"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def percentile(values, fraction):
+    """The value below which ``fraction`` of ``values`` fall, nearest rank"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ViewMetrics:
+    """Thread-safe per-view aggregates of request samples"""
+
+    def __init__(self, sample_size=SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def record(self, view, sample):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = {
+                    'requests': 0,
+                    'over_budget': 0,
+                    'query_budget': sample['query_budget'],
+                    'samples': deque(maxlen=self.sample_size),
+                }
+            stats['requests'] += 1
+            stats['over_budget'] += sample['over_budget']
+            stats['samples'].append(sample)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def snapshot(self):
+        """Per-view request count and mean, p50, p95, p99 and max of recent samples"""
+        with self._lock:
+            views = {view: (dict(stats), list(stats['samples'])) for view, stats in self._views.items()}
+
+        report = {}
+        for view, (stats, samples) in sorted(views.items()):
+            summary = {
+                'requests': stats['requests'],
+                'over_budget': stats['over_budget'],
+                'query_budget': stats['query_budget'],
+                'samples': len(samples),
+            }
+            for field in ('queries', 'db_ms', 'view_ms', 'render_ms', 'total_ms', 'size'):
+                values = [sample[field] for sample in samples if sample[field] is not None]
+                if not values:
+                    continue
+                summary[field] = {
+                    'mean': round(sum(values) / len(values), 2),
+                    'p50': percentile(values, 0.5),
+                    'p95': percentile(values, 0.95),
+                    'p99': percentile(values, 0.99),
+                    'max': max(values),
+                }
+            report[view] = summary
+        return report
+
+
+metrics = ViewMetrics()
+
+
+def query_budget_of(resolver_match):
+    """``query_budget`` of the view class behind a URL match, if it declares one"""
+    view_class = getattr(resolver_match.func, 'view_class', None) if resolver_match else None
+    return getattr(view_class, 'query_budget', None)
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _wrap_connections(self, stack, request):
+        timer = QueryTimer()
+        request._instrumentation_render = {}
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        return timer
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'API_INSTRUMENTATION', True):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            timer = self._wrap_connections(stack, request)
+            response = self.get_response(request)
+        return self._record(request, response, timer, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'API_INSTRUMENTATION', True):
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        # Connections belong to threads: wrap the ones of the thread the
+        # request's ORM calls (sync views and the async ORM alike) run in
+        stack = ExitStack()
+        timer = await sync_to_async(self._wrap_connections)(stack, request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._record(request, response, timer, time.perf_counter() - started)
+
+    def _record(self, request, response, timer, total):
+        render = request._instrumentation_render
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+
+        render_seconds = render['finished'] - render['started'] if 'finished' in render else 0.0
+        view_seconds = max(0.0, total - render_seconds - timer.seconds)
+        budget = query_budget_of(match)
+        over_budget = budget is not None and request.method in ('GET', 'HEAD') and timer.count > budget
+        if over_budget:
+            logger.warning(
+                '%s %s took %d queries, over the query budget of %d', request.method, request.path, timer.count, budget
+            )
+        size = None if response.streaming else len(response.content)
+        metrics.record(match.view_name or match.route, {
+            'queries': timer.count,
+            'db_ms': round(timer.seconds * 1000, 2),
+            'view_ms': round(view_seconds * 1000, 2),
+            'render_ms': round(render_seconds * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'size': size,
+            'query_budget': budget,
+            'over_budget': int(over_budget),
+        })
+
+        if getattr(settings, 'API_SERVER_TIMING', False):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={timer.seconds * 1000:.2f};desc="{timer.count} queries"',
+                f'view;dur={view_seconds * 1000:.2f}',
+                f'render;dur={render_seconds * 1000:.2f}',
+                f'total;dur={total * 1000:.2f}',
+            ])
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that separately
+        render = getattr(request, '_instrumentation_render', None)
+        if render is not None:
+            render['started'] = time.perf_counter()
+
+            def finished(rendered):
+                render['finished'] = time.perf_counter()
+
+            response.add_post_render_callback(finished)
+        return response
@@ -0,0 +1,226 @@
+"""
+Live event stream: follower count updates and milestone notifications
+pushed to dashboards over Server-Sent Events
+With LIVE_EVENTS on, the sweeper writes one LiveEvent per user per chunk,
+and compact_follower_history deletes them after their retention. In each web process a
+single EventHub task reads new events from the table and fans them out to
+the in-memory queues of that process's subscribers, so an idle connection
+costs a queue and a suspended coroutine, no queries. Events carry their id,
+which clients send back as Last-Event-ID to replay what they missed.
+"""
+import asyncio
+import contextvars
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .choices import LiveEventKindChoice
+from .models import LiveEvent
+from .rollups import format_timestamp
+
+# Most events read per poll, and replayed to a reconnecting client
+FETCH_LIMIT = 1000
+# How long an id skipped over by a poll is looked for again: sweeps commit
+# concurrently, so a lower id can become visible after a higher one
+GAP_SECONDS = 30
+# Reconnection delay suggested to clients
+RETRY_MILLISECONDS = 5000
+
+
+def _enabled():
+    # Off by default: publishing adds inserts to every sweep chunk
+    return getattr(settings, 'LIVE_EVENTS', False)
+
+
+def prune_live_events(now=None):
+    """Delete events past LIVE_EVENT_RETENTION_SECONDS, returns how many"""
+    retention = getattr(settings, 'LIVE_EVENT_RETENTION_SECONDS', 3600)
+    cutoff = (now or timezone.now()) - timedelta(seconds=retention)
+    deleted, _ = LiveEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def publish_counts(checked, now):
+    """One counts event per user for a chunk of checked (profile, old_count, new_count)"""
+    if not _enabled():
+        return
+    by_user = defaultdict(list)
+    for profile, old_count, new_count in checked:
+        by_user[profile.user_id].append({
+            'profile_id': profile.id,
+            'platform': profile.platform,
+            'username': profile.username,
+            'follower_count': new_count,
+            'follower_change': new_count - old_count,
+            'last_checked': format_timestamp(now),
+        })
+    LiveEvent.objects.bulk_create([
+        LiveEvent(user_id=user_id, kind=LiveEventKindChoice.COUNTS, payload={'profiles': profiles})
+        for user_id, profiles in by_user.items()
+    ])
+
+
+def publish_notifications(notifications):
+    """One notifications event per user for newly created AlertNotification rows"""
+    if not _enabled():
+        return
+    by_user = defaultdict(list)
+    for notification in notifications:
+        profile = notification.profile
+        by_user[profile.user_id].append({
+            'id': notification.id,
+            'profile_id': profile.id,
+            'platform': profile.platform,
+            'username': profile.username,
+            'milestone_followers': notification.milestone_followers,
+            'follower_count_at_alert': notification.follower_count_at_alert,
+            'message': notification.message,
+            'sent_at': format_timestamp(notification.sent_at),
+        })
+    LiveEvent.objects.bulk_create([
+        LiveEvent(user_id=user_id, kind=LiveEventKindChoice.NOTIFICATIONS, payload={'notifications': rows})
+        for user_id, rows in by_user.items()
+    ])
+
+
+def format_event(event):
+    """An event row as a Server-Sent Events message"""
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(event['payload'])}\n\n"
+
+
+EVENT_FIELDS = ('id', 'user_id', 'kind', 'payload')
+
+
+def _new_events(after, gaps):
+    # Runs on the hub's own thread, with its own connection
+    close_old_connections()
+    return list(
+        LiveEvent.objects.filter(Q(id__gt=after) | Q(id__in=gaps)).order_by('id').values(*EVENT_FIELDS)[:FETCH_LIMIT]
+    )
+
+
+def _latest_id():
+    close_old_connections()
+    return LiveEvent.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+async def missed_events(user_id, after):
+    """The user's events after ``after``, for a client resuming with Last-Event-ID"""
+    return [
+        event async for event in
+        LiveEvent.objects.filter(user_id=user_id, id__gt=after).order_by('id').values(*EVENT_FIELDS)[:FETCH_LIMIT]
+    ]
+
+
+class EventHub:
+    """
+    Per-process fan-out of new LiveEvent rows to subscriber queues
+    The polling task runs while anyone is subscribed, one query per
+    LIVE_POLL_INTERVAL however many subscribers there are. Slow
+    subscribers lose their oldest queued events rather than block others.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._task = None
+        self._loop = None
+        # One thread, so the hub holds a single database connection
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='live-events')
+
+    def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop (tests, a restarted server): start over
+            self._subscribers.clear()
+            self._task = None
+            self._loop = loop
+        queue = asyncio.Queue(maxsize=getattr(settings, 'LIVE_QUEUE_SIZE', 100))
+        self._subscribers[user_id].add(queue)
+        if self._task is None or self._task.done():
+            # A fresh context: the poller must not inherit the first subscriber's request
+            self._task = loop.create_task(self._poll(), context=contextvars.Context())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def _run(self, func, *args):
+        return sync_to_async(func, thread_sensitive=False, executor=self._executor)(*args)
+
+    def _deliver(self, event):
+        for queue in self._subscribers.get(event['user_id'], ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _poll(self):
+        interval = getattr(settings, 'LIVE_POLL_INTERVAL', 1.0)
+        last_id = await self._run(_latest_id)
+        # Skipped id -> when it was first missed
+        gaps = {}
+        while self._subscribers:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            gaps = {event_id: since for event_id, since in gaps.items() if now - since < GAP_SECONDS}
+            try:
+                events = await self._run(_new_events, last_id, list(gaps))
+            except Exception:
+                # The database went away for a moment, try again on the next tick
+                continue
+            for event in events:
+                self._deliver(event)
+                gaps.pop(event['id'], None)
+                if event['id'] > last_id:
+                    gaps.update(dict.fromkeys(range(max(last_id + 1, event['id'] - FETCH_LIMIT), event['id']), now))
+                    last_id = event['id']
+
+
+hub = EventHub()
+
+
+async def event_stream(user_id, last_event_id=None):
+    """
+    Server-Sent Events for one subscriber: missed events when resuming,
+    then live ones, with a comment line as heartbeat when idle
+    """
+    heartbeat = getattr(settings, 'LIVE_HEARTBEAT_SECONDS', 15)
+    loop = asyncio.get_running_loop()
+    queue = hub.subscribe(user_id)
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        # Subscribed before the replay, so the queue may repeat replayed
+        # events, until the hub stops looking for skipped ids. Ids are not
+        # compared with the newest sent: the hub delivers late commits of
+        # lower ids after higher ones.
+        replayed = set()
+        replay_overlap_until = loop.time() + GAP_SECONDS
+        if last_event_id is not None:
+            for event in await missed_events(user_id, last_event_id):
+                replayed.add(event['id'])
+                yield format_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if replayed and loop.time() > replay_overlap_until:
+                replayed.clear()
+            if event['id'] in replayed:
+                replayed.discard(event['id'])
+                continue
+            yield format_event(event)
+    finally:
+        hub.unsubscribe(user_id, queue)
@@ -0,0 +1,234 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from engagement_api.benchmarks import concurrency, endpoints, isolated_database, seed, serialization, sweep
+
+# Suites measured on the seeded dataset, in the order they run (the sweep writes to it)
+DATASET_SUITES = ['endpoints', 'concurrency', 'sweep']
+SUITES = DATASET_SUITES + ['serialization']
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and benchmark the API endpoints, concurrent load, '
+        'the sweeper and serialization'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'suites',
+            nargs='*',
+            help=f"Benchmarks to run: {', '.join(SUITES)} (default: all)",
+        )
+        parser.add_argument(
+            '--profiles',
+            type=int,
+            default=1000,
+            help='Number of profiles to seed (default: 1000)',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=100,
+            help='Number of users the profiles are spread over (default: 100)',
+        )
+        parser.add_argument(
+            '--history-days',
+            type=int,
+            default=30,
+            help='Days of follower history seeded per profile (default: 30)',
+        )
+        parser.add_argument(
+            '--points-per-day',
+            type=int,
+            default=4,
+            help='Follower history points per profile per day (default: 4)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed of the generated data (default: 0)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Requests per endpoint for the latency percentiles, and per load level (default: 50)',
+        )
+        parser.add_argument(
+            '--in-flight',
+            default='1,8,32',
+            help='Requests in flight at once in the concurrency benchmark, comma separated (default: 1,8,32)',
+        )
+        parser.add_argument(
+            '--db-latency',
+            type=float,
+            default=0.0,
+            help='Milliseconds added to every query in the concurrency benchmark (default: 0)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Sweep chunk size (default: 500)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Concurrent follower count lookups in the sweep (default: FOLLOWER_FETCH_CONCURRENCY)',
+        )
+        parser.add_argument(
+            '--fetch-batch-size',
+            type=int,
+            default=100,
+            help='Accounts per follower count API call in the batched sweep (default: 100)',
+        )
+        parser.add_argument(
+            '--api-latency',
+            type=float,
+            default=0.01,
+            help='Seconds the mock API takes per call in the sweep (default: 0.01)',
+        )
+        parser.add_argument(
+            '--api-item-latency',
+            type=float,
+            default=0.0002,
+            help='Extra seconds the mock API takes per account looked up (default: 0.0002)',
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=2000,
+            help='Number of rows serialized by the serialization benchmark (default: 2000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per serialization measurement, the best one is reported (default: 5)',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON instead of a table',
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='Also write the JSON report to this file, for comparing runs across commits',
+        )
+
+    def handle(self, *args, **options):
+        suites = options['suites'] or SUITES
+        unknown = [name for name in suites if name not in SUITES]
+        if unknown:
+            raise CommandError(f"Unknown benchmark: {', '.join(unknown)}")
+        try:
+            in_flight = [int(level) for level in options['in_flight'].split(',') if level.strip()]
+        except ValueError:
+            in_flight = []
+        if not in_flight or min(in_flight) < 1:
+            raise CommandError('--in-flight takes positive whole numbers, e.g. 1,8,32')
+
+        report = {
+            'commit': _commit(),
+            'started_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'dataset': None,
+            'results': [],
+        }
+        results = report['results']
+        with isolated_database():
+            report['database'] = connection.vendor
+            if any(name in suites for name in DATASET_SUITES):
+                if options['verbosity'] and not options['json']:
+                    self.stdout.write(f"Seeding {options['profiles']} profiles...")
+                report['dataset'] = seed.seed(
+                    profiles=options['profiles'],
+                    users=options['users'],
+                    history_days=options['history_days'],
+                    points_per_day=options['points_per_day'],
+                    seed=options['seed'],
+                )
+            if 'endpoints' in suites:
+                results.extend(endpoints.run(requests=max(1, options['requests'])))
+            if 'concurrency' in suites:
+                results.extend(concurrency.run(
+                    requests=max(1, options['requests']),
+                    concurrency=in_flight,
+                    db_latency=max(0.0, options['db_latency']) / 1000,
+                ))
+            if 'sweep' in suites:
+                results.extend(sweep.run(
+                    options['profiles'],
+                    batch_size=options['batch_size'],
+                    concurrency=options['concurrency'],
+                    seed=options['seed'],
+                    fetch_batch_size=max(1, options['fetch_batch_size']),
+                    api_latency=options['api_latency'],
+                    item_latency=options['api_item_latency'],
+                ))
+            # Last, its own rows would otherwise be part of the seeded dataset
+            if 'serialization' in suites:
+                results.extend(serialization.run(rows=options['rows'], repeat=max(1, options['repeat'])))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.write_table(report)
+
+    def write_table(self, report):
+        if report['dataset']:
+            dataset = report['dataset']
+            self.stdout.write(
+                f"Dataset: {dataset['profiles']} profiles, {dataset['users']} users, "
+                f"{dataset['history_rows']} history rows (seeded in {dataset['seed_seconds']:.1f}s)"
+            )
+        for result in report['results']:
+            if result['suite'] == 'serialization':
+                self.stdout.write(
+                    f"serialization  {result['payload']:<14} {result['path']:<26} "
+                    f"{result['rows']:>7} rows {result['seconds'] * 1000:>9.2f} ms "
+                    f"{result['us_per_row']:>8.2f} us/row {result['queries']:>6} queries"
+                )
+            elif result['suite'] == 'concurrency':
+                self.stdout.write(
+                    f"concurrency    {result['mode']:<5} {result['path']:<36} {result['concurrency']:>3} in flight "
+                    f"{result['requests_per_second']:>8} req/s  p50 {result['p50_ms']:>8.2f} ms  "
+                    f"p99 {result['p99_ms']:>8.2f} ms"
+                )
+            elif result['suite'] == 'endpoints':
+                self.stdout.write(
+                    f"endpoints      {result['path']:<42} {result['status']} "
+                    f"p50 {result['p50_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms "
+                    f"{result['queries']:>4} queries {result['size']:>9} bytes"
+                )
+            else:
+                api_calls = f"{result['api_calls']:>7} API calls" if 'api_calls' in result else ''
+                self.stdout.write(
+                    f"sweep          {result['path']:<11} {result['profiles']:>8} profiles "
+                    f"{result['seconds']:>8.2f}s {result['profiles_per_second']:>10} profiles/s "
+                    f"{result['queries_per_profile']:>6} queries/profile {api_calls}"
+                )
@@ -1,12 +1,20 @@
+import os
+import socket
 import time
 
 from django.core.management.base import BaseCommand
 
-from engagement_api.tasks import check_follower_counts
+from engagement_api.scheduling import AdaptiveSchedule, DueTimeScheduler, FixedSchedule
+from engagement_api.services import FollowerFetchEngine, mock_social_service
+from engagement_api.tasks import (
+    DEFAULT_BATCH_SIZE, DEFAULT_LEASE_SECONDS,
+    check_follower_counts, check_follower_counts_batched, check_due_profiles,
+    new_sweep_stats, process_profile_chunk
+)
 
 
 class Command(BaseCommand):
-    help = 'Check follower counts for all profiles and send milestone alerts'
+    help = 'Check follower counts for all profiles and queue milestone alerts'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -20,11 +28,89 @@ class Command(BaseCommand):
             default=300,
             help='Interval in seconds between checks (default: 300)',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=(
+                f'Number of profiles processed per chunk (default: {DEFAULT_BATCH_SIZE}). '
+                'Use 0 for the legacy one-profile-at-a-time sweep'
+            ),
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Number of concurrent follower count lookups (default: FOLLOWER_FETCH_CONCURRENCY)',
+        )
+        parser.add_argument(
+            '--worker',
+            action='store_true',
+            help=(
+                'Run as one of several workers: lease due profiles in chunks of '
+                '--batch-size instead of sweeping every profile'
+            ),
+        )
+        parser.add_argument(
+            '--adaptive',
+            action='store_true',
+            help=(
+                'Poll each profile when it is due instead of in full sweeps: fast movers and '
+                'profiles close to their milestone are polled more often, unchanged ones back off'
+            ),
+        )
+        parser.add_argument(
+            '--min-interval',
+            type=int,
+            default=60,
+            help='Shortest per-profile polling interval in adaptive mode (default: 60)',
+        )
+        parser.add_argument(
+            '--max-interval',
+            type=int,
+            default=3600,
+            help='Longest per-profile polling interval in adaptive mode (default: 3600)',
+        )
+        parser.add_argument(
+            '--worker-id',
+            default=None,
+            help='Worker name recorded on leases (default: <hostname>-<pid>)',
+        )
+        parser.add_argument(
+            '--lease-seconds',
+            type=int,
+            default=DEFAULT_LEASE_SECONDS,
+            help=(
+                'Seconds a worker holds claimed profiles before others may take them over, '
+                f'also the retry delay for failed lookups (default: {DEFAULT_LEASE_SECONDS})'
+            ),
+        )
+        parser.add_argument(
+            '--idle-sleep',
+            type=float,
+            default=5,
+            help='Seconds a worker waits when no profile is due (default: 5)',
+        )
 
     def handle(self, *args, **options):
-        if options['once']:
+        batch_size = options['batch_size']
+        self.fetch_engine = FollowerFetchEngine(mock_social_service, concurrency=options['concurrency'])
+        if options['adaptive']:
+            self.schedule = AdaptiveSchedule(
+                interval=options['interval'],
+                min_interval=options['min_interval'],
+                max_interval=options['max_interval'],
+            )
+        else:
+            self.schedule = FixedSchedule(interval=options['interval'])
+
+        if options['worker']:
+            self.run_worker(options)
+        elif options['adaptive']:
+            self.run_scheduler(options)
+        elif options['once']:
             self.stdout.write('Running follower count check once...')
-            check_follower_counts()
+            self.run_sweep(batch_size)
             self.stdout.write(self.style.SUCCESS('Check completed!'))
         else:
             interval = options['interval']
@@ -37,8 +123,92 @@ class Command(BaseCommand):
 
             try:
                 while True:
-                    check_follower_counts()
-                    self.stdout.write(f'Check completed. Waiting {interval}s for next check...')
-                    time.sleep(interval)
+                    started = time.monotonic()
+                    self.run_sweep(batch_size)
+                    # Keep a fixed rate: the sweep duration counts towards the interval
+                    wait = max(0.0, interval - (time.monotonic() - started))
+                    self.stdout.write(f'Check completed. Waiting {wait:.0f}s for next check...')
+                    time.sleep(wait)
             except KeyboardInterrupt:
                 self.stdout.write(self.style.SUCCESS('\nStopped periodic checks.'))
+
+    def run_sweep(self, batch_size):
+        if batch_size <= 0:
+            check_follower_counts()
+            return
+
+        stats = check_follower_counts_batched(
+            batch_size=batch_size, fetch_engine=self.fetch_engine, schedule=self.schedule
+        )
+        self.write_stats(stats)
+
+    def run_scheduler(self, options):
+        def process_chunk(profiles):
+            stats = new_sweep_stats()
+            started = time.monotonic()
+            checked_ids = process_profile_chunk(profiles, stats, self.fetch_engine, self.schedule)
+            stats['total_seconds'] = time.monotonic() - started
+            self.write_stats(stats)
+            return checked_ids
+
+        scheduler = DueTimeScheduler(
+            process_chunk,
+            batch_size=max(1, options['batch_size']),
+            retry_seconds=options['min_interval'],
+        )
+
+        if options['once']:
+            self.stdout.write('Checking due profiles once...')
+            scheduler.run_due()
+            self.stdout.write(self.style.SUCCESS('Check completed!'))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Starting adaptive follower count checks (interval: {options['interval']}s, "
+                f"range: {options['min_interval']}-{options['max_interval']}s)..."
+            )
+        )
+        self.stdout.write('Press Ctrl+C to stop.')
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('\nStopped adaptive checks.'))
+
+    def run_worker(self, options):
+        worker_id = options['worker_id'] or f'{socket.gethostname()}-{os.getpid()}'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Starting worker {worker_id} (interval: {options['interval']}s, "
+                f"lease: {options['lease_seconds']}s)..."
+            )
+        )
+
+        try:
+            while True:
+                stats = check_due_profiles(
+                    worker_id,
+                    claim_size=max(1, options['batch_size']),
+                    lease_seconds=options['lease_seconds'],
+                    fetch_engine=self.fetch_engine,
+                    schedule=self.schedule,
+                )
+                if stats:
+                    self.write_stats(stats)
+                    continue
+                if options['once']:
+                    self.stdout.write(self.style.SUCCESS('No profiles due, check completed!'))
+                    return
+                time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS(f'\nStopped worker {worker_id}.'))
+
+    def write_stats(self, stats):
+        self.stdout.write(
+            f"Checked {stats['profiles']} profiles in {stats['chunks']} chunks "
+            f"with {stats['api_calls']} API calls "
+            f"({stats['history_rows']} history rows, {stats['errors']} errors, {stats['alerts']} alerts) "
+            f"in {stats['total_seconds']:.2f}s "
+            f"[fetch {stats['fetch_seconds']:.2f}s, write {stats['write_seconds']:.2f}s, "
+            f"alerts {stats['alert_seconds']:.2f}s]"
+        )
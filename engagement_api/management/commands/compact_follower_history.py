@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+
+from engagement_api.caching import invalidate_all
+from engagement_api.compaction import compact_daily, compact_hourly, prune_hourly_buckets, prune_raw_history
+from engagement_api.live import prune_live_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Downsample follower history into hourly and daily buckets and prune '
+        'data older than its retention window'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-hours',
+            type=int,
+            default=24 * 7,
+            help='Maximum number of hourly buckets to build in this run (default: 168)',
+        )
+        parser.add_argument(
+            '--max-days',
+            type=int,
+            default=30,
+            help='Maximum number of daily buckets to build in this run (default: 30)',
+        )
+        parser.add_argument(
+            '--profile-batch',
+            type=int,
+            default=500,
+            help='Number of profiles pruned per delete (default: 500)',
+        )
+        parser.add_argument(
+            '--no-prune',
+            action='store_true',
+            help='Only build buckets, keep expired raw points, hourly buckets and live events',
+        )
+
+    def handle(self, *args, **options):
+        hours = compact_hourly(max_buckets=options['max_hours'])
+        self.stdout.write(f'Compacted {hours} hours of raw history into hourly buckets.')
+
+        days = compact_daily(max_buckets=options['max_days'])
+        self.stdout.write(f'Compacted {days} days of hourly buckets into daily buckets.')
+
+        if not options['no_prune']:
+            raw_deleted = prune_raw_history(profile_batch=options['profile_batch'])
+            hourly_deleted = prune_hourly_buckets(profile_batch=options['profile_batch'])
+            self.stdout.write(
+                f'Pruned {raw_deleted} raw history points and {hourly_deleted} hourly buckets.'
+            )
+            events_deleted = prune_live_events()
+            self.stdout.write(f'Pruned {events_deleted} expired live events.')
+
+        # Long-period insights read the buckets that were just written
+        invalidate_all()
+
+        if hours == options['max_hours'] or days == options['max_days']:
+            self.stdout.write('More data is waiting to be compacted, run the command again.')
+        self.stdout.write(self.style.SUCCESS('Compaction completed!'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from engagement_api.caching import invalidate_all
+from engagement_api.models import SocialMediaProfile
+from engagement_api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the precomputed 24h insights rollups from follower history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of profiles rebuilt per chunk (default: 500)',
+        )
+        parser.add_argument(
+            '--profile',
+            type=int,
+            action='append',
+            dest='profile_ids',
+            help='Only rebuild this profile id (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        profile_ids = SocialMediaProfile.objects.order_by('id').values_list('id', flat=True)
+        if options['profile_ids']:
+            profile_ids = profile_ids.filter(id__in=options['profile_ids'])
+
+        total = 0
+        last_id = 0
+        while True:
+            chunk = list(profile_ids.filter(id__gt=last_id)[:batch_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+            rebuild_rollups(chunk)
+            total += len(chunk)
+            self.stdout.write(f'Rebuilt {total} rollups...')
+
+        invalidate_all()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt insights rollups for {total} profiles.'))
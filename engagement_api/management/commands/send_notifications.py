@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from engagement_api.delivery import DEFAULT_BATCH_SIZE, TelegramOutbox
+
+
+class Command(BaseCommand):
+    help = 'Send pending milestone notifications to Telegram'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Send everything that is due and exit (default: keep polling for new notifications)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Number of notifications claimed per batch (default: {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Number of concurrent Telegram requests (default: TELEGRAM_SEND_CONCURRENCY)',
+        )
+        parser.add_argument(
+            '--idle-sleep',
+            type=float,
+            default=5,
+            help='Seconds to wait when no notification is due (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        outbox = TelegramOutbox(concurrency=options['concurrency'])
+        batch_size = max(1, options['batch_size'])
+
+        if options['once']:
+            self.write_stats(outbox.drain(batch_size))
+            self.stdout.write(self.style.SUCCESS('Delivery completed!'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Sending pending notifications...'))
+        self.stdout.write('Press Ctrl+C to stop.')
+        try:
+            while True:
+                stats = outbox.drain(batch_size)
+                if any(stats.values()):
+                    self.write_stats(stats)
+                time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('\nStopped sending notifications.'))
+
+    def write_stats(self, stats):
+        self.stdout.write(
+            f"Sent {stats['sent']} notifications "
+            f"({stats['retried']} to retry, {stats['failed']} failed)"
+        )
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement_api', '0002_alter_alertsettings_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='socialmediaprofile',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='socialmediaprofile',
+            name='lease_token',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='socialmediaprofile',
+            index=models.Index(fields=['last_checked'], name='engagement__last_ch_0b1255_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement_api', '0003_profile_leases'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='socialmediaprofile',
+            name='engagement__last_ch_0b1255_idx',
+        ),
+        migrations.AddField(
+            model_name='socialmediaprofile',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='socialmediaprofile',
+            index=models.Index(fields=['next_check_at'], name='engagement__next_ch_ec665d_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement_api', '0004_profile_next_check_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileInsightsRollup',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='insights_rollup', serialize=False, to='engagement_api.socialmediaprofile')),
+                ('baseline_count', models.IntegerField(blank=True, help_text='Latest recorded follower count at least 24 hours before updated_at', null=True)),
+                ('baseline_recorded_at', models.DateTimeField(blank=True, null=True)),
+                ('recent_history', models.JSONField(default=list, help_text='Latest history points, newest first')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
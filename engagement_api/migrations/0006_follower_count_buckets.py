@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement_api', '0005_profileinsightsrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowerCountBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('first_count', models.IntegerField()),
+                ('min_count', models.IntegerField()),
+                ('max_count', models.IntegerField()),
+                ('last_count', models.IntegerField()),
+                ('samples', models.IntegerField(help_text='Number of raw history points in the bucket')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HistoryCompactionState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=10, unique=True)),
+                ('compacted_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='followercounthistory',
+            index=models.Index(fields=['recorded_at'], name='engagement__recorde_093d58_idx'),
+        ),
+        migrations.AddField(
+            model_name='followercountbucket',
+            name='profile',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower_buckets', to='engagement_api.socialmediaprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='followercountbucket',
+            index=models.Index(fields=['resolution', 'bucket_start'], name='engagement__resolut_fb0b1a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='followercountbucket',
+            constraint=models.UniqueConstraint(fields=('profile', 'resolution', 'bucket_start'), name='unique_follower_count_bucket'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def record_fired_milestones(apps, schema_editor):
+    """Milestones that already alerted must not alert again"""
+    AlertNotification = apps.get_model('engagement_api', 'AlertNotification')
+    Milestone = apps.get_model('engagement_api', 'Milestone')
+    fired = (
+        AlertNotification.objects
+        .values('profile_id', 'milestone_followers')
+        .annotate(fired_at=models.Min('sent_at'))
+    )
+    Milestone.objects.bulk_create(
+        [
+            Milestone(
+                profile_id=row['profile_id'],
+                threshold=row['milestone_followers'],
+                is_custom=False,
+                fired_at=row['fired_at'],
+            )
+            for row in fired
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement_api', '0006_follower_count_buckets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertsettings',
+            name='milestone_step',
+            field=models.IntegerField(blank=True, help_text='Also alert on every multiple of this many followers', null=True),
+        ),
+        migrations.CreateModel(
+            name='Milestone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.IntegerField()),
+                ('is_custom', models.BooleanField(default=True)),
+                ('fired_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milestones', to='engagement_api.socialmediaprofile')),
+            ],
+            options={
+                'ordering': ['threshold'],
+                'constraints': [models.UniqueConstraint(fields=('profile', 'threshold'), name='unique_profile_milestone')],
+            },
+        ),
+        migrations.RunPython(record_fired_milestones, migrations.RunPython.noop),
+    ]
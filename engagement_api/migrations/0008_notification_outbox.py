@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:49
+
+from django.db import migrations, models
+
+
+def settle_existing_notifications(apps, schema_editor):
+    """Notifications from before the outbox were sent inline, never queue them again"""
+    AlertNotification = apps.get_model('engagement_api', 'AlertNotification')
+    AlertNotification.objects.filter(telegram_sent=True).update(delivery_status='sent', delivery_attempts=1)
+    AlertNotification.objects.filter(telegram_sent=False).update(delivery_status='skipped')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement_api', '0007_milestones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertnotification',
+            name='delivery_attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='alertnotification',
+            name='delivery_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='alertnotification',
+            name='last_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='alertnotification',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='alertnotification',
+            name='telegram_chat_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='alertnotification',
+            index=models.Index(fields=['delivery_status', 'next_attempt_at'], name='engagement__deliver_92ef06_idx'),
+        ),
+        migrations.RunPython(settle_existing_notifications, migrations.RunPython.noop),
+    ]
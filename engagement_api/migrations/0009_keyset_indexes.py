@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement_api', '0008_notification_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alertnotification',
+            index=models.Index(fields=['-sent_at', '-id'], name='engagement__sent_at_530fce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followercounthistory',
+            index=models.Index(fields=['profile', '-recorded_at', '-id'], name='engagement__profile_679283_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='socialmediaprofile',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='engagement__user_id_4e42ff_idx'),
+        ),
+        # Superseded by the (profile, -recorded_at, -id) index created above
+        migrations.RemoveIndex(
+            model_name='followercounthistory',
+            name='engagement__profile_faec37_idx',
+        ),
+    ]
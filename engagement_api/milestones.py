@@ -0,0 +1,157 @@
+"""
+Milestone matching for a sweep chunk
+A profile alerts on its AlertSettings.milestone_followers, on every multiple
+of milestone_step and on its custom Milestone thresholds. Crossed thresholds
+are found for a whole chunk with one range query and a bisect per profile,
+and every fired threshold is recorded so it never alerts twice.
+
+Step multiples only move upwards: a jump over several multiples alerts once,
+for the highest, and no multiple at or below a fired non-custom threshold
+alerts later, so the skipped ones stay spent without a row each. Custom
+thresholds are the list set through the API, fired or not: removing one
+deletes it, and adding it back arms it again.
+"""
+import random
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Milestone
+
+
+def find_crossed_milestones(checked, alert_settings_by_profile):
+    """
+    Thresholds crossed upwards by each profile in ``checked`` (a list of
+    (profile, old_count, new_count)) that have not fired before.
+    Returns a list of (profile, threshold, new_count, milestone id or None).
+    """
+    rising = [
+        (profile, old_count, new_count)
+        for profile, old_count, new_count in checked
+        if new_count > old_count and profile.id in alert_settings_by_profile
+    ]
+    if not rising:
+        return []
+
+    # One range query covering every profile's (old, new] interval, and the
+    # fired thresholds above it that spend the step multiples below them
+    lowest = min(old_count for _, old_count, _ in rising)
+    stored = defaultdict(list)
+    for milestone in Milestone.objects.filter(
+        profile_id__in=[profile.id for profile, _, _ in rising],
+        threshold__gt=lowest
+    ).order_by('profile_id', 'threshold'):
+        stored[milestone.profile_id].append(milestone)
+
+    crossed = []
+    for profile, old_count, new_count in rising:
+        milestones = stored[profile.id]
+        thresholds = [milestone.threshold for milestone in milestones]
+        in_range = milestones[bisect_right(thresholds, old_count):bisect_right(thresholds, new_count)]
+        fired = {milestone.threshold for milestone in in_range if milestone.fired_at}
+
+        candidates = {
+            milestone.threshold: milestone.id
+            for milestone in in_range
+            if not milestone.fired_at
+        }
+        alert_settings = alert_settings_by_profile[profile.id]
+        if old_count < alert_settings.milestone_followers <= new_count:
+            candidates.setdefault(alert_settings.milestone_followers, None)
+        step = alert_settings.milestone_step
+        if step and step > 0 and new_count // step > old_count // step:
+            # A jump over several multiples alerts once, for the highest one,
+            # unless a fired non-custom threshold at or above it spent it
+            multiple = new_count // step * step
+            if not any(
+                milestone.fired_at and not milestone.is_custom
+                for milestone in milestones[bisect_left(thresholds, multiple):]
+            ):
+                candidates.setdefault(multiple, None)
+
+        for threshold in sorted(candidates):
+            if threshold not in fired:
+                crossed.append((profile, threshold, new_count, candidates[threshold]))
+    return crossed
+
+
+def mark_milestones_fired(crossed, now=None):
+    """
+    Record the thresholds from find_crossed_milestones as fired and return
+    the ones this call claimed: pending custom rows it locked, and the other
+    thresholds' rows it inserted itself. Must run inside the transaction
+    that creates their notifications.
+    """
+    now = now or timezone.now()
+    # Random microseconds make the fire time unique to this call, so the rows
+    # it inserted can be told from those a concurrent sweep inserted first
+    fired_at = now + timedelta(microseconds=random.randrange(1000000))
+    custom_ids = [milestone_id for _, _, _, milestone_id in crossed if milestone_id]
+    claimed_ids = set()
+    if custom_ids:
+        claimed_ids = set(
+            Milestone.objects.select_for_update(skip_locked=True)
+            .filter(id__in=custom_ids, fired_at__isnull=True)
+            .values_list('id', flat=True)
+        )
+        Milestone.objects.filter(id__in=claimed_ids).update(fired_at=fired_at)
+
+    reached = [(profile, threshold) for profile, threshold, _, milestone_id in crossed if milestone_id is None]
+    claimed = set()
+    if reached:
+        Milestone.objects.bulk_create(
+            [
+                Milestone(profile=profile, threshold=threshold, is_custom=False, fired_at=fired_at)
+                for profile, threshold in reached
+            ],
+            ignore_conflicts=True
+        )
+        claimed = set(
+            Milestone.objects.filter(
+                profile_id__in={profile.id for profile, _ in reached},
+                threshold__in={threshold for _, threshold in reached},
+                is_custom=False,
+                fired_at=fired_at
+            ).values_list('profile_id', 'threshold')
+        )
+    return [
+        (profile, threshold, new_count, milestone_id)
+        for profile, threshold, new_count, milestone_id in crossed
+        if (milestone_id in claimed_ids if milestone_id else (profile.id, threshold) in claimed)
+    ]
+
+
+def set_custom_milestones(profile, thresholds):
+    """Replace a profile's custom thresholds, fired or not; the ones kept keep their state"""
+    thresholds = set(thresholds)
+    Milestone.objects.filter(profile=profile, is_custom=True).exclude(threshold__in=thresholds).delete()
+    Milestone.objects.bulk_create(
+        [Milestone(profile=profile, threshold=threshold) for threshold in sorted(thresholds)],
+        ignore_conflicts=True
+    )
+
+
+def replace_custom_milestones(thresholds_by_profile):
+    """set_custom_milestones for many profiles, in a fixed number of queries"""
+    if not thresholds_by_profile:
+        return
+    wanted = {profile_id: set(thresholds) for profile_id, thresholds in thresholds_by_profile.items()}
+    stale = [
+        milestone_id
+        for milestone_id, profile_id, threshold in Milestone.objects.filter(
+            profile_id__in=wanted, is_custom=True
+        ).values_list('id', 'profile_id', 'threshold')
+        if threshold not in wanted[profile_id]
+    ]
+    if stale:
+        Milestone.objects.filter(id__in=stale).delete()
+    Milestone.objects.bulk_create(
+        [
+            Milestone(profile_id=profile_id, threshold=threshold)
+            for profile_id, thresholds in wanted.items()
+            for threshold in sorted(thresholds)
+        ],
+        ignore_conflicts=True
+    )
@@ -2,7 +2,7 @@ from django.contrib.auth.models import User
 from django.db import models
 
 from .base import TimeStampedBaseModel
-from .choices import PlatformChoice
+from .choices import BucketResolutionChoice, DeliveryStatusChoice, LiveEventKindChoice, PlatformChoice
 
 
 class SocialMediaProfile(TimeStampedBaseModel):
@@ -12,10 +12,19 @@ class SocialMediaProfile(TimeStampedBaseModel):
     username = models.CharField(max_length=100)
     current_follower_count = models.IntegerField(default=0)
     last_checked = models.DateTimeField(null=True, blank=True)
+    # When the sweeper should poll this profile next (see engagement_api.scheduling)
+    next_check_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Set while a check_followers worker holds the profile (see tasks.claim_due_profiles)
+    lease_token = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         unique_together = ['user', 'platform', 'username']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['next_check_at']),
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.platform}: {self.username} ({self.user.username})"
@@ -25,6 +34,11 @@ class AlertSettings(TimeStampedBaseModel):
     """Model to store milestone alert settings for profiles"""
     profile = models.OneToOneField(SocialMediaProfile, on_delete=models.CASCADE, related_name='alert_settings')
     milestone_followers = models.IntegerField(help_text="Follower count milestone to alert on")
+    milestone_step = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Also alert on every multiple of this many followers"
+    )
     telegram_chat_id = models.CharField(
         max_length=100,
         blank=True,
@@ -40,6 +54,29 @@ class AlertSettings(TimeStampedBaseModel):
         return f"Alert for {self.profile.username} at {self.milestone_followers} followers"
 
 
+class Milestone(models.Model):
+    """
+    A follower count threshold of a profile
+    Custom thresholds are configured through AlertSettings; the others are
+    recorded when milestone_followers or a milestone_step multiple fires,
+    so that no threshold ever alerts twice
+    """
+    profile = models.ForeignKey(SocialMediaProfile, on_delete=models.CASCADE, related_name='milestones')
+    threshold = models.IntegerField()
+    is_custom = models.BooleanField(default=True)
+    fired_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['threshold']
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'threshold'], name='unique_profile_milestone'),
+        ]
+
+    def __str__(self):
+        return f"Milestone {self.threshold} for profile {self.profile_id}"
+
+
 class FollowerCountHistory(models.Model):
     """Model to track follower count changes over time"""
     profile = models.ForeignKey(SocialMediaProfile, on_delete=models.CASCADE, related_name='follower_history')
@@ -49,13 +86,71 @@ class FollowerCountHistory(models.Model):
     class Meta:
         ordering = ['-recorded_at']
         indexes = [
-            models.Index(fields=['profile', '-recorded_at']),
+            models.Index(fields=['profile', '-recorded_at', '-id']),
+            models.Index(fields=['recorded_at']),
         ]
 
     def __str__(self):
         return f"{self.profile.username}: {self.follower_count} at {self.recorded_at}"
 
 
+class FollowerCountBucket(models.Model):
+    """Downsampled follower counts (hourly or daily) produced by history compaction"""
+    profile = models.ForeignKey(SocialMediaProfile, on_delete=models.CASCADE, related_name='follower_buckets')
+    resolution = models.CharField(max_length=10, choices=BucketResolutionChoice.choices)
+    bucket_start = models.DateTimeField()
+    first_count = models.IntegerField()
+    min_count = models.IntegerField()
+    max_count = models.IntegerField()
+    last_count = models.IntegerField()
+    samples = models.IntegerField(help_text="Number of raw history points in the bucket")
+
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['profile', 'resolution', 'bucket_start'],
+                name='unique_follower_count_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket_start']),
+        ]
+
+    def __str__(self):
+        return f"{self.profile_id} {self.resolution} {self.bucket_start}: {self.last_count}"
+
+
+class HistoryCompactionState(models.Model):
+    """How far follower history has been compacted into each bucket resolution"""
+    resolution = models.CharField(max_length=10, choices=BucketResolutionChoice.choices, unique=True)
+    compacted_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.resolution} buckets complete until {self.compacted_until}"
+
+
+class ProfileInsightsRollup(models.Model):
+    """Precomputed 24h insights for a profile, maintained by the polling task"""
+    profile = models.OneToOneField(
+        SocialMediaProfile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='insights_rollup'
+    )
+    baseline_count = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Latest recorded follower count at least 24 hours before updated_at"
+    )
+    baseline_recorded_at = models.DateTimeField(null=True, blank=True)
+    recent_history = models.JSONField(default=list, help_text="Latest history points, newest first")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Insights rollup for profile {self.profile_id}"
+
+
 class AlertNotification(models.Model):
     """Model to store sent alert notifications"""
     profile = models.ForeignKey(SocialMediaProfile, on_delete=models.CASCADE, related_name='notifications')
@@ -64,9 +159,43 @@ class AlertNotification(models.Model):
     message = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
     telegram_sent = models.BooleanField(default=False)
+    # Outbox state, drained by the send_notifications command
+    telegram_chat_id = models.CharField(max_length=100, blank=True, null=True)
+    delivery_status = models.CharField(
+        max_length=10,
+        choices=DeliveryStatusChoice.choices,
+        default=DeliveryStatusChoice.PENDING
+    )
+    delivery_attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
 
     class Meta:
         ordering = ['-sent_at']
+        indexes = [
+            models.Index(fields=['delivery_status', 'next_attempt_at']),
+            models.Index(fields=['-sent_at', '-id']),
+        ]
 
     def __str__(self):
         return f"Alert for {self.profile.username} at {self.milestone_followers} followers"
+
+
+class LiveEvent(models.Model):
+    """
+    An update for a user's live event stream (see engagement_api.live),
+    written by the sweeper and pruned after LIVE_EVENT_RETENTION_SECONDS
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='live_events')
+    kind = models.CharField(max_length=20, choices=LiveEventKindChoice.choices)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} event {self.id} for user {self.user_id}"
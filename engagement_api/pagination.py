@@ -0,0 +1,46 @@
+"""
+Keyset (cursor) pagination for the list endpoints
+Each ordering ends in ``id`` so it is total, and is backed by a composite
+index on the same columns; pages cost the same however deep a client reads
+"""
+from asgiref.sync import sync_to_async
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ProfileCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class NotificationCursorPagination(KeysetPagination):
+    ordering = ('-sent_at', '-id')
+
+
+class HistoryCursorPagination(KeysetPagination):
+    ordering = ('-recorded_at', '-id')
+
+
+class CursorPaginatedMixin:
+    """List responses for APIViews, paginated with ``pagination_class``"""
+    pagination_class = KeysetPagination
+
+    def paginate(self, queryset, payload=None):
+        """Serialize a page with ``serializer_class``, or map ``.values()`` rows with ``payload``"""
+        return self._paginate(self.request, queryset, payload)
+
+    async def apaginate(self, queryset, payload=None):
+        """paginate for async views, the page is read in the ORM's worker thread"""
+        return await sync_to_async(self._paginate)(self.request, queryset, payload)
+
+    def _paginate(self, request, queryset, payload):
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        if payload is not None:
+            data = [payload(row) for row in page]
+        else:
+            data = self.serializer_class(page, many=True).data
+        return paginator.get_paginated_response(data)
@@ -0,0 +1,95 @@
+"""
+Read-only response payloads built straight from ``.values()`` rows
+These produce the same JSON as the matching serializers without model
+instances, field objects or per-row related lookups; the profile label that
+StringRelatedField would fetch is built from columns selected up front
+"""
+from django.db.models import F
+
+from .rollups import format_timestamp
+
+HISTORY_FIELDS = ('id', 'follower_count', 'recorded_at')
+NOTIFICATION_FIELDS = (
+    'id', 'milestone_followers', 'follower_count_at_alert', 'message',
+    'sent_at', 'telegram_sent', 'delivery_status',
+)
+
+
+def profile_label(platform, username, owner):
+    """Same text as SocialMediaProfile.__str__"""
+    return f"{platform}: {username} ({owner})"
+
+
+def _timestamp(value):
+    return format_timestamp(value) if value is not None else None
+
+
+def insights_rows(profiles):
+    """Columns of ``profiles`` and their rollups needed by insights_payload"""
+    return profiles.values(
+        'id', 'username', 'platform', 'current_follower_count', 'last_checked',
+        baseline_count=F('insights_rollup__baseline_count'),
+        recent_history=F('insights_rollup__recent_history'),
+    )
+
+
+def insights_payload(row, owner):
+    """24h insights of one insights_rows row, ``owner`` being the profile owner's username"""
+    # Follower count 24 hours ago, as of the last sweep
+    baseline_count = row['baseline_count']
+    current_count = row['current_follower_count']
+    old_count = baseline_count if baseline_count is not None else current_count
+
+    follower_change = current_count - old_count
+    follower_change_percentage = ((follower_change / old_count * 100) if old_count > 0 else 0)
+
+    label = profile_label(row['platform'], row['username'], owner)
+    return {
+        'profile_id': row['id'],
+        'username': row['username'],
+        'platform': row['platform'],
+        'current_follower_count': current_count,
+        'last_checked': _timestamp(row['last_checked']),
+        'follower_change_24h': follower_change,
+        'follower_change_percentage_24h': float(round(follower_change_percentage, 2)),
+        'recent_history': [
+            {
+                'id': point['id'],
+                'profile': label,
+                'follower_count': point['follower_count'],
+                'recorded_at': point['recorded_at'],
+            }
+            for point in row['recent_history'] or []
+        ],
+    }
+
+
+def history_payload(row, label):
+    return {
+        'id': row['id'],
+        'profile': label,
+        'follower_count': row['follower_count'],
+        'recorded_at': _timestamp(row['recorded_at']),
+    }
+
+
+def notification_rows(notifications):
+    return notifications.values(
+        *NOTIFICATION_FIELDS,
+        profile_platform=F('profile__platform'),
+        profile_username=F('profile__username'),
+        profile_owner=F('profile__user__username'),
+    )
+
+
+def notification_payload(row):
+    return {
+        'id': row['id'],
+        'profile': profile_label(row['profile_platform'], row['profile_username'], row['profile_owner']),
+        'milestone_followers': row['milestone_followers'],
+        'follower_count_at_alert': row['follower_count_at_alert'],
+        'message': row['message'],
+        'sent_at': _timestamp(row['sent_at']),
+        'telegram_sent': row['telegram_sent'],
+        'delivery_status': row['delivery_status'],
+    }
@@ -0,0 +1,129 @@
+"""
+Incrementally maintained 24h insights rollups
+The polling task keeps one ProfileInsightsRollup row per profile up to date so
+the insights endpoints can be served from a single query
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import F, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import SocialMediaProfile, FollowerCountHistory, ProfileInsightsRollup
+
+INSIGHTS_WINDOW = timedelta(hours=24)
+RECENT_HISTORY_SIZE = 10
+
+ROLLUP_FIELDS = ['baseline_count', 'baseline_recorded_at', 'recent_history', 'updated_at']
+
+
+def format_timestamp(value):
+    """ISO 8601 in UTC with a Z suffix, the same output as DRF's DateTimeField"""
+    return value.astimezone(dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def history_point(history):
+    return {
+        'id': history.id,
+        'follower_count': history.follower_count,
+        'recorded_at': format_timestamp(history.recorded_at),
+    }
+
+
+def _baselines(profile_ids, now):
+    """Latest (count, recorded_at) at least INSIGHTS_WINDOW old for each profile, in one query"""
+    older = FollowerCountHistory.objects.filter(
+        profile=OuterRef('pk'),
+        recorded_at__lte=now - INSIGHTS_WINDOW
+    ).order_by('-recorded_at')
+    rows = SocialMediaProfile.objects.filter(id__in=profile_ids).annotate(
+        baseline_count=Subquery(older.values('follower_count')[:1]),
+        baseline_recorded_at=Subquery(older.values('recorded_at')[:1]),
+    ).values_list('id', 'baseline_count', 'baseline_recorded_at')
+    return {profile_id: (count, recorded_at) for profile_id, count, recorded_at in rows}
+
+
+def _save(rollups):
+    ProfileInsightsRollup.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=['profile'],
+        update_fields=ROLLUP_FIELDS,
+    )
+
+
+def load_rollups(profile_ids):
+    return ProfileInsightsRollup.objects.in_bulk(profile_ids)
+
+
+def last_recorded_point(rollup):
+    """(follower_count, recorded_at) of the newest stored history point, if any"""
+    if rollup is None or not rollup.recent_history:
+        return None
+    point = rollup.recent_history[0]
+    return point['follower_count'], parse_datetime(point['recorded_at'])
+
+
+def refresh_rollups(profile_ids, new_history, now=None, rollups=None):
+    """
+    Bring the rollups of freshly polled profiles up to date: move their 24h
+    baseline and fold in the history rows written for them (not every poll
+    writes one). Costs three queries however many profiles are passed in,
+    two if ``rollups`` were already loaded with load_rollups; profiles
+    without a rollup yet are rebuilt from their stored history.
+    """
+    if not profile_ids:
+        return
+    now = now or timezone.now()
+
+    if rollups is None:
+        rollups = load_rollups(profile_ids)
+    missing_ids = [profile_id for profile_id in profile_ids if profile_id not in rollups]
+    if missing_ids:
+        # Rebuilding reads the new rows too, so nothing is left to fold in for them
+        rebuild_rollups(missing_ids, now)
+
+    existing_ids = [profile_id for profile_id in profile_ids if profile_id in rollups]
+    if not existing_ids:
+        return
+    baselines = _baselines(existing_ids, now)
+    new_points = {history.profile_id: history_point(history) for history in new_history}
+
+    updated = []
+    for profile_id in existing_ids:
+        rollup = rollups[profile_id]
+        rollup.baseline_count, rollup.baseline_recorded_at = baselines.get(profile_id, (None, None))
+        if profile_id in new_points:
+            rollup.recent_history = [new_points[profile_id]] + rollup.recent_history[:RECENT_HISTORY_SIZE - 1]
+        rollup.updated_at = now
+        updated.append(rollup)
+    _save(updated)
+
+
+def rebuild_rollups(profile_ids, now=None):
+    """Recompute rollups for the given profiles from FollowerCountHistory"""
+    now = now or timezone.now()
+    baselines = _baselines(profile_ids, now)
+
+    recent = {profile_id: [] for profile_id in baselines}
+    rows = FollowerCountHistory.objects.filter(profile_id__in=profile_ids).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=F('profile_id'),
+            order_by=[F('recorded_at').desc(), F('id').desc()],
+        )
+    ).filter(position__lte=RECENT_HISTORY_SIZE).order_by('profile_id', 'position')
+    for history in rows:
+        recent[history.profile_id].append(history_point(history))
+
+    _save([
+        ProfileInsightsRollup(
+            profile_id=profile_id,
+            baseline_count=baseline_count,
+            baseline_recorded_at=baseline_recorded_at,
+            recent_history=recent[profile_id],
+            updated_at=now,
+        )
+        for profile_id, (baseline_count, baseline_recorded_at) in baselines.items()
+    ])
@@ -0,0 +1,114 @@
+"""
+Read replica routing for the read-only endpoints
+GET handlers decorated with ``read_from_replica`` send their reads to one of
+the DATABASE_REPLICAS aliases; everything else, and every write, uses the
+primary. A user whose data was just written is pinned to the primary for
+DB_REPLICA_PIN_SECONDS, so they read their own writes even while the
+replicas lag behind. Pins live in the cache, which must be shared (Redis)
+for pins set by the polling task to reach the web processes: the settings
+refuse DB_REPLICAS without CACHE_REDIS_URL.
+"""
+import random
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+KEY_PREFIX = 'engagement:pin'
+GLOBAL_SCOPE = 'all'
+
+# Database alias reads of the current request go to, None for the default routing
+_read_alias = ContextVar('engagement_read_alias', default=None)
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def _cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def _pin_key(scope):
+    return f'{KEY_PREFIX}:{scope}'
+
+
+def pin_to_primary(scopes):
+    """Read the data of ``scopes`` (user ids, or GLOBAL_SCOPE for everyone) from the primary for a while"""
+    seconds = getattr(settings, 'DB_REPLICA_PIN_SECONDS', 10)
+    if replica_aliases() and seconds:
+        _cache().set_many({_pin_key(scope): True for scope in scopes}, seconds)
+
+
+def is_pinned(user_id):
+    return bool(_cache().get_many([_pin_key(GLOBAL_SCOPE), _pin_key(user_id)]))
+
+
+async def ais_pinned(user_id):
+    return bool(await _cache().aget_many([_pin_key(GLOBAL_SCOPE), _pin_key(user_id)]))
+
+
+@contextmanager
+def replica_reads(user_id):
+    """Route the reads made inside the block to a replica, unless ``user_id`` is pinned"""
+    replicas = replica_aliases()
+    alias = random.choice(replicas) if replicas and not is_pinned(user_id) else None
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+@asynccontextmanager
+async def areplica_reads(user_id):
+    """replica_reads for async views; the async ORM carries the choice into its worker thread"""
+    replicas = replica_aliases()
+    alias = random.choice(replicas) if replicas and not await ais_pinned(user_id) else None
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def read_from_replica(view_method):
+    """Serve a read-only handler, sync or async, from a replica"""
+    if iscoroutinefunction(view_method):
+        @wraps(view_method)
+        async def async_wrapper(self, request, *args, **kwargs):
+            async with areplica_reads(request.user.pk):
+                return await view_method(self, request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        with replica_reads(request.user.pk):
+            return view_method(self, request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica chosen for the current request and every
+    write to the primary, including saves of instances read from a replica
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
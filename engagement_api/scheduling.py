@@ -0,0 +1,132 @@
+"""
+Due-time scheduling for follower count checks
+Every profile carries a next_check_at; schedules decide it after each poll
+and DueTimeScheduler polls profiles in due order from a heap
+"""
+import heapq
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import SocialMediaProfile
+
+DEFAULT_INTERVAL = 300
+
+
+class FixedSchedule:
+    """Poll every profile every ``interval`` seconds"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+
+    def next_delay(self, profile, old_count, new_count, milestone, now):
+        return self.interval
+
+    def next_check_at(self, profile, old_count, new_count, milestone, now):
+        return now + timedelta(seconds=self.next_delay(profile, old_count, new_count, milestone, now))
+
+
+class AdaptiveSchedule(FixedSchedule):
+    """
+    Poll changing profiles every ``interval`` seconds, fast movers and
+    profiles approaching their milestone more often, and back off
+    geometrically (up to ``max_interval``) while a count stays unchanged
+    """
+
+    # Relative change per interval above which a profile counts as fast moving
+    fast_change_ratio = 0.01
+    backoff_factor = 2
+
+    def __init__(self, interval=DEFAULT_INTERVAL, min_interval=60, max_interval=3600):
+        super().__init__(interval)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+    def next_delay(self, profile, old_count, new_count, milestone, now):
+        elapsed = (now - profile.last_checked).total_seconds() if profile.last_checked else None
+
+        if new_count == old_count and elapsed:
+            previous_delay = elapsed
+            if profile.next_check_at and profile.next_check_at > profile.last_checked:
+                previous_delay = (profile.next_check_at - profile.last_checked).total_seconds()
+            delay = max(self.interval, previous_delay * self.backoff_factor)
+        else:
+            delay = self.interval
+            if elapsed and abs(new_count - old_count) / elapsed * self.interval >= \
+                    self.fast_change_ratio * max(new_count, 1):
+                delay = self.interval / 2
+
+        # Check at least twice before the projected milestone crossing
+        if milestone and new_count < milestone and elapsed and new_count > old_count:
+            rate = (new_count - old_count) / elapsed
+            delay = min(delay, (milestone - new_count) / rate / 2)
+
+        return min(self.max_interval, max(self.min_interval, delay))
+
+
+class DueTimeScheduler:
+    """
+    Keeps (next_check_at, profile id) for every profile in a heap and hands
+    whatever is due to ``process_chunk`` in chunks of ``batch_size``;
+    ``process_chunk`` sets next_check_at and returns the ids it checked.
+    Due times are absolute, so the polling period does not drift with sweep
+    duration. The heap is rebuilt from the database every ``refresh_seconds``
+    to pick up new and deleted profiles.
+    """
+
+    def __init__(self, process_chunk, batch_size, refresh_seconds=60, retry_seconds=60):
+        self.process_chunk = process_chunk
+        self.batch_size = batch_size
+        self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        self._heap = []
+        self._loaded_at = None
+
+    def load(self):
+        now = timezone.now()
+        self._heap = [
+            (next_check_at or now, profile_id)
+            for profile_id, next_check_at in SocialMediaProfile.objects.values_list('id', 'next_check_at')
+        ]
+        heapq.heapify(self._heap)
+        self._loaded_at = time.monotonic()
+
+    def seconds_until_due(self):
+        if not self._heap:
+            return self.refresh_seconds
+        return max(0.0, (self._heap[0][0] - timezone.now()).total_seconds())
+
+    def run_due(self):
+        """
+        Poll every profile that is due now. Returns the number of chunks
+        processed, each chunk also being reported to ``process_chunk``.
+        """
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            self.load()
+
+        chunks = 0
+        while self._heap and self._heap[0][0] <= timezone.now():
+            due_ids = []
+            while self._heap and self._heap[0][0] <= timezone.now() and len(due_ids) < self.batch_size:
+                due_ids.append(heapq.heappop(self._heap)[1])
+
+            profiles = SocialMediaProfile.objects.in_bulk(due_ids)
+            checked_ids = set(self.process_chunk([profiles[pid] for pid in due_ids if pid in profiles]))
+            chunks += 1
+
+            retry_at = timezone.now() + timedelta(seconds=self.retry_seconds)
+            for profile_id in due_ids:
+                if profile_id not in profiles:
+                    continue  # deleted since the heap was loaded
+                if profile_id in checked_ids:
+                    heapq.heappush(self._heap, (profiles[profile_id].next_check_at, profile_id))
+                else:
+                    heapq.heappush(self._heap, (retry_at, profile_id))
+
+        return chunks
+
+    def run_forever(self):
+        while True:
+            self.run_due()
+            time.sleep(min(self.seconds_until_due(), self.refresh_seconds))
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from .milestones import set_custom_milestones
 from .models import SocialMediaProfile, AlertSettings, FollowerCountHistory, AlertNotification
 
 
@@ -22,19 +23,81 @@ class SocialMediaProfileSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'last_checked']
 
+    def update(self, instance, validated_data):
+        # Only the fields sent: the sweeper's columns (last_checked,
+        # next_check_at, the lease) must not be written back stale
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
 
 class AlertSettingsSerializer(serializers.ModelSerializer):
     profile = SocialMediaProfileSerializer(read_only=True)
     profile_id = serializers.IntegerField(write_only=True, required=False)
+    milestone_step = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    milestones = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        help_text="Additional follower count thresholds to alert on"
+    )
     
     class Meta:
         model = AlertSettings
         fields = [
-            'id', 'profile', 'profile_id', 'milestone_followers', 
-            'telegram_chat_id', 'is_active', 'created_at', 'updated_at'
+            'id', 'profile', 'profile_id', 'milestone_followers', 'milestone_step',
+            'milestones', 'telegram_chat_id', 'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['milestones'] = [
+            milestone.threshold
+            for milestone in instance.profile.milestones.all()
+            if milestone.is_custom
+        ]
+        return data
+
+    def create(self, validated_data):
+        milestones = validated_data.pop('milestones', None)
+        alert_settings = super().create(validated_data)
+        if milestones is not None:
+            set_custom_milestones(alert_settings.profile, milestones)
+        return alert_settings
+
+    def update(self, instance, validated_data):
+        milestones = validated_data.pop('milestones', None)
+        alert_settings = super().update(instance, validated_data)
+        if milestones is not None:
+            set_custom_milestones(alert_settings.profile, milestones)
+        return alert_settings
+
+
+class BulkAlertSettingsSerializer(AlertSettingsSerializer):
+    """
+    An item of a bulk alert settings request, validated with partial=True:
+    its profile given by ``profile_id`` or by ``platform`` and ``username``.
+    In CSV ``milestones`` is a list of thresholds separated by semicolons.
+    """
+    platform = serializers.ChoiceField(choices=SocialMediaProfile._meta.get_field('platform').choices, required=False)
+    username = serializers.CharField(max_length=100, required=False)
+
+    class Meta(AlertSettingsSerializer.Meta):
+        fields = [*AlertSettingsSerializer.Meta.fields, 'platform', 'username']
+
+    def to_internal_value(self, data):
+        if isinstance(data.get('milestones'), str):
+            data = {**data, 'milestones': [value for value in data['milestones'].split(';') if value.strip()]}
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        if ('platform' in attrs) != ('username' in attrs):
+            raise serializers.ValidationError('Give platform and username together.')
+        if 'profile_id' not in attrs and 'platform' not in attrs:
+            raise serializers.ValidationError('Give profile_id, or platform and username.')
+        return attrs
+
 
 class FollowerCountHistorySerializer(serializers.ModelSerializer):
     profile = serializers.StringRelatedField(read_only=True)
@@ -53,7 +116,7 @@ class AlertNotificationSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'profile', 'milestone_followers', 
             'follower_count_at_alert', 'message', 
-            'sent_at', 'telegram_sent'
+            'sent_at', 'telegram_sent', 'delivery_status'
         ]
         read_only_fields = ['id', 'sent_at']
 
@@ -0,0 +1,161 @@
+"""
+Bucketed follower count series for charts
+A series over any window, in hourly or daily buckets, is put together from
+the coarsest data covering each part of the window: stored buckets of the
+requested resolution up to their compaction watermark, then the finer
+buckets and the raw history past it, aggregated in the database with
+TruncHour/TruncDay. The rows read per request are bounded: one stored
+bucket per point, at most MAX_SERIES_POINTS, plus SERIES_MAX_TAIL_ROWS for
+each not yet compacted tail.
+"""
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Min, Subquery, Sum, Window
+from django.db.models.expressions import RowRange
+from django.db.models.functions import FirstValue, LastValue, RowNumber, Trunc
+from rest_framework.exceptions import ValidationError
+
+from .choices import BucketResolutionChoice
+from .compaction import BUCKET_SPANS, floor_to, hourly_retention, watermarks
+from .models import FollowerCountHistory, FollowerCountBucket
+from .rollups import format_timestamp
+
+DEFAULT_SERIES_WINDOW = '7d'
+MAX_SERIES_POINTS = 1000
+
+SERIES_FIELDS = ('first_count', 'min_count', 'max_count', 'last_count', 'samples')
+
+
+def max_tail_rows():
+    return getattr(settings, 'SERIES_MAX_TAIL_ROWS', 5000)
+
+
+def parse_bucket(value, window, field='bucket'):
+    """
+    Bucket resolution for a series over ``window``: 'hour' or 'day', by
+    default hourly while that stays within MAX_SERIES_POINTS points and the
+    hourly retention
+    """
+    if value in (None, ''):
+        hours = window / BUCKET_SPANS[BucketResolutionChoice.HOUR]
+        fits = window <= hourly_retention() and hours <= MAX_SERIES_POINTS
+        value = BucketResolutionChoice.HOUR if fits else BucketResolutionChoice.DAY
+    if value not in BucketResolutionChoice.values:
+        raise ValidationError({field: [f"Use one of: {', '.join(BucketResolutionChoice.values)}."]})
+    if window / BUCKET_SPANS[value] > MAX_SERIES_POINTS:
+        raise ValidationError({
+            field: [f'More than {MAX_SERIES_POINTS} {value} buckets, use a shorter window or a larger bucket.']
+        })
+    if value == BucketResolutionChoice.HOUR and window > hourly_retention():
+        raise ValidationError({field: [f'Hourly buckets are kept for {hourly_retention().days} days, use day.']})
+    return value
+
+
+def _aggregated(rows, time_field, first_field, min_field, max_field, last_field, samples, resolution):
+    """
+    One profile's ``rows`` grouped into ``resolution`` buckets by the
+    database, with the number of rows read for each
+    """
+    bucket = Trunc(time_field, resolution, tzinfo=dt_timezone.utc)
+    partition = {
+        'partition_by': [bucket],
+        'order_by': [F(time_field).asc(), F('id').asc()],
+    }
+    return rows.annotate(
+        bucket=bucket,
+        bucket_first=Window(FirstValue(first_field), frame=RowRange(None, None), **partition),
+        bucket_last=Window(LastValue(last_field), frame=RowRange(None, None), **partition),
+        bucket_min=Window(Min(min_field), partition_by=[bucket]),
+        bucket_max=Window(Max(max_field), partition_by=[bucket]),
+        bucket_samples=Window(samples, partition_by=[bucket]),
+        bucket_rows=Window(Count('id'), partition_by=[bucket]),
+        position=Window(RowNumber(), **partition),
+    ).filter(position=1).order_by('bucket').values_list(
+        'bucket', 'bucket_first', 'bucket_min', 'bucket_max', 'bucket_last', 'bucket_samples', 'bucket_rows'
+    )
+
+
+def _newest(rows, time_field, limit):
+    """The newest ``limit`` of ``rows``, the cap on what a tail may read"""
+    return rows.filter(id__in=Subquery(rows.order_by(f'-{time_field}', '-id').values('id')[:limit]))
+
+
+def follower_series(profile_id, since, resolution, now):
+    """
+    Follower counts of a profile since ``since`` in ``resolution`` buckets
+    Returns (points, truncated), points being (bucket_start, first_count,
+    min_count, max_count, last_count, samples) tuples in time order for the
+    buckets holding data. ``truncated`` is set when a tail had more rows than
+    SERIES_MAX_TAIL_ROWS, leaving its oldest buckets out.
+    """
+    start = floor_to(since, resolution)
+    done = watermarks()
+    hourly_done = max(done.get(BucketResolutionChoice.HOUR, start), start)
+    limit = max_tail_rows()
+
+    sources = []
+    tails = []
+    truncated = False
+    buckets = FollowerCountBucket.objects.filter(profile_id=profile_id)
+    if resolution == BucketResolutionChoice.DAY:
+        daily_done = min(max(done.get(BucketResolutionChoice.DAY, start), start), hourly_done)
+        sources.append(
+            buckets.filter(resolution=resolution, bucket_start__gte=start, bucket_start__lt=daily_done)
+            .order_by('bucket_start').values_list('bucket_start', *SERIES_FIELDS)
+        )
+        # Hours compacted but not yet rolled up into days
+        hours = _newest(
+            buckets.filter(
+                resolution=BucketResolutionChoice.HOUR, bucket_start__gte=daily_done, bucket_start__lt=hourly_done
+            ),
+            'bucket_start', limit
+        )
+        tails.append(_aggregated(
+            hours, 'bucket_start', 'first_count', 'min_count', 'max_count', 'last_count', Sum('samples'), resolution
+        ))
+    else:
+        sources.append(
+            buckets.filter(resolution=resolution, bucket_start__gte=start, bucket_start__lt=hourly_done)
+            .order_by('bucket_start').values_list('bucket_start', *SERIES_FIELDS)
+        )
+    raw = _newest(
+        FollowerCountHistory.objects.filter(profile_id=profile_id, recorded_at__gte=hourly_done, recorded_at__lte=now),
+        'recorded_at', limit
+    )
+    # Not Count('id'): the same window expression twice comes back as a single column
+    tails.append(_aggregated(
+        raw, 'recorded_at', 'follower_count', 'follower_count', 'follower_count', 'follower_count',
+        Count('follower_count'), resolution
+    ))
+
+    rows = [list(source) for source in sources]
+    for tail in tails:
+        tail = list(tail)
+        truncated = truncated or sum(row[6] for row in tail) >= limit
+        rows.append([row[:6] for row in tail])
+
+    # Sources are in time order; a bucket straddling two of them is merged
+    points = {}
+    for source in rows:
+        for bucket_start, first_count, min_count, max_count, last_count, samples in source:
+            previous = points.get(bucket_start)
+            if previous:
+                first_count = previous[1]
+                min_count = min(previous[2], min_count)
+                max_count = max(previous[3], max_count)
+                samples += previous[5]
+            points[bucket_start] = (bucket_start, first_count, min_count, max_count, last_count, samples)
+    return list(points.values()), truncated
+
+
+def series_payload(point):
+    bucket_start, first_count, min_count, max_count, last_count, samples = point
+    return {
+        'bucket_start': format_timestamp(bucket_start),
+        'first_count': first_count,
+        'min_count': min_count,
+        'max_count': max_count,
+        'last_count': last_count,
+        'samples': samples,
+    }
@@ -1,82 +1,391 @@
 """
 Services for mock social media API and Telegram notifications
 """
+import functools
+import hashlib
+import math
 import random
-from datetime import datetime
-from typing import Dict
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, Dict, Iterable, List, Optional, Union
 
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 
-class MockSocialMediaService:
+class SocialMediaServiceError(Exception):
+    """Raised by a backend when a follower count lookup fails"""
+
+
+class SocialMediaBackend:
     """
-    Mock service to simulate social media API calls
-    Generates realistic follower count data with some randomness
+    Interface for follower count backends used by the fetch engine
+    Implementations must be safe to call from several threads at once.
+    Backends whose API looks up many accounts per request raise
+    ``max_batch_size`` and override ``get_follower_counts``.
     """
 
-    def __init__(self):
-        # Store base follower counts per profile to simulate gradual growth
-        self._base_counts = {}
+    # Most usernames one get_follower_counts call accepts
+    max_batch_size = 1
 
     def get_follower_count(self, platform: str, username: str) -> Dict:
+        raise NotImplementedError
+
+    def get_follower_counts(self, platform: str, usernames: Iterable[str]) -> Dict[str, Union[Dict, Exception]]:
         """
-        Mock API call to get follower count
-        Simulates gradual growth with some randomness
+        Follower counts of up to ``max_batch_size`` accounts of one platform
+        Returns a dict keyed by username holding the response or the
+        exception of that account; raising fails the whole call
         """
-        # Create a unique key for this profile
-        profile_key = f"{platform}_{username}"
+        results = {}
+        for username in usernames:
+            try:
+                results[username] = self.get_follower_count(platform, username)
+            except Exception as e:
+                results[username] = e
+        return results
+
+
+def _unit(*parts) -> float:
+    """Stable pseudo-random number in [0, 1) derived from ``parts``"""
+    digest = hashlib.blake2b('|'.join(str(part) for part in parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+@functools.lru_cache(maxsize=100000)
+def _mock_account(seed: int, model: str, platform: str, username: str):
+    """
+    Trajectory parameters of a MockSocialMediaService account, derived from
+    the seed alone. Cached by (seed, model, account) rather than on the
+    service, so the cache holds no reference to any service
+    """
+    key = (seed, platform, username)
+    if model == 'mixed':
+        pick = _unit(*key, 'model')
+        model = 'growth' if pick < 0.6 else 'decay' if pick < 0.8 else 'spike'
+    # Start with a base between 500-2000
+    base = 500 + int(_unit(*key, 'base') * 1500)
+    return {
+        'model': model,
+        'base': base,
+        # Gradual growth, 0.1-1% of the base a day
+        'daily_rate': base * (0.001 + 0.009 * _unit(*key, 'rate')),
+        # Half-life of 5 months to 2 years
+        'decay_per_day': 0.001 + 0.004 * _unit(*key, 'decay'),
+    }
+
+
+class MockSocialMediaService(SocialMediaBackend):
+    """
+    Mock service to simulate social media API calls
+    Every account follows its own trajectory, a pure function of ``seed``,
+    the account and the time: no state is kept, so counts survive restarts,
+    agree between worker processes and can be replayed with ``at``.
+    ``model`` picks the shape: growth, decay, spike (growth with occasional
+    bursts that fade out) or mixed (each account gets one of the three).
+    Optional latency (seconds per call plus ``item_latency`` per account)
+    and error rates (0-1, of whole calls and of single accounts in a batch)
+    let the fetch engine be exercised offline; injected failures are random.
+    """
+
+    MODELS = ('growth', 'decay', 'spike', 'mixed')
+    # Trajectories start here; any fixed instant works, it only anchors the curves
+    EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc).timestamp()
+    # Noise is fixed within a window so repeated calls in it return the same count
+    NOISE_SECONDS = 60
+    SPIKE_PROBABILITY = 0.1
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                 model: str = 'mixed', clock: Callable[[], float] = time.time,
+                 max_batch_size: int = 100, item_latency: float = 0.0, item_error_rate: float = 0.0):
+        if model not in self.MODELS:
+            raise ValueError(f"Unknown mock model {model!r}, use one of {', '.join(self.MODELS)}")
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_batch_size = max(1, max_batch_size)
+        self.item_latency = item_latency
+        self.item_error_rate = item_error_rate
+        self.seed = seed
+        self.model = model
+        self.clock = clock
 
-        # Initialize base count if not exists
-        if profile_key not in self._base_counts:
-            # Start with a random base between 500-2000
-            self._base_counts[profile_key] = random.randint(500, 2000)
+    def _account(self, platform: str, username: str):
+        return _mock_account(self.seed, self.model, platform, username)
 
-        # Simulate gradual growth (1-5 followers per check)
-        growth = random.randint(1, 5)
-        self._base_counts[profile_key] += growth
+    def _count(self, platform: str, username: str, at: float) -> int:
+        account = self._account(platform, username)
+        base = account['base']
+        days = (at - self.EPOCH) / 86400
+
+        if account['model'] == 'decay':
+            # From ten times the base towards the base
+            count = base + 9 * base * math.exp(-account['decay_per_day'] * max(0.0, days))
+        else:
+            count = base + account['daily_rate'] * days
+        if account['model'] == 'spike':
+            # At most one burst a day, fading with a half-life of a few hours;
+            # yesterday's may still be fading
+            for day in (math.floor(days) - 1, math.floor(days)):
+                if _unit(self.seed, platform, username, 'spike', day) >= self.SPIKE_PROBABILITY:
+                    continue
+                started = day + _unit(self.seed, platform, username, 'spike-at', day)
+                if days >= started:
+                    size = base * (0.5 + 2 * _unit(self.seed, platform, username, 'spike-size', day))
+                    half_life = (2 + 10 * _unit(self.seed, platform, username, 'spike-fade', day)) / 24
+                    count += size * 0.5 ** ((days - started) / half_life)
 
         # Add some randomness (-2 to +3)
-        current_count = self._base_counts[profile_key] + random.randint(-2, 3)
-        current_count = max(0, current_count)  # Ensure non-negative
+        window = int(at // self.NOISE_SECONDS)
+        count += int(_unit(self.seed, platform, username, 'noise', window) * 6) - 2
+        return max(0, int(count))  # Ensure non-negative
+
+    def _simulate_call(self, what: str, accounts: int = 1):
+        delay = self.latency + self.item_latency * accounts
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            raise SocialMediaServiceError(f"Simulated API failure for {what}")
 
+    def _response(self, platform: str, username: str, at: float) -> Dict:
         return {
-            'follower_count': current_count,
-            'timestamp': datetime.now().isoformat(),
+            'follower_count': self._count(platform, username, at),
+            'timestamp': datetime.fromtimestamp(at).isoformat(),
             'platform': platform,
             'username': username
         }
 
-    def reset_base_count(self, platform: str, username: str):
-        """Reset base count for testing purposes"""
-        profile_key = f"{platform}_{username}"
-        if profile_key in self._base_counts:
-            del self._base_counts[profile_key]
+    def get_follower_count(self, platform: str, username: str, at: Optional[float] = None) -> Dict:
+        """
+        Mock API call to get follower count
+        ``at`` (a Unix timestamp, default now) replays the count at that time
+        """
+        self._simulate_call(f"{platform}:{username}")
+        return self._response(platform, username, self.clock() if at is None else at)
+
+    def get_follower_counts(self, platform: str, usernames: Iterable[str],
+                            at: Optional[float] = None) -> Dict[str, Union[Dict, Exception]]:
+        """Follower counts of many accounts of one platform in a single call, keyed by username"""
+        usernames = list(usernames)
+        if len(usernames) > self.max_batch_size:
+            raise ValueError(f"At most {self.max_batch_size} usernames per call, got {len(usernames)}")
+        self._simulate_call(f"{platform}:{len(usernames)} accounts", len(usernames))
+        at = self.clock() if at is None else at
+        return {
+            username: (
+                SocialMediaServiceError(f"Simulated lookup failure for {platform}:{username}")
+                if self.item_error_rate and random.random() < self.item_error_rate
+                else self._response(platform, username, at)
+            )
+            for username in usernames
+        }
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens per second, bursting up to ``capacity``
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FollowerFetchEngine:
+    """
+    Runs follower count lookups concurrently on a thread pool
+    Profiles are grouped by platform into batches of up to ``batch_size``
+    (capped by the backend's ``max_batch_size``), one API call each. Each
+    platform gets its own token bucket (requests per second, see
+    FOLLOWER_FETCH_RATE_LIMITS) and failed calls are retried with
+    exponential backoff. ``calls`` counts the API calls made.
+    """
+
+    retryable_errors = (SocialMediaServiceError, requests.RequestException)
+
+    def __init__(self, backend: SocialMediaBackend, concurrency: Optional[int] = None,
+                 rate_limits: Optional[Dict[str, float]] = None, max_retries: Optional[int] = None,
+                 backoff: Optional[float] = None, max_backoff: float = 30.0, batch_size: Optional[int] = None):
+        self.backend = backend
+        self.concurrency = concurrency or getattr(settings, 'FOLLOWER_FETCH_CONCURRENCY', 8)
+        batch_size = batch_size or getattr(settings, 'FOLLOWER_FETCH_BATCH_SIZE', 100)
+        self.batch_size = max(1, min(batch_size, getattr(backend, 'max_batch_size', 1)))
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+        self.max_retries = (
+            max_retries if max_retries is not None else getattr(settings, 'FOLLOWER_FETCH_MAX_RETRIES', 3)
+        )
+        self.backoff = backoff if backoff is not None else getattr(settings, 'FOLLOWER_FETCH_BACKOFF', 0.5)
+        self.max_backoff = max_backoff
+        if rate_limits is None:
+            rate_limits = getattr(settings, 'FOLLOWER_FETCH_RATE_LIMITS', {})
+        # A missing or non-positive limit means the platform is not throttled
+        self._buckets = {
+            platform: TokenBucket(rate)
+            for platform, rate in rate_limits.items()
+            if rate and rate > 0
+        }
+
+    def _call(self, platform: str, lookup: Callable):
+        """Run one API call, honouring the rate limit and retrying transient errors"""
+        bucket = self._buckets.get(platform)
+        attempt = 0
+        while True:
+            if bucket:
+                bucket.acquire()
+            with self._calls_lock:
+                self.calls += 1
+            try:
+                return lookup()
+            except self.retryable_errors:
+                if attempt >= self.max_retries:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                # Full jitter so retries from many threads do not line up
+                time.sleep(random.uniform(0, delay))
+                attempt += 1
+
+    def fetch(self, platform: str, username: str) -> Dict:
+        """Fetch one follower count"""
+        return self._call(platform, lambda: self.backend.get_follower_count(platform=platform, username=username))
+
+    def fetch_batch(self, platform: str, usernames: List[str]) -> Dict[str, Union[Dict, Exception]]:
+        """
+        Fetch the follower counts of up to ``batch_size`` accounts of one platform
+        A failed call fails every account; accounts missing from the
+        response get an error of their own
+        """
+        def lookup():
+            if self.batch_size == 1:
+                return {username: self.backend.get_follower_count(platform=platform, username=username)
+                        for username in usernames}
+            return self.backend.get_follower_counts(platform=platform, usernames=usernames)
+
+        try:
+            results = self._call(platform, lookup)
+        except Exception as e:
+            return {username: e for username in usernames}
+        return {
+            username: results.get(username) or SocialMediaServiceError(f"No result for {platform}:{username}")
+            for username in usernames
+        }
+
+    def fetch_many(self, profiles: Iterable) -> Dict[int, Union[Dict, Exception]]:
+        """
+        Fetch follower counts for many profiles concurrently
+        Returns a dict keyed by profile id holding either the API response
+        or the exception raised by the final attempt
+        """
+        by_platform = defaultdict(lambda: defaultdict(list))
+        for profile in profiles:
+            by_platform[profile.platform][profile.username].append(profile.id)
+        if not by_platform:
+            return {}
+
+        batches = []
+        for platform, profile_ids_by_username in by_platform.items():
+            usernames = list(profile_ids_by_username)
+            batches.extend(
+                (platform, usernames[start:start + self.batch_size])
+                for start in range(0, len(usernames), self.batch_size)
+            )
+
+        if self.concurrency <= 1 or len(batches) == 1:
+            results = [self.fetch_batch(platform, usernames) for platform, usernames in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+                results = list(executor.map(lambda batch: self.fetch_batch(*batch), batches))
+
+        # Map each account's result back to every profile tracking it
+        responses = {}
+        for (platform, usernames), batch_results in zip(batches, results):
+            for username in usernames:
+                for profile_id in by_platform[platform][username]:
+                    responses[profile_id] = batch_results[username]
+        return responses
+
+
+class TelegramDeliveryError(Exception):
+    """
+    Raised when Telegram does not accept a message
+    ``retry_after`` is the wait Telegram asked for (HTTP 429), ``permanent``
+    marks errors retrying cannot fix, such as an unknown or blocked chat
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
 
 
 class TelegramNotificationService:
 
-    def __init__(self):
+    def __init__(self, api_url: Optional[str] = None, pool_size: int = 10, timeout: float = 10):
         self.bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-        self.api_url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage" if self.bot_token else None
-
-    def send_notification(self, chat_id: str, message: str) -> bool:
+        # Seconds a sendMessage request may take
+        self.timeout = timeout
+        api_url = (api_url or getattr(settings, 'TELEGRAM_API_URL', 'https://api.telegram.org')).rstrip('/')
+        self.api_url = f"{api_url}/bot{self.bot_token}/sendMessage" if self.bot_token else None
+        # One keep-alive connection pool shared by every sending thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
+    def deliver(self, chat_id: str, message: str):
+        """Send one message, raising TelegramDeliveryError if it was not accepted"""
         if not self.bot_token or not self.api_url:
             # If no bot token configured, just log (for development)
             print(f"[TELEGRAM MOCK] Would send to {chat_id}: {message}")
-            return True  # Return True for mock mode
+            return
 
+        payload = {
+            'chat_id': chat_id,
+            'text': message,
+            'parse_mode': 'HTML'
+        }
         try:
-            payload = {
-                'chat_id': chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            }
-            response = requests.post(self.api_url, json=payload, timeout=10)
-            response.raise_for_status()
-            return True
+            response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
         except requests.RequestException as e:
+            raise TelegramDeliveryError(str(e)) from e
+        if response.ok:
+            return
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        description = body.get('description') or f"HTTP {response.status_code}"
+        if response.status_code == 429:
+            retry_after = (body.get('parameters') or {}).get('retry_after')
+            raise TelegramDeliveryError(description, retry_after=retry_after)
+        # Other 4xx (bad chat id, bot blocked, malformed message) will not succeed on retry
+        raise TelegramDeliveryError(description, permanent=400 <= response.status_code < 500)
+
+    def send_notification(self, chat_id: str, message: str) -> bool:
+        try:
+            self.deliver(chat_id, message)
+            return True
+        except TelegramDeliveryError as e:
             print(f"Failed to send Telegram notification: {e}")
             return False
 
@@ -92,5 +401,14 @@ class TelegramNotificationService:
 
 
 # Singleton instances
-mock_social_service = MockSocialMediaService()
+mock_social_service = MockSocialMediaService(
+    latency=getattr(settings, 'MOCK_SOCIAL_LATENCY', 0.0),
+    error_rate=getattr(settings, 'MOCK_SOCIAL_ERROR_RATE', 0.0),
+    seed=getattr(settings, 'MOCK_SOCIAL_SEED', 0),
+    model=getattr(settings, 'MOCK_SOCIAL_MODEL', 'mixed'),
+    max_batch_size=getattr(settings, 'MOCK_SOCIAL_BATCH_SIZE', 100),
+    item_latency=getattr(settings, 'MOCK_SOCIAL_ITEM_LATENCY', 0.0),
+    item_error_rate=getattr(settings, 'MOCK_SOCIAL_ITEM_ERROR_RATE', 0.0),
+)
 telegram_service = TelegramNotificationService()
+follower_fetch_engine = FollowerFetchEngine(mock_social_service)
@@ -0,0 +1,22 @@
+"""
+Invalidate cached API responses when profile data changes through the ORM
+Bulk writes (the polling task, the notification outbox) send no signals and
+invalidate explicitly
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import invalidate_profiles, invalidate_users
+from .models import SocialMediaProfile, AlertSettings, AlertNotification, Milestone
+
+
+@receiver([post_save, post_delete], sender=SocialMediaProfile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_users([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=AlertSettings)
+@receiver([post_save, post_delete], sender=AlertNotification)
+@receiver([post_save, post_delete], sender=Milestone)
+def profile_data_changed(sender, instance, **kwargs):
+    invalidate_profiles([instance.profile_id])
@@ -1,10 +1,30 @@
 """
 Background task for periodic follower count checking and milestone alerts
 """
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
 
+from .caching import invalidate_users
+from .choices import DeliveryStatusChoice
+from .ingest import create_history
+from .live import publish_counts, publish_notifications
+from .milestones import find_crossed_milestones, mark_milestones_fired
 from .models import SocialMediaProfile, AlertSettings, FollowerCountHistory, AlertNotification
-from .services import mock_social_service, telegram_service
+from .rollups import last_recorded_point, load_rollups, refresh_rollups
+from .scheduling import FixedSchedule
+from .services import follower_fetch_engine, mock_social_service, telegram_service
+
+# Number of profiles loaded, written and alert-checked together in batched sweeps
+DEFAULT_BATCH_SIZE = 500
+
+# Seconds a worker may hold claimed profiles before another worker can take them over
+DEFAULT_LEASE_SECONDS = 300
 
 
 def check_follower_counts():
@@ -28,25 +48,252 @@ def check_follower_counts():
             # Update profile
             profile.current_follower_count = new_follower_count
             profile.last_checked = timezone.now()
-            profile.save()
+            SocialMediaProfile.objects.filter(id=profile.id).update(
+                current_follower_count=new_follower_count,
+                last_checked=profile.last_checked
+            )
 
             # Record in history
-            FollowerCountHistory.objects.create(
+            history = FollowerCountHistory.objects.create(
                 profile=profile,
                 follower_count=new_follower_count
             )
+            refresh_rollups([profile.id], [history])
 
             # Check for milestone alerts
             check_milestone_alerts(profile, old_follower_count, new_follower_count)
+            invalidate_users([profile.user_id])
 
         except Exception as e:
             print(f"Error checking profile {profile.id}: {e}")
             continue
 
 
+def check_follower_counts_batched(batch_size=DEFAULT_BATCH_SIZE, fetch_engine=None, schedule=None):
+    """
+    Set-based variant of check_follower_counts.
+    Walks profiles in primary key order, ``batch_size`` at a time, and returns
+    per-sweep stats (counts and timings in seconds). Lookups go through
+    ``fetch_engine`` (the shared FollowerFetchEngine by default) and
+    ``schedule`` sets each profile's next_check_at.
+    """
+    stats = new_sweep_stats()
+    started = time.monotonic()
+    last_id = 0
+
+    while True:
+        chunk = list(
+            SocialMediaProfile.objects.filter(id__gt=last_id).order_by('id')[:batch_size]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        process_profile_chunk(chunk, stats, fetch_engine, schedule)
+
+    stats['total_seconds'] = time.monotonic() - started
+    return stats
+
+
+def check_due_profiles(worker_id, claim_size=DEFAULT_BATCH_SIZE, lease_seconds=DEFAULT_LEASE_SECONDS,
+                       fetch_engine=None, schedule=None):
+    """
+    One worker-mode step: lease up to ``claim_size`` profiles whose
+    next_check_at has passed, poll them and release the lease.
+    Profiles whose lookup failed keep their lease until it expires, which
+    doubles as the retry backoff. Returns sweep stats, or None when nothing was due.
+    """
+    token, profiles = claim_due_profiles(worker_id, claim_size, lease_seconds)
+    if not profiles:
+        return None
+
+    stats = new_sweep_stats()
+    started = time.monotonic()
+    checked_ids = process_profile_chunk(profiles, stats, fetch_engine, schedule)
+    release_profiles(token, checked_ids)
+    stats['total_seconds'] = time.monotonic() - started
+    return stats
+
+
+def claim_due_profiles(worker_id, limit, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Lease a disjoint set of due profiles to this worker.
+    The lease is taken with a conditional UPDATE, so concurrent workers can
+    never hold the same profile, and profiles of a crashed worker become
+    claimable again once its lease expires. Returns (token, profiles).
+    """
+    now = timezone.now()
+    token = f"{worker_id}:{uuid.uuid4().hex}"
+    claimable = (
+        (Q(next_check_at__isnull=True) | Q(next_check_at__lte=now))
+        & (Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now))
+    )
+
+    with transaction.atomic():
+        candidate_ids = list(
+            SocialMediaProfile.objects
+            .select_for_update(skip_locked=True)
+            .filter(claimable)
+            .order_by(F('next_check_at').asc(nulls_first=True), 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not candidate_ids:
+            return token, []
+        SocialMediaProfile.objects.filter(claimable, id__in=candidate_ids).update(
+            lease_token=token,
+            lease_expires_at=now + timedelta(seconds=lease_seconds)
+        )
+
+    # By primary key: lease_token has no index. The token check drops
+    # candidates whose lease changed between the select and the update
+    return token, list(SocialMediaProfile.objects.filter(id__in=candidate_ids, lease_token=token).order_by('id'))
+
+
+def release_profiles(token, profile_ids=None):
+    """Drop the lease taken by claim_due_profiles, optionally only for some of its profiles"""
+    leased = SocialMediaProfile.objects.filter(lease_token=token)
+    if profile_ids is not None:
+        leased = leased.filter(id__in=profile_ids)
+    leased.update(lease_token=None, lease_expires_at=None)
+
+
+def new_sweep_stats():
+    return {
+        'profiles': 0,
+        'api_calls': 0,
+        'history_rows': 0,
+        'errors': 0,
+        'alerts': 0,
+        'chunks': 0,
+        'fetch_seconds': 0.0,
+        'write_seconds': 0.0,
+        'alert_seconds': 0.0,
+        'total_seconds': 0.0,
+    }
+
+
+def process_profile_chunk(profiles, stats, fetch_engine=None, schedule=None):
+    """
+    Poll a chunk of profiles and persist the results with coalesced UPDATEs
+    (see write_profile_state), one bulk_create and a single AlertSettings
+    query for the whole chunk.
+    Returns the ids of the profiles that were checked successfully.
+    """
+    schedule = schedule or FixedSchedule()
+    stats['chunks'] += 1
+
+    # Fetch current follower counts concurrently, in per-platform batches
+    started = time.monotonic()
+    fetch_engine = fetch_engine or follower_fetch_engine
+    calls = fetch_engine.calls
+    responses = fetch_engine.fetch_many(profiles)
+    stats['api_calls'] += fetch_engine.calls - calls
+    checked = []
+    for profile in profiles:
+        api_response = responses[profile.id]
+        if isinstance(api_response, Exception):
+            print(f"Error checking profile {profile.id}: {api_response}")
+            stats['errors'] += 1
+            continue
+        checked.append((profile, profile.current_follower_count, api_response['follower_count']))
+    stats['fetch_seconds'] += time.monotonic() - started
+
+    if not checked:
+        return []
+
+    checked_ids = [profile.id for profile, _, _ in checked]
+    alert_settings_by_profile = {
+        alert_settings.profile_id: alert_settings
+        for alert_settings in AlertSettings.objects.filter(profile_id__in=checked_ids, is_active=True)
+    }
+
+    # Update profiles and record history
+    started = time.monotonic()
+    now = timezone.now()
+    for profile, old_count, new_count in checked:
+        alert_settings = alert_settings_by_profile.get(profile.id)
+        profile.next_check_at = schedule.next_check_at(
+            profile, old_count, new_count,
+            alert_settings.milestone_followers if alert_settings else None,
+            now
+        )
+        profile.current_follower_count = new_count
+        profile.last_checked = now
+
+    rollups = load_rollups(checked_ids)
+
+    with transaction.atomic():
+        write_profile_state(checked, now)
+        history = create_history([
+            (profile.id, new_count)
+            for profile, _, new_count in checked
+            if should_record_history(last_recorded_point(rollups.get(profile.id)), new_count, now)
+        ], now)
+        refresh_rollups(checked_ids, history, now, rollups)
+        publish_counts(checked, now)
+    stats['profiles'] += len(checked)
+    stats['history_rows'] += len(history)
+    stats['write_seconds'] += time.monotonic() - started
+
+    # Check for milestone alerts
+    started = time.monotonic()
+    try:
+        stats['alerts'] += queue_milestone_alerts(checked, alert_settings_by_profile, now)
+    except Exception as e:
+        print(f"Error checking milestone alerts for profiles {checked_ids}: {e}")
+    stats['alert_seconds'] += time.monotonic() - started
+
+    # Bulk writes send no signals, drop the owners' cached responses explicitly
+    invalidate_users({profile.user_id for profile, _, _ in checked})
+
+    return checked_ids
+
+
+def write_profile_state(checked, now):
+    """
+    Persist the poll results of a chunk of (profile, old_count, new_count)
+    with as few and as narrow UPDATEs as possible: last_checked and, when
+    the schedule gave every profile the same due time, next_check_at in one
+    statement; varying due times in one bulk_update; follower counts only
+    for the profiles whose count changed. updated_at is left alone, it
+    tracks edits made through the API.
+    """
+    profiles = [profile for profile, _, _ in checked]
+    due_times = {profile.next_check_at for profile in profiles}
+    polled = SocialMediaProfile.objects.filter(id__in=[profile.id for profile in profiles])
+    if len(due_times) == 1:
+        polled.update(last_checked=now, next_check_at=due_times.pop())
+    else:
+        polled.update(last_checked=now)
+        SocialMediaProfile.objects.bulk_update(profiles, ['next_check_at'])
+
+    changed = [profile for profile, old_count, new_count in checked if new_count != old_count]
+    if changed:
+        SocialMediaProfile.objects.bulk_update(changed, ['current_follower_count'])
+
+
+def should_record_history(last_point, new_count, now):
+    """
+    Decide whether a poll gets a FollowerCountHistory row
+    In the default 'always' mode every poll is recorded. In 'on_change' mode
+    the stored series holds change points only: a row is written when the
+    count moved by FOLLOWER_HISTORY_MIN_DELTA or more since the last stored
+    point, or when that point is older than FOLLOWER_HISTORY_HEARTBEAT_SECONDS.
+    Readers treat the series as a step function, so with a delta of 1 the
+    insights are the same as in 'always' mode.
+    """
+    if getattr(settings, 'FOLLOWER_HISTORY_WRITE_MODE', 'always') != 'on_change' or last_point is None:
+        return True
+
+    last_count, last_recorded_at = last_point
+    if abs(new_count - last_count) >= getattr(settings, 'FOLLOWER_HISTORY_MIN_DELTA', 1):
+        return True
+    heartbeat = getattr(settings, 'FOLLOWER_HISTORY_HEARTBEAT_SECONDS', 3600)
+    return (now - last_recorded_at).total_seconds() >= heartbeat
+
+
 def check_milestone_alerts(profile, old_count, new_count):
     """
-    Check if a milestone has been reached and send alert if needed
+    Check if a milestone has been reached and queue an alert if needed
     """
     try:
         alert_settings = AlertSettings.objects.filter(profile=profile, is_active=True).first()
@@ -54,31 +301,43 @@ def check_milestone_alerts(profile, old_count, new_count):
         if not alert_settings:
             return
 
-        milestone = alert_settings.milestone_followers
+        queue_milestone_alerts([(profile, old_count, new_count)], {profile.id: alert_settings})
 
-        if old_count < milestone <= new_count:
-            # Milestone reached!
-            message = telegram_service.format_milestone_message(
-                username=profile.username,
-                platform=profile.platform,
-                milestone=milestone,
-                current_count=new_count
-            )
+    except Exception as e:
+        print(f"Error checking milestone alerts for profile {profile.id}: {e}")
 
-            notification = AlertNotification.objects.create(
+
+def queue_milestone_alerts(checked, alert_settings_by_profile, now=None):
+    """
+    Create a notification for every milestone crossed in a chunk of
+    (profile, old_count, new_count). Notifications for profiles with a
+    Telegram chat are left pending for the send_notifications command.
+    Returns the number of alerts raised.
+    """
+    crossed = find_crossed_milestones(checked, alert_settings_by_profile)
+    if not crossed:
+        return 0
+
+    # Milestone reached!
+    with transaction.atomic():
+        crossed = mark_milestones_fired(crossed, now)
+        notifications = []
+        for profile, milestone, new_count, _ in crossed:
+            chat_id = alert_settings_by_profile[profile.id].telegram_chat_id
+            notifications.append(AlertNotification(
                 profile=profile,
                 milestone_followers=milestone,
                 follower_count_at_alert=new_count,
-                message=message
-            )
-
-            if alert_settings.telegram_chat_id:
-                telegram_sent = telegram_service.send_notif1ication(
-                    chat_id=alert_settings.telegram_chat_id,
-                    message=message
-                )
-                notification.telegram_sent = telegram_sent
-                notification.save()
+                message=telegram_service.format_milestone_message(
+                    username=profile.username,
+                    platform=profile.platform,
+                    milestone=milestone,
+                    current_count=new_count
+                ),
+                telegram_chat_id=chat_id,
+                delivery_status=DeliveryStatusChoice.PENDING if chat_id else DeliveryStatusChoice.SKIPPED,
+            ))
+        AlertNotification.objects.bulk_create(notifications)
+        publish_notifications(notifications)
 
-    except Exception as e:
-        print(f"Error checking milestone alerts for profile {profile.id}: {e}")
+    return len(notifications)
@@ -0,0 +1,58 @@
+"""
+Test helpers for query budgets
+Budgets count every query of a GET request made by a client logged in with
+``force_login`` (two of them load the session and the user), with the
+response cache disabled so the view itself always runs
+"""
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from .instrumentation import query_budget_of
+
+
+def count_queries(client, path, **extra):
+    """GET ``path`` with the response cache disabled, returns (response, queries)"""
+    with override_settings(API_CACHE_TIMEOUT=0), CaptureQueriesContext(connection) as queries:
+        response = client.get(path, **extra)
+    return response, queries
+
+
+def assert_query_budget(client, path, budget=None, **extra):
+    """
+    Fail if GET ``path`` takes more queries than ``budget``, by default the
+    ``query_budget`` declared by the view serving it
+    """
+    if budget is None:
+        budget = query_budget_of(resolve(path.split('?')[0]))
+        if budget is None:
+            raise AssertionError(f'The view serving {path} declares no query_budget')
+    response, queries = count_queries(client, path, **extra)
+    if len(queries) > budget:
+        statements = '\n'.join(f"  {query['sql']}" for query in queries.captured_queries)
+        raise AssertionError(f'GET {path} took {len(queries)} queries, budget is {budget}:\n{statements}')
+    return response
+
+
+def assert_constant_queries(client, path, grow, **extra):
+    """
+    Fail if the queries of GET ``path`` change after calling ``grow``, which
+    should add data (say more profiles) the endpoint has to cover
+    """
+    _, before = count_queries(client, path, **extra)
+    grow()
+    response, after = count_queries(client, path, **extra)
+    if len(after) != len(before):
+        raise AssertionError(f'GET {path} took {len(before)} queries before growing the data and {len(after)} after')
+    return response
+
+
+class QueryBudgetMixin:
+    """TestCase assertions wrapping the helpers above, for tests with a ``self.client``"""
+
+    def assertQueryBudget(self, path, budget=None, **extra):
+        return assert_query_budget(self.client, path, budget, **extra)
+
+    def assertConstantQueries(self, path, grow, **extra):
+        return assert_constant_queries(self.client, path, grow, **extra)
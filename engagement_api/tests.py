@@ -1,3 +1,1123 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gc
+import json
+import threading
+import time
+import weakref
+from contextlib import redirect_stdout
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection, router
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .analytics import analyze
+from .caching import invalidate_users
+from .choices import BucketResolutionChoice, DeliveryStatusChoice, LiveEventKindChoice, PlatformChoice
+from .compaction import (
+    RAW, compact_daily, compact_hourly, floor_to, history_tiers, prune_hourly_buckets, prune_raw_history, watermarks
+)
+from .delivery import CLAIM_SECONDS, TelegramOutbox
+from .ingest import COPY_MIN_ROWS, create_history, insert_history_rows
+from .milestones import find_crossed_milestones, mark_milestones_fired
+from .live import event_stream, prune_live_events, publish_counts
+from .insights import follower_changes, top_follower_changes
+from .models import (
+    SocialMediaProfile, AlertSettings, FollowerCountHistory, AlertNotification, LiveEvent, Milestone,
+    ProfileInsightsRollup,
+)
+from .rollups import ROLLUP_FIELDS, format_timestamp, rebuild_rollups, refresh_rollups
+from .routing import areplica_reads, replica_reads
+from .scheduling import AdaptiveSchedule, DueTimeScheduler
+from .series import SERIES_FIELDS
+from .services import (
+    FollowerFetchEngine, MockSocialMediaService, SocialMediaBackend, SocialMediaServiceError,
+    TelegramNotificationService,
+)
+from .tasks import (
+    check_follower_counts, check_follower_counts_batched, claim_due_profiles, new_sweep_stats, process_profile_chunk,
+    queue_milestone_alerts, release_profiles, should_record_history, write_profile_state,
+)
+from .testing import QueryBudgetMixin
+
+# Hours of hourly history seeded for each profile
+HISTORY_HOURS = 240
+
+
+def growth(hours_ago):
+    """Follower count of the seeded profile ``hours_ago`` hours before the test's now: +10 an hour"""
+    return 1000 + 10 * (HISTORY_HOURS - hours_ago)
+
+
+def record_history(profile, now, hours=HISTORY_HOURS, count=growth):
+    """One raw history point an hour for ``hours`` hours up to ``now``"""
+    insert_history_rows(
+        (profile.id, count(hours_ago), now - timedelta(hours=hours_ago)) for hours_ago in range(hours + 1)
+    )
+
+
+class HistoryTierTests(TestCase):
+    """follower_changes over history in every stage of compaction"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(user=user, platform=PlatformChoice.TWITTER, username='grower')
+        record_history(self.profile, self.now)
+
+    def changes(self, since):
+        tiers = history_tiers(since, self.now, watermarks())
+        rows = follower_changes(SocialMediaProfile.objects.all(), since, tiers)
+        return tiers, rows.get(profile_id=self.profile.id)
+
+    def test_never_compacted_reads_raw_history_past_its_retention(self):
+        since = self.now - timedelta(days=9)
+        tiers, row = self.changes(since)
+        self.assertEqual(tiers, [(RAW, since, None)])
+        self.assertEqual((row['old_count'], row['new_count']), (growth(9 * 24), growth(0)))
+
+    def test_period_at_the_raw_retention_reads_raw_history(self):
+        prune_raw_history(now=self.now)
+        compact_hourly(max_buckets=1000, now=self.now)
+        tiers, row = self.changes(self.now - timedelta(days=7))
+        self.assertEqual(tiers[0][0], RAW)
+        self.assertEqual(row['follower_change'], growth(0) - growth(7 * 24))
+
+    def test_stale_hourly_buckets_are_followed_by_raw_history(self):
+        compact_hourly(max_buckets=1000, now=self.now - timedelta(days=3))
+        prune_raw_history(now=self.now)
+        self.assertFalse(FollowerCountHistory.objects.filter(recorded_at__lt=self.now - timedelta(days=8)).exists())
+
+        tiers, row = self.changes(self.now - timedelta(days=9))
+        self.assertEqual([resolution for resolution, _, _ in tiers], [BucketResolutionChoice.HOUR, RAW])
+        self.assertEqual((row['old_count'], row['new_count']), (growth(9 * 24), growth(0)))
+
+    @override_settings(FOLLOWER_HISTORY_HOURLY_RETENTION_DAYS=2)
+    def test_daily_hourly_and_raw_tiers_are_joined(self):
+        compact_hourly(max_buckets=1000, now=self.now - timedelta(days=1))
+        compact_daily(max_buckets=100, now=self.now)
+        prune_raw_history(now=self.now)
+        prune_hourly_buckets(now=self.now)
+
+        since = self.now - timedelta(days=9)
+        tiers, row = self.changes(since)
+        self.assertEqual(
+            [resolution for resolution, _, _ in tiers],
+            [BucketResolutionChoice.DAY, BucketResolutionChoice.HOUR, RAW]
+        )
+        # A daily bucket holds the count at the end of its day
+        day_end = floor_to(since, BucketResolutionChoice.DAY) + timedelta(days=1)
+        hours_ago = min(
+            hours_ago for hours_ago in range(HISTORY_HOURS + 1)
+            if self.now - timedelta(hours=hours_ago) < day_end
+        )
+        self.assertEqual((row['old_count'], row['new_count']), (growth(hours_ago), growth(0)))
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class FollowerAnalyticsTests(TestCase):
+    """Growth analytics on steady growth of 10 followers an hour"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(user=user, platform=PlatformChoice.TWITTER, username='grower')
+        record_history(self.profile, self.now)
+        self.client.force_login(user)
+
+    def analytics(self, query=''):
+        response = self.client.get(f'/api/insights/analytics/{self.profile.id}/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_period_or_window_beyond_the_maximum_is_rejected(self):
+        for field, value in (('period', '3000000d'), ('period', '99999999d'), ('window', '99999999999h')):
+            response = self.client.get(f'/api/insights/analytics/{self.profile.id}/', {field: value})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(field, response.json())
+
+    def test_default_period_reads_raw_history_when_never_compacted(self):
+        data = self.analytics()
+        self.assertEqual(data['resolution'], RAW)
+        self.assertEqual(data['points'], 7 * 24)
+        self.assertEqual(data['trend_per_day'], 240)
+        self.assertEqual(data['anomalies'], 0)
+
+    def test_buckets_are_followed_by_raw_history(self):
+        compact_hourly(max_buckets=1000, now=self.now - timedelta(days=3))
+        prune_raw_history(now=self.now)
+        data = self.analytics('?period=9d')
+        self.assertEqual(data['resolution'], BucketResolutionChoice.HOUR)
+        self.assertEqual(data['points'], 9 * 24 + 1)
+        self.assertEqual(data['series'][-1]['follower_count'], growth(0))
+        self.assertAlmostEqual(data['trend_per_day'], 240, delta=5)
+        self.assertEqual(data['anomalies'], 0)
+
+    def test_linear_growth_has_no_anomalies(self):
+        # Hour long steps, some off by the float noise of julianday() arithmetic
+        times = 1.7e9 + 3600 * np.arange(101, dtype=np.float64)
+        times[5::10] += 3e-5
+        counts = 1000 + 10 * np.arange(101, dtype=np.float64)
+        _, points, summary = analyze(np.ones(101, dtype=np.int64), times, counts, 86400)
+        self.assertFalse(points['anomaly'].any())
+        self.assertEqual(summary['anomalies'].tolist(), [0])
+
+    def test_jump_in_linear_growth_is_an_anomaly(self):
+        times = 1.7e9 + 3600 * np.arange(101, dtype=np.float64)
+        counts = 1000 + 10 * np.arange(101, dtype=np.float64)
+        counts[60:] += 500
+        _, points, _ = analyze(np.ones(101, dtype=np.int64), times, counts, 86400)
+        self.assertEqual(np.flatnonzero(points['anomaly']).tolist(), [60])
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class TopFollowerInsightsViewTests(TestCase):
+    """Top movers over periods reaching past the raw history retention"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        user = User.objects.create_user('owner', password='pw')
+        self.grower = SocialMediaProfile.objects.create(user=user, platform=PlatformChoice.TWITTER, username='grower')
+        self.loser = SocialMediaProfile.objects.create(user=user, platform=PlatformChoice.INSTAGRAM, username='loser')
+        record_history(self.grower, self.now)
+        record_history(self.loser, self.now, count=lambda hours_ago: 5000 + 5 * hours_ago)
+        self.client.force_login(user)
+
+    def top(self, period):
+        for path in ('/api/insights/top/', '/api/async/insights/top/'):
+            response = self.client.get(path, {'period': period})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            yield (
+                [(row['username'], row['follower_change']) for row in data['top_increases']],
+                [(row['username'], row['follower_change']) for row in data['top_decreases']],
+            )
+
+    def test_period_past_raw_retention_without_compaction(self):
+        for increases, decreases in self.top('8d'):
+            self.assertEqual(increases, [('grower', 10 * 8 * 24)])
+            self.assertEqual(decreases, [('loser', -5 * 8 * 24)])
+
+    def test_period_beyond_the_maximum_is_rejected(self):
+        for period in ('3650d', '3651d', '3000000d', '99999999d'):
+            for path in ('/api/insights/top/', '/api/async/insights/top/'):
+                response = self.client.get(path, {'period': period})
+                self.assertEqual(response.status_code, 200 if period == '3650d' else 400, (period, path))
+                if response.status_code == 400:
+                    self.assertIn('period', response.json())
+
+    def test_period_past_raw_retention_with_stale_buckets(self):
+        compact_hourly(max_buckets=1000, now=self.now - timedelta(days=2))
+        prune_raw_history(now=self.now)
+        for period in ('7d', '9d'):
+            days = int(period[:-1])
+            for increases, decreases in self.top(period):
+                self.assertEqual(increases, [('grower', 10 * days * 24)])
+                self.assertEqual(decreases, [('loser', -5 * days * 24)])
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class AsyncViewTests(TestCase):
+    """The async read endpoints authenticate and answer like the sync ones"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(
+            user=self.user, platform=PlatformChoice.TWITTER, username='grower', current_follower_count=growth(0)
+        )
+        record_history(self.profile, self.now, hours=48)
+
+    def paths(self):
+        return [
+            'profiles/', f'profiles/{self.profile.id}/', f'profiles/{self.profile.id}/history/',
+            'insights/', f'insights/{self.profile.id}/', 'insights/top/?period=7d', 'notifications/',
+        ]
+
+    def basic(self, password):
+        return {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(f'owner:{password}'.encode()).decode()}
+
+    def test_credentials_are_required(self):
+        for path in self.paths():
+            response = self.client.get(f'/api/async/{path}')
+            self.assertEqual(response.status_code, 401, path)
+            self.assertEqual(response['WWW-Authenticate'], 'Basic realm="api"')
+
+    def test_wrong_password_is_rejected(self):
+        response = self.client.get('/api/async/insights/', **self.basic('wrong'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), self.client.get('/api/insights/', **self.basic('wrong')).json())
+        self.assertEqual(self.client.get('/api/async/insights/', **self.basic('pw')).status_code, 200)
+
+    def test_payloads_match_the_sync_views(self):
+        self.client.force_login(self.user)
+        for path in self.paths():
+            sync_response = self.client.get(f'/api/{path}')
+            async_response = self.client.get(f'/api/async/{path}')
+            self.assertEqual(sync_response.status_code, 200, path)
+            self.assertEqual(async_response.status_code, 200, path)
+            sync_data, async_data = sync_response.json(), async_response.json()
+            if isinstance(sync_data, dict) and 'results' in sync_data:
+                # Page links name the endpoint they came from
+                sync_data, async_data = sync_data['results'], async_data['results']
+            self.assertEqual(async_data, sync_data, path)
+
+
+@override_settings(API_CACHE_TIMEOUT=60)
+class ResponseCacheTests(TestCase):
+    """Per-user response caching, its invalidation and revalidation"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(
+            user=self.user, platform=PlatformChoice.TWITTER, username='grower', current_follower_count=1000
+        )
+        self.client.force_login(self.user)
+
+    def counts(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [row['current_follower_count'] for row in response.json()['results']]
+
+    def test_sweeper_write_invalidates_cached_responses(self):
+        for path in ('/api/profiles/', '/api/async/profiles/'):
+            self.assertEqual(self.counts(path), [1000])
+        now = timezone.now()
+        self.profile.current_follower_count = 2000
+        self.profile.last_checked = self.profile.next_check_at = now
+        write_profile_state([(self.profile, 1000, 2000)], now)
+        # Bulk writes send no signals: served from the cache until invalidated
+        for path in ('/api/profiles/', '/api/async/profiles/'):
+            self.assertEqual(self.counts(path), [1000])
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_users([self.user.id])
+        for path in ('/api/profiles/', '/api/async/profiles/'):
+            self.assertEqual(self.counts(path), [2000])
+
+    def test_unchanged_response_revalidates_with_304(self):
+        for path in ('/api/insights/', '/api/async/insights/'):
+            etag = self.client.get(path)['ETag']
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            with self.captureOnCommitCallbacks(execute=True):
+                invalidate_users([self.user.id])
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], DB_REPLICA_PIN_SECONDS=10)
+class ReplicaRoutingTests(TestCase):
+    """Read replica routing and the primary pins of written users"""
+
+    def setUp(self):
+        cache.clear()
+
+    def read_alias(self, user_id):
+        with replica_reads(user_id) as alias:
+            self.assertEqual(router.db_for_read(SocialMediaProfile), alias or 'default')
+            self.assertEqual(router.db_for_write(SocialMediaProfile), 'default')
+        return alias
+
+    async def aread_alias(self, user_id):
+        async with areplica_reads(user_id) as alias:
+            return alias
+
+    def test_reads_go_to_a_replica(self):
+        self.assertIn(self.read_alias(1), ['replica1', 'replica2'])
+        self.assertIn(asyncio.run(self.aread_alias(1)), ['replica1', 'replica2'])
+        self.assertEqual(router.db_for_read(SocialMediaProfile), 'default')
+
+    def test_written_user_reads_from_the_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_users([1])
+        self.assertIsNone(self.read_alias(1))
+        self.assertIsNone(asyncio.run(self.aread_alias(1)))
+        self.assertIn(self.read_alias(2), ['replica1', 'replica2'])
+
+
+class MilestoneAlertTests(TestCase):
+    """Each threshold alerts once, however often and concurrently sweeps see it"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(
+            user=self.user, platform=PlatformChoice.TWITTER, username='grower'
+        )
+        self.alert_settings = AlertSettings.objects.create(
+            profile=self.profile, milestone_followers=1000, milestone_step=500
+        )
+        Milestone.objects.create(profile=self.profile, threshold=1200)
+
+    def sweep(self, old_count, new_count):
+        queue_milestone_alerts([(self.profile, old_count, new_count)], {self.profile.id: self.alert_settings})
+        return sorted(AlertNotification.objects.values_list('milestone_followers', flat=True))
+
+    def test_second_sweep_with_the_same_counts_raises_nothing(self):
+        self.assertEqual(self.sweep(900, 1600), [1000, 1200, 1500])
+        self.assertEqual(self.sweep(900, 1600), [1000, 1200, 1500])
+
+    def test_jump_alerts_the_highest_multiple_and_spends_the_ones_below(self):
+        self.assertEqual(self.sweep(1600, 3100), [3000])
+        self.sweep(3100, 1950)
+        self.assertEqual(self.sweep(1950, 2050), [3000])
+        self.assertEqual(self.sweep(3100, 3600), [3000, 3500])
+
+    def test_threshold_claimed_by_a_concurrent_sweep_is_not_claimed_again(self):
+        crossed = find_crossed_milestones([(self.profile, 900, 1600)], {self.profile.id: self.alert_settings})
+        self.assertEqual(len(mark_milestones_fired(crossed)), 3)
+        # A second sweep matched the same counts before the first one committed
+        self.assertEqual(mark_milestones_fired(crossed), [])
+
+    def test_fired_custom_threshold_can_be_removed(self):
+        self.sweep(1100, 1300)
+        self.client.force_login(self.user)
+        response = self.client.put(
+            f'/api/alerts/{self.alert_settings.id}/', {'milestones': [1400]}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['milestones'], [1400])
+        self.assertEqual(self.sweep(1300, 1450), [1200, 1400])
+
+
+class BulkAlertSettingsTests(TestCase):
+    """POST /api/alerts/bulk/: one result per item, whatever the items hold"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', password='pw')
+        self.first = SocialMediaProfile.objects.create(user=user, platform=PlatformChoice.TWITTER, username='first')
+        self.second = SocialMediaProfile.objects.create(user=user, platform=PlatformChoice.TWITTER, username='second')
+        AlertSettings.objects.create(profile=self.first, milestone_followers=1000, telegram_chat_id='42')
+        self.client.force_login(user)
+
+    def post(self, items, **extra):
+        response = self.client.post('/api/alerts/bulk/', items, content_type='application/json', **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_profile_named_by_id_and_by_name(self):
+        data = self.post([
+            {'profile_id': self.first.id, 'platform': 'twitter', 'username': 'first', 'milestone_step': 100},
+            {'profile_id': self.first.id, 'platform': 'twitter', 'username': 'second', 'milestone_followers': 5},
+            {'profile_id': self.second.id, 'username': 'second', 'milestone_followers': 5},
+        ])
+        self.assertEqual((data['created'], data['updated'], data['errors']), (0, 1, 2))
+        self.assertEqual(data['results'][0], {'index': 0, 'status': 'updated', 'id': self.first.alert_settings.id})
+        self.assertIn('non_field_errors', data['results'][1]['errors'])
+        self.assertIn('non_field_errors', data['results'][2]['errors'])
+        self.assertFalse(AlertSettings.objects.filter(profile=self.second).exists())
+
+    def test_partial_update_keeps_the_other_fields(self):
+        data = self.client.post(
+            '/api/alerts/bulk/',
+            'platform,username,milestone_step,milestones\ntwitter,first,500,1500;2500\ntwitter,second,10,\n',
+            content_type='text/csv',
+        ).json()
+        self.assertEqual([result['status'] for result in data['results']], ['updated', 'error'])
+        self.assertEqual(data['results'][1]['errors'], {'milestone_followers': ['This field is required.']})
+        alert = AlertSettings.objects.get(profile=self.first)
+        self.assertEqual(
+            (alert.milestone_followers, alert.milestone_step, alert.telegram_chat_id), (1000, 500, '42')
+        )
+        self.assertEqual(
+            sorted(self.first.milestones.filter(is_custom=True).values_list('threshold', flat=True)), [1500, 2500]
+        )
+
+
+class EngagementInsightsQueryTests(QueryBudgetMixin, TestCase):
+    """Insights are served from rollups: the queries do not grow with the profiles"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user('owner', password='pw')
+        self.add_profiles(2)
+        self.client.force_login(self.user)
+
+    def add_profiles(self, count):
+        start = self.user.profiles.count()
+        profiles = [
+            SocialMediaProfile.objects.create(
+                user=self.user, platform=PlatformChoice.TWITTER, username=f'p{number}', current_follower_count=growth(0)
+            )
+            for number in range(start, start + count)
+        ]
+        for profile in profiles:
+            record_history(profile, self.now, hours=30)
+        rebuild_rollups([profile.id for profile in profiles], self.now)
+
+    def test_insights_within_budget(self):
+        self.assertQueryBudget('/api/insights/')
+        self.assertQueryBudget(f'/api/insights/{self.user.profiles.first().id}/')
+
+    def test_insights_queries_constant_in_profile_count(self):
+        response = self.assertConstantQueries('/api/insights/', lambda: self.add_profiles(20))
+        self.assertEqual(len(response.json()), 22)
+        self.assertEqual({row['follower_change_24h'] for row in response.json()}, {240})
+
+
+class InsightsRollupTests(TestCase):
+    """Rollups kept up to date poll by poll match a rebuild from history"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(
+            user=user, platform=PlatformChoice.TWITTER, username='grower', current_follower_count=growth(0)
+        )
+
+    def rollup(self):
+        return ProfileInsightsRollup.objects.filter(profile=self.profile).values(*ROLLUP_FIELDS[:-1]).get()
+
+    def test_refreshed_rollup_matches_a_rebuild(self):
+        # Polled hourly up to three hours ago, then every hour since
+        record_history(
+            self.profile, self.now - timedelta(hours=3), hours=30, count=lambda hours_ago: growth(hours_ago + 3)
+        )
+        refresh_rollups([self.profile.id], [], self.now - timedelta(hours=3))
+        for hours_ago in (2, 1, 0):
+            at = self.now - timedelta(hours=hours_ago)
+            history = FollowerCountHistory.objects.create(profile=self.profile, follower_count=growth(hours_ago))
+            FollowerCountHistory.objects.filter(id=history.id).update(recorded_at=at)
+            history.recorded_at = at
+            refresh_rollups([self.profile.id], [history], at)
+        refreshed = self.rollup()
+
+        rebuild_rollups([self.profile.id], self.now)
+        self.assertEqual(refreshed, self.rollup())
+        self.assertEqual(refreshed['baseline_count'], growth(24))
+        self.assertEqual([point['follower_count'] for point in refreshed['recent_history']], [
+            growth(hours_ago) for hours_ago in range(10)
+        ])
+
+    def test_rebuild_command_backfills_missing_rollups(self):
+        record_history(self.profile, self.now, hours=30)
+        self.assertFalse(ProfileInsightsRollup.objects.exists())
+        call_command('rebuild_insights_rollups', stdout=StringIO())
+        self.assertEqual(self.rollup()['baseline_count'], growth(24))
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class ChangePointHistoryTests(TestCase):
+    """History written only on change answers like history written on every poll"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user('owner', password='pw')
+        self.client.force_login(self.user)
+        # Polled every 10 minutes for two days: +3 every two hours, -5 every nine
+        polls = [
+            (self.now - timedelta(minutes=minutes), 1000 + (2880 - minutes) // 120 * 3 - (2880 - minutes) // 540 * 5)
+            for minutes in range(2880, -1, -10)
+        ]
+        always = SocialMediaProfile.objects.create(
+            user=self.user, platform=PlatformChoice.TWITTER, username='always', current_follower_count=polls[-1][1]
+        )
+        on_change = SocialMediaProfile.objects.create(
+            user=self.user, platform=PlatformChoice.INSTAGRAM, username='on_change', current_follower_count=polls[-1][1]
+        )
+        insert_history_rows((always.id, count, at) for at, count in polls)
+        recorded = []
+        with self.settings(FOLLOWER_HISTORY_WRITE_MODE='on_change', FOLLOWER_HISTORY_HEARTBEAT_SECONDS=6 * 3600):
+            for at, count in polls:
+                if should_record_history((recorded[-1][1], recorded[-1][0]) if recorded else None, count, at):
+                    recorded.append((at, count))
+        insert_history_rows((on_change.id, count, at) for at, count in recorded)
+        rebuild_rollups([always.id, on_change.id], self.now)
+        self.profiles = {'always': always, 'on_change': on_change}
+
+    def test_far_fewer_rows_are_written(self):
+        always, on_change = (
+            FollowerCountHistory.objects.filter(profile=self.profiles[name]).count() for name in ('always', 'on_change')
+        )
+        self.assertEqual(always, 289)
+        self.assertLess(on_change * 5, always)
+
+    def test_changes_over_any_period_are_the_same(self):
+        profiles = SocialMediaProfile.objects.filter(user=self.user)
+        for hours in (1, 3, 6, 24, 36):
+            since = self.now - timedelta(hours=hours, minutes=5)
+            changes = {
+                row['username']: (row['old_count'], row['new_count'])
+                for row in follower_changes(profiles, since, history_tiers(since, self.now, watermarks()))
+            }
+            self.assertEqual(changes['on_change'], changes['always'], hours)
+            increases, decreases = top_follower_changes(profiles, since, self.now, limit=2)
+            top = {row['username']: row['follower_change'] for row in increases + decreases}
+            self.assertEqual(top.get('on_change'), top.get('always'), hours)
+
+    def test_24h_insights_are_the_same(self):
+        rows = {row['username']: row for row in self.client.get('/api/insights/').json()}
+        self.assertEqual(rows['on_change']['follower_change_24h'], rows['always']['follower_change_24h'])
+        self.assertNotEqual(rows['always']['follower_change_24h'], 0)
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class CursorPaginationTests(TestCase):
+    """Keyset pages and the streaming history export"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(
+            user=self.user, platform=PlatformChoice.TWITTER, username='grower'
+        )
+        record_history(self.profile, self.now, hours=49)
+        other = SocialMediaProfile.objects.create(
+            user=User.objects.create_user('other', password='pw'), platform=PlatformChoice.TWITTER, username='other'
+        )
+        record_history(other, self.now, hours=5)
+        self.client.force_login(self.user)
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append(data['results'])
+            url = data['next']
+        return pages
+
+    def test_history_pages_cover_every_row_once_newest_first(self):
+        expected = [growth(hours_ago) for hours_ago in range(50)]
+        for prefix in ('/api/', '/api/async/'):
+            pages = self.walk(f'{prefix}profiles/{self.profile.id}/history/?page_size=20')
+            self.assertEqual([len(page) for page in pages], [20, 20, 10])
+            self.assertEqual([row['follower_count'] for page in pages for row in page], expected)
+
+    def test_pages_do_not_shift_when_rows_are_added(self):
+        first = self.client.get(f'/api/profiles/{self.profile.id}/history/?page_size=20').json()
+        insert_history_rows([(self.profile.id, 99999, self.now + timedelta(minutes=1))])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(
+            [row['follower_count'] for row in second['results']], [growth(hours_ago) for hours_ago in range(20, 40)]
+        )
+
+    def test_notifications_sent_together_are_ordered_by_id(self):
+        AlertNotification.objects.bulk_create([
+            AlertNotification(
+                profile=self.profile, milestone_followers=1000, follower_count_at_alert=1000 + number,
+                message=f'Milestone {number}', delivery_status=DeliveryStatusChoice.SKIPPED,
+            )
+            for number in range(5)
+        ])
+        AlertNotification.objects.update(sent_at=self.now)
+        ids = list(AlertNotification.objects.order_by('-id').values_list('id', flat=True))
+        for prefix in ('/api/', '/api/async/'):
+            pages = self.walk(f'{prefix}notifications/?page_size=2')
+            self.assertEqual([row['id'] for page in pages for row in page], ids)
+
+    def test_export_streams_the_users_history(self):
+        response = self.client.get('/api/history/export/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(lines), 50)
+        self.assertEqual({line['username'] for line in lines}, {'grower'})
+        self.assertEqual([line['follower_count'] for line in lines[:2]], [growth(49), growth(48)])
+
+        response = self.client.get('/api/history/export/', {'output': 'csv', 'profile_id': self.profile.id})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], 'profile_id,platform,username,follower_count,recorded_at')
+        self.assertEqual(len(rows), 51)
+        self.assertEqual(self.client.get('/api/history/export/', {'output': 'xml'}).status_code, 400)
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class FollowerSeriesTests(TestCase):
+    """Hourly series of a reading every 15 minutes for a day, up and down within each hour"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(
+            user=self.user, platform=PlatformChoice.TWITTER, username='grower'
+        )
+        start = floor_to(self.now, BucketResolutionChoice.HOUR) - timedelta(hours=23)
+        # Per hour: 1000 + 10 * hour, then +5, -3, +8
+        self.readings = [
+            (start + timedelta(minutes=15 * quarter), 1000 + 10 * (quarter // 4) + (0, 5, -3, 8)[quarter % 4])
+            for quarter in range(24 * 4)
+            if start + timedelta(minutes=15 * quarter) <= self.now
+        ]
+        insert_history_rows((self.profile.id, count, at) for at, count in self.readings)
+        self.client.force_login(self.user)
+
+    def series(self, **query):
+        response = self.client.get(f'/api/profiles/{self.profile.id}/series/', {'window': '24h', **query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def expected(self):
+        hours = {}
+        for at, count in self.readings:
+            hours.setdefault(floor_to(at, BucketResolutionChoice.HOUR), []).append(count)
+        return [
+            (format_timestamp(hour), counts[0], min(counts), max(counts), counts[-1], len(counts))
+            for hour, counts in sorted(hours.items())
+        ]
+
+    def points(self, data):
+        return [
+            tuple(point[field] for field in ('bucket_start', *SERIES_FIELDS)) for point in data['points']
+        ]
+
+    def test_hourly_buckets_aggregate_the_raw_readings(self):
+        data = self.series()
+        self.assertEqual((data['bucket'], data['truncated']), ('hour', False))
+        self.assertEqual(self.points(data), self.expected())
+
+    def test_compacted_hours_give_the_same_series(self):
+        compact_hourly(max_buckets=1000, now=self.now - timedelta(hours=6))
+        compacted_until = floor_to(self.now - timedelta(hours=6), BucketResolutionChoice.HOUR)
+        self.assertEqual(watermarks()[BucketResolutionChoice.HOUR], compacted_until)
+        self.assertEqual(self.points(self.series()), self.expected())
+
+    @override_settings(SERIES_MAX_TAIL_ROWS=10)
+    def test_rows_read_are_capped(self):
+        data = self.series()
+        self.assertTrue(data['truncated'])
+        self.assertEqual(sum(point['samples'] for point in data['points']), 10)
+        self.assertEqual(self.points(data)[-1], self.expected()[-1])
+
+    def test_windows_with_too_many_buckets_are_rejected(self):
+        for query in ({'window': '100d', 'bucket': 'hour'}, {'window': '1001d', 'bucket': 'day'}, {'bucket': 'week'}):
+            response = self.client.get(f'/api/profiles/{self.profile.id}/series/', query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('bucket', response.json())
+
+
+class TelegramStub(BaseHTTPRequestHandler):
+    """Bot API sendMessage stand-in: records each message, fails the chats in ``server.failing``"""
+
+    def do_POST(self):
+        message = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.received.append((time.monotonic(), self.path, message))
+        if message['chat_id'] in self.server.failing:
+            status, body = 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+        else:
+            status, body = 200, {'ok': True, 'result': {}}
+        reply = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TelegramOutboxTests(TestCase):
+    """Outbox delivery against a local stub of the Bot API"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), TelegramStub)
+        self.server.received = []
+        self.server.failing = set()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(user=user, platform=PlatformChoice.TWITTER, username='grower')
+
+    def notify(self, *chat_ids):
+        AlertNotification.objects.bulk_create([
+            AlertNotification(
+                profile=self.profile,
+                milestone_followers=1000,
+                follower_count_at_alert=1000 + number,
+                message=f'Milestone {number}',
+                telegram_chat_id=chat_id,
+                delivery_status=DeliveryStatusChoice.PENDING,
+            )
+            for number, chat_id in enumerate(chat_ids)
+        ])
+
+    def outbox(self, **options):
+        host, port = self.server.server_address
+        with self.settings(TELEGRAM_BOT_TOKEN='123:stub', TELEGRAM_API_URL=f'http://{host}:{port}'):
+            return TelegramOutbox(service=TelegramNotificationService(), **options)
+
+    def test_sent_notification_is_marked_sent(self):
+        self.notify('1', '2')
+        self.assertEqual(self.outbox().drain(), {'sent': 2, 'retried': 0, 'failed': 0})
+        self.assertEqual(
+            sorted((path, message['chat_id'], message['text']) for _, path, message in self.server.received),
+            [('/bot123:stub/sendMessage', '1', 'Milestone 0'), ('/bot123:stub/sendMessage', '2', 'Milestone 1')]
+        )
+        self.assertEqual(
+            set(AlertNotification.objects.values_list('delivery_status', 'telegram_sent', 'delivery_attempts')),
+            {(DeliveryStatusChoice.SENT, True, 1)}
+        )
+
+    def test_failed_send_is_kept_for_retry(self):
+        self.server.failing.add('1')
+        self.notify('1')
+        outbox = self.outbox(backoff=60)
+        self.assertEqual(outbox.send_batch(), {'sent': 0, 'retried': 1, 'failed': 0})
+        notification = AlertNotification.objects.get()
+        self.assertEqual(notification.delivery_status, DeliveryStatusChoice.PENDING)
+        self.assertEqual((notification.delivery_attempts, notification.telegram_sent), (1, False))
+        self.assertEqual(notification.last_error, 'Internal Server Error')
+        self.assertGreater(notification.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        # Not due again until the backoff has passed
+        self.assertEqual(outbox.send_batch(), {'sent': 0, 'retried': 0, 'failed': 0})
+        self.assertEqual(len(self.server.received), 1)
+
+    def test_global_rate_limit_spaces_sends(self):
+        # 10 a second, bursting up to 10: the last 10 of 20 messages take a second
+        self.notify(*(str(chat_id) for chat_id in range(20)))
+        self.assertEqual(self.outbox(concurrency=4, global_rate=10).drain()['sent'], 20)
+        times = sorted(received_at for received_at, _, _ in self.server.received)
+        self.assertGreaterEqual(times[-1] - times[0], 0.9)
+        self.assertLess(times[9] - times[0], 0.5)
+
+    def test_claim_outlasts_a_rate_limited_batch(self):
+        # 30 messages to one chat at 1 a second take half a minute before any request time
+        self.notify(*['1'] * 30, '2')
+        outbox = self.outbox(concurrency=4, global_rate=30, chat_rate=1)
+        now = timezone.now()
+        claimed = outbox.claim(100, now)
+        self.assertEqual(len(claimed), 31)
+        self.assertGreaterEqual(claimed[0].next_attempt_at, now + timedelta(seconds=CLAIM_SECONDS + 30 + 8 * 10))
+        # Nothing left for a concurrent sender
+        self.assertEqual(outbox.claim(100, now + timedelta(seconds=CLAIM_SECONDS + 60)), [])
+
+
+class BatchedSweepTests(TestCase):
+    """The batched sweep records what the per-profile legacy sweep records"""
+
+    def setUp(self):
+        # Both sweeps read the same instant of the mock trajectories
+        at = MockSocialMediaService.EPOCH + 30 * 86400
+        self.service = MockSocialMediaService(seed=1, clock=lambda: at)
+        self.profiles = []
+        for user_number in range(2):
+            user = User.objects.create_user(f'owner{user_number}', password='pw')
+            for platform in (PlatformChoice.TWITTER, PlatformChoice.INSTAGRAM):
+                for number in range(3):
+                    profile = SocialMediaProfile.objects.create(
+                        user=user, platform=platform, username=f'account{user_number}{number}'
+                    )
+                    count = self.service.get_follower_count(platform, profile.username)['follower_count']
+                    # One profile in three crosses its milestone_followers
+                    AlertSettings.objects.create(
+                        profile=profile, milestone_followers=count // 2 if number % 2 else count * 2,
+                        milestone_step=100,
+                    )
+                    self.profiles.append(profile)
+
+    def reset(self):
+        FollowerCountHistory.objects.all().delete()
+        AlertNotification.objects.all().delete()
+        Milestone.objects.all().delete()
+        SocialMediaProfile.objects.update(current_follower_count=0, last_checked=None)
+
+    def recorded(self):
+        return (
+            dict(SocialMediaProfile.objects.values_list('id', 'current_follower_count')),
+            sorted(FollowerCountHistory.objects.values_list('profile_id', 'follower_count')),
+            sorted(AlertNotification.objects.values_list(
+                'profile_id', 'milestone_followers', 'follower_count_at_alert'
+            )),
+            set(SocialMediaProfile.objects.filter(last_checked__isnull=True).values_list('id', flat=True)),
+        )
+
+    def test_batched_sweep_matches_the_legacy_sweep(self):
+        with mock.patch('engagement_api.tasks.mock_social_service', self.service):
+            check_follower_counts()
+        legacy = self.recorded()
+        self.assertEqual(len(legacy[1]), len(self.profiles))
+        # A step multiple for every profile, milestone_followers for a third of them
+        self.assertEqual(len(legacy[2]), len(self.profiles) + len(self.profiles) // 3)
+        self.assertEqual(legacy[3], set())
+
+        self.reset()
+        stats = check_follower_counts_batched(batch_size=4, fetch_engine=FollowerFetchEngine(self.service))
+        self.assertEqual(self.recorded(), legacy)
+        self.assertEqual((stats['profiles'], stats['chunks'], stats['errors']), (len(self.profiles), 3, 0))
+        self.assertEqual(stats['alerts'], len(legacy[2]))
+
+
+class AdaptiveScheduleTests(TestCase):
+    """Per-profile polling intervals and due-order polling"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.schedule = AdaptiveSchedule(interval=300, min_interval=60, max_interval=3600)
+
+    def delay(self, old_count, new_count, last_delay=300, milestone=None):
+        profile = SocialMediaProfile(
+            last_checked=self.now - timedelta(seconds=300),
+            next_check_at=self.now - timedelta(seconds=300) + timedelta(seconds=last_delay),
+        )
+        return self.schedule.next_delay(profile, old_count, new_count, milestone, self.now)
+
+    def test_unchanged_profiles_back_off_up_to_the_maximum(self):
+        self.assertEqual(self.delay(1000, 1000), 600)
+        self.assertEqual(self.delay(1000, 1000, last_delay=1200), 2400)
+        self.assertEqual(self.delay(1000, 1000, last_delay=2400), 3600)
+
+    def test_changing_profiles_use_the_interval_and_fast_movers_half_of_it(self):
+        self.assertEqual(self.delay(1000, 1001), 300)
+        # 2% in one interval
+        self.assertEqual(self.delay(1000, 1020), 150)
+
+    def test_profiles_approaching_their_milestone_are_polled_sooner(self):
+        # 1 follower a minute, 10 short: twice before the crossing, in 5 minutes
+        self.assertEqual(self.delay(995, 1000, milestone=1010), 300)
+        self.assertEqual(self.delay(995, 1000, milestone=1004), 120)
+        self.assertEqual(self.delay(995, 1000, milestone=1001), 60)
+        self.assertEqual(self.delay(995, 1000, milestone=2000), 300)
+
+    def test_scheduler_polls_due_profiles_in_due_order(self):
+        user = User.objects.create_user('owner', password='pw')
+        due_in = {'late': -60, 'later': -600, 'future': 600}
+        profiles = {
+            name: SocialMediaProfile.objects.create(
+                user=user, platform=PlatformChoice.TWITTER, username=name,
+                next_check_at=self.now + timedelta(seconds=seconds)
+            )
+            for name, seconds in due_in.items()
+        }
+        polled = []
+
+        def process_chunk(chunk):
+            polled.append([profile.username for profile in chunk])
+            for profile in chunk:
+                profile.next_check_at = timezone.now() + timedelta(seconds=300)
+            SocialMediaProfile.objects.bulk_update(chunk, ['next_check_at'])
+            return [profile.id for profile in chunk]
+
+        scheduler = DueTimeScheduler(process_chunk, batch_size=1)
+        self.assertEqual(scheduler.run_due(), 2)
+        self.assertEqual(polled, [['later'], ['late']])
+        # Both rescheduled five minutes out, ahead of the profile due in ten
+        self.assertEqual(scheduler.run_due(), 0)
+        self.assertAlmostEqual(scheduler.seconds_until_due(), 300, delta=5)
+        self.assertEqual(
+            SocialMediaProfile.objects.get(id=profiles['future'].id).next_check_at, profiles['future'].next_check_at
+        )
+
+
+class FlakyBatchBackend(SocialMediaBackend):
+    """Batches of up to three accounts: fails 'broken', leaves 'missing' out of its response"""
+
+    max_batch_size = 3
+
+    def __init__(self):
+        self.batches = []
+
+    def get_follower_counts(self, platform, usernames):
+        usernames = list(usernames)
+        self.batches.append((platform, usernames))
+        results = {username: {'follower_count': 100 + len(username)} for username in usernames if username != 'missing'}
+        if 'broken' in results:
+            results['broken'] = SocialMediaServiceError('Not found')
+        return results
+
+
+class BatchLookupTests(TestCase):
+    """Per-platform batch lookups and the history rows read back after COPY"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', password='pw')
+        names = {PlatformChoice.TWITTER: ['a', 'bb', 'broken', 'ccc', 'missing'], PlatformChoice.INSTAGRAM: ['a']}
+        self.profiles = [
+            SocialMediaProfile.objects.create(user=user, platform=platform, username=username)
+            for platform, usernames in names.items()
+            for username in usernames
+        ]
+
+    def test_failures_are_mapped_back_to_their_profiles(self):
+        backend = FlakyBatchBackend()
+        stats = new_sweep_stats()
+        with redirect_stdout(StringIO()):
+            checked_ids = process_profile_chunk(
+                self.profiles, stats, FollowerFetchEngine(backend, concurrency=1, max_retries=0, batch_size=10)
+            )
+        self.assertEqual(sorted(len(usernames) for _, usernames in backend.batches), [1, 2, 3])
+        self.assertEqual((stats['api_calls'], stats['errors'], stats['profiles']), (3, 2, 4))
+        counts = dict(SocialMediaProfile.objects.values_list('username', 'current_follower_count').filter(
+            id__in=checked_ids, platform=PlatformChoice.TWITTER
+        ))
+        self.assertEqual(counts, {'a': 101, 'bb': 102, 'ccc': 103})
+        self.assertFalse(
+            FollowerCountHistory.objects.filter(profile__username__in=['broken', 'missing']).exists()
+        )
+
+    def test_rows_written_with_copy_are_read_back(self):
+        def copy(cursor, table, columns, rows):
+            # COPY is PostgreSQL only: write the same rows with INSERTs
+            insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES (%s, %s, %s)"
+            adapt = connection.ops.adapt_datetimefield_value
+            cursor.executemany(insert, [(profile_id, count, adapt(at)) for profile_id, count, at in rows])
+
+        now = timezone.now()
+        # Earlier rows of the same profiles are not read back
+        insert_history_rows((profile.id, 1, now - timedelta(hours=1)) for profile in self.profiles)
+        counts = [(self.profiles[number % len(self.profiles)].id, number) for number in range(COPY_MIN_ROWS)]
+        with mock.patch('engagement_api.ingest.copy_supported', return_value=True), \
+                mock.patch('engagement_api.ingest._copy', side_effect=copy):
+            history = create_history(counts, now)
+        self.assertEqual(sorted((row.profile_id, row.follower_count) for row in history), sorted(counts))
+        self.assertTrue(all(row.id and row.recorded_at == now for row in history))
+
+
+class ProfileStateWriteTests(TestCase):
+    """Sweeper writes of polled profiles: narrow, coalesced, and invisible to updated_at"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        user = User.objects.create_user('owner', password='pw')
+        for number in range(3):
+            SocialMediaProfile.objects.create(
+                user=user, platform=PlatformChoice.TWITTER, username=f'p{number}', current_follower_count=1000
+            )
+        self.profiles = list(SocialMediaProfile.objects.order_by('id'))
+        self.updated_at = {profile.id: profile.updated_at for profile in self.profiles}
+
+    def poll(self, new_counts, due_in):
+        checked = []
+        for profile, new_count, seconds in zip(self.profiles, new_counts, due_in):
+            checked.append((profile, profile.current_follower_count, new_count))
+            profile.current_follower_count = new_count
+            profile.next_check_at = self.now + timedelta(seconds=seconds)
+        with CaptureQueriesContext(connection) as queries:
+            write_profile_state(checked, self.now)
+        return len(queries)
+
+    def test_only_changed_counts_are_written(self):
+        # Stands in for an API edit the sweep must not overwrite with a count it did not change
+        SocialMediaProfile.objects.filter(username='p2').update(current_follower_count=1500)
+        self.assertEqual(self.poll([1100, 1000, 1000], [300] * 3), 2)
+        self.assertEqual(
+            list(SocialMediaProfile.objects.order_by('id').values_list('current_follower_count', flat=True)),
+            [1100, 1000, 1500]
+        )
+        self.assertEqual(
+            set(SocialMediaProfile.objects.values_list('last_checked', 'next_check_at')),
+            {(self.now, self.now + timedelta(seconds=300))}
+        )
+
+    def test_updated_at_is_left_alone(self):
+        self.assertEqual(self.poll([1100, 1000, 900], [300, 600, 900]), 3)
+        self.assertEqual(dict(SocialMediaProfile.objects.values_list('id', 'updated_at')), self.updated_at)
+        self.assertEqual(
+            list(SocialMediaProfile.objects.order_by('id').values_list('next_check_at', flat=True)),
+            [self.now + timedelta(seconds=seconds) for seconds in (300, 600, 900)]
+        )
+
+    def test_unchanged_chunk_writes_one_statement(self):
+        self.assertEqual(self.poll([1000] * 3, [300] * 3), 1)
+
+
+class ClaimDueProfilesTests(TestCase):
+    """Worker mode leases"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', password='pw')
+        SocialMediaProfile.objects.bulk_create([
+            SocialMediaProfile(user=user, platform=PlatformChoice.TWITTER, username=f'p{number}') for number in range(5)
+        ])
+        SocialMediaProfile.objects.filter(username='p4').update(next_check_at=timezone.now() + timedelta(hours=1))
+
+    def test_workers_claim_disjoint_due_profiles(self):
+        first_token, first = claim_due_profiles('first', 3)
+        second_token, second = claim_due_profiles('second', 3)
+        self.assertEqual([profile.username for profile in first], ['p0', 'p1', 'p2'])
+        self.assertEqual([profile.username for profile in second], ['p3'])
+        self.assertEqual({profile.lease_token for profile in first}, {first_token})
+        self.assertEqual(claim_due_profiles('third', 3)[1], [])
+
+        release_profiles(first_token, [first[0].id])
+        self.assertEqual([profile.username for profile in claim_due_profiles('third', 3)[1]], ['p0'])
+
+
+class LiveEventTests(TestCase):
+    """Publishing and pruning of the live event table"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', password='pw')
+        self.profile = SocialMediaProfile.objects.create(user=user, platform=PlatformChoice.TWITTER, username='grower')
+
+    def test_nothing_is_published_by_default(self):
+        publish_counts([(self.profile, 10, 20)], timezone.now())
+        self.assertFalse(LiveEvent.objects.exists())
+
+    @override_settings(LIVE_EVENTS=True, LIVE_EVENT_RETENTION_SECONDS=60)
+    def test_expired_events_are_pruned(self):
+        publish_counts([(self.profile, 10, 20)], timezone.now())
+        event = LiveEvent.objects.get()
+        self.assertEqual(event.payload['profiles'][0]['follower_change'], 10)
+        self.assertEqual(prune_live_events(), 0)
+        self.assertEqual(prune_live_events(now=event.created_at + timedelta(seconds=61)), 1)
+
+
+@override_settings(LIVE_POLL_INTERVAL=0.05, LIVE_HEARTBEAT_SECONDS=60)
+class LiveEventStreamTests(TransactionTestCase):
+    """Delivery through the hub; committed rows, since the hub reads on its own connection"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw')
+
+    def publish(self, event_id):
+        return sync_to_async(LiveEvent.objects.create)(
+            id=event_id, user=self.user, kind=LiveEventKindChoice.COUNTS, payload={'n': event_id},
+        )
+
+    async def receive(self, event_ids, last_event_id=None):
+        stream = event_stream(self.user.id, last_event_id)
+        received = []
+        try:
+            await anext(stream)
+            # Let the hub read the latest id before anything is published
+            await asyncio.sleep(0.2)
+            for event_id in event_ids:
+                await self.publish(event_id)
+                received.append(await asyncio.wait_for(anext(stream), timeout=5))
+        finally:
+            await stream.aclose()
+        return received
+
+    def test_late_commit_of_a_lower_id_is_delivered(self):
+        received = asyncio.run(self.receive([10, 5]))
+        self.assertTrue(received[0].startswith('id: 10\n'))
+        self.assertTrue(received[1].startswith('id: 5\n'))
+
+
+class MockSocialMediaServiceTests(TestCase):
+    """Deterministic mock trajectories"""
+
+    def test_counts_depend_on_the_seed_only(self):
+        at = MockSocialMediaService.EPOCH + 30 * 86400
+        counts = {
+            seed: [MockSocialMediaService(seed=seed).get_follower_count('twitter', 'grower', at=at)['follower_count']
+                   for _ in range(2)]
+            for seed in (1, 2)
+        }
+        self.assertEqual(counts[1][0], counts[1][1])
+        self.assertNotEqual(counts[1][0], counts[2][0])
+
+    def test_service_is_not_kept_alive_by_the_cache(self):
+        service = MockSocialMediaService(seed=3)
+        service.get_follower_count('twitter', 'grower')
+        reference = weakref.ref(service)
+        del service
+        gc.collect()
+        self.assertIsNone(reference())
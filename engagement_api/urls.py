@@ -1,11 +1,27 @@
 from django.urls import path
+from .async_views import (
+    AsyncProfileListView,
+    AsyncProfileDetailView,
+    AsyncEngagementInsightsView,
+    AsyncTopFollowerInsightsView,
+    AsyncAlertNotificationsView,
+    AsyncFollowerHistoryView,
+    LiveEventsView,
+)
 from .views import (
     ProfileRegisterView,
+    ProfileBulkView,
     ProfileDetailView,
     AlertSettingsView,
+    AlertSettingsBulkView,
     EngagementInsightsView,
     TopFollowerInsightsView,
+    FollowerAnalyticsView,
     AlertNotificationsView,
+    FollowerHistoryView,
+    FollowerSeriesView,
+    FollowerHistoryExportView,
+    MetricsView,
 )
 
 app_name = 'engagement_api'
@@ -13,19 +29,48 @@ app_name = 'engagement_api'
 urlpatterns = [
     # Profile endpoints
     path('profiles/', ProfileRegisterView.as_view(), name='profile-list'),
+    path('profiles/bulk/', ProfileBulkView.as_view(), name='profile-bulk'),
     path('profiles/<int:profile_id>/', ProfileDetailView.as_view(), name='profile-detail'),
+    path('profiles/<int:profile_id>/history/', FollowerHistoryView.as_view(), name='profile-history'),
+    path('profiles/<int:profile_id>/series/', FollowerSeriesView.as_view(), name='profile-series'),
+    
+    # History export endpoint
+    path('history/export/', FollowerHistoryExportView.as_view(), name='history-export'),
     
     # Alert settings endpoints
     path('alerts/', AlertSettingsView.as_view(), name='alert-list'),
+    path('alerts/bulk/', AlertSettingsBulkView.as_view(), name='alert-bulk'),
     path('alerts/<int:alert_id>/', AlertSettingsView.as_view(), name='alert-detail'),
     
     # Insights endpoints
     path('insights/', EngagementInsightsView.as_view(), name='insights-list'),
     path('insights/<int:profile_id>/', EngagementInsightsView.as_view(), name='insights-detail'),
     path('insights/top/', TopFollowerInsightsView.as_view(), name='top-insights'),
+    path('insights/analytics/', FollowerAnalyticsView.as_view(), name='analytics-list'),
+    path('insights/analytics/<int:profile_id>/', FollowerAnalyticsView.as_view(), name='analytics-detail'),
     
     # Notifications endpoint
     path('notifications/', AlertNotificationsView.as_view(), name='notifications-list'),
     path('notifications/<int:notification_id>/', AlertNotificationsView.as_view(), name='notification-detail'),
-]
+    
+    # Request metrics (staff only)
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+
+    # Async read endpoints, for the ASGI server
+    path('async/profiles/', AsyncProfileListView.as_view(), name='async-profile-list'),
+    path('async/profiles/<int:profile_id>/', AsyncProfileDetailView.as_view(), name='async-profile-detail'),
+    path(
+        'async/profiles/<int:profile_id>/history/', AsyncFollowerHistoryView.as_view(), name='async-profile-history'
+    ),
+    path('async/insights/', AsyncEngagementInsightsView.as_view(), name='async-insights-list'),
+    path('async/insights/<int:profile_id>/', AsyncEngagementInsightsView.as_view(), name='async-insights-detail'),
+    path('async/insights/top/', AsyncTopFollowerInsightsView.as_view(), name='async-top-insights'),
+    path('async/notifications/', AsyncAlertNotificationsView.as_view(), name='async-notifications-list'),
+    path(
+        'async/notifications/<int:notification_id>/', AsyncAlertNotificationsView.as_view(),
+        name='async-notification-detail'
+    ),
 
+    # Live count updates and notifications, Server-Sent Events
+    path('async/events/', LiveEventsView.as_view(), name='async-events'),
+]
@@ -1,26 +1,39 @@
-from datetime import timedelta
-
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import (
-    SocialMediaProfile, AlertSettings,
-    FollowerCountHistory, AlertNotification
+from .analytics import DEFAULT_ANALYTICS_PERIOD, DEFAULT_ANALYTICS_WINDOW, profile_analytics
+from .bulk import CSVParser, JSONLinesParser, bulk_items, upsert_alert_settings, upsert_profiles
+from .caching import cache_user_response
+from .export import EXPORT_FORMATS, export_lines, history_rows
+from .insights import DEFAULT_TOP_PERIOD, parse_limit, parse_period, top_follower_changes
+from .instrumentation import metrics
+from .models import SocialMediaProfile, AlertSettings, FollowerCountHistory, AlertNotification
+from .pagination import (
+    CursorPaginatedMixin, ProfileCursorPagination, NotificationCursorPagination, HistoryCursorPagination
+)
+from .payloads import (
+    HISTORY_FIELDS, history_payload, insights_payload, insights_rows, notification_payload, notification_rows
 )
+from .routing import read_from_replica
+from .series import DEFAULT_SERIES_WINDOW, follower_series, parse_bucket, series_payload
 from .serializers import (
-    SocialMediaProfileSerializer, AlertSettingsSerializer,
+    SocialMediaProfileSerializer, AlertSettingsSerializer, BulkAlertSettingsSerializer,
     EngagementInsightsSerializer, TopFollowerInsightsSerializer,
     AlertNotificationSerializer, FollowerCountHistorySerializer
 )
 
 
-class ProfileRegisterView(APIView):
+class ProfileRegisterView(CursorPaginatedMixin, APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 3
     serializer_class = SocialMediaProfileSerializer
+    pagination_class = ProfileCursorPagination
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -38,7 +51,7 @@ class ProfileRegisterView(APIView):
         if not created:
             profile.current_follower_count = serializer.validated_data.get(
                 'current_follower_count', profile.current_follower_count)
-            profile.save()
+            profile.save(update_fields=['current_follower_count', 'updated_at'])
 
         response_serializer = self.serializer_class(profile)
         return Response(
@@ -46,18 +59,34 @@ class ProfileRegisterView(APIView):
             status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
         )
 
+    @cache_user_response
+    @read_from_replica
     def get(self, request):
-        profiles = SocialMediaProfile.objects.filter(user=request.user)
-        serializer = self.serializer_class(profiles, many=True)
-        return Response(serializer.data)
+        return self.paginate(SocialMediaProfile.objects.filter(user=request.user).select_related('user'))
+
+
+class ProfileBulkView(APIView):
+    """
+    Register or update many profiles at once: a JSON array, CSV or JSON
+    Lines body, or such a file uploaded as ``file``. Returns a result per
+    item (see bulk.py).
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, CSVParser, JSONLinesParser, MultiPartParser]
+    serializer_class = SocialMediaProfileSerializer
+
+    def post(self, request):
+        return Response(upsert_profiles(request.user, bulk_items(request), self.serializer_class()))
 
 
 class ProfileDetailView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 3
     serializer_class = SocialMediaProfileSerializer
 
+    @read_from_replica
     def get(self, request, profile_id):
-        profile = get_object_or_404(SocialMediaProfile, id=profile_id, user=request.user)
+        profile = get_object_or_404(SocialMediaProfile.objects.select_related('user'), id=profile_id, user=request.user)
         serializer = self.serializer_class(profile)
         return Response(serializer.data)
 
@@ -76,6 +105,7 @@ class ProfileDetailView(APIView):
 
 class AlertSettingsView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 4
     serializer_class = AlertSettingsSerializer
 
     def post(self, request):
@@ -88,24 +118,29 @@ class AlertSettingsView(APIView):
 
         profile = get_object_or_404(SocialMediaProfile, id=profile_id, user=request.user)
 
-        alert_settings, created = AlertSettings.objects.get_or_create(profile=profile, defaults=request.data)
+        alert_settings = AlertSettings.objects.filter(profile=profile).first()
 
-        if not created:
+        if alert_settings:
             serializer = self.serializer_class(alert_settings, data=request.data, partial=True)
             serializer.is_valid(raise_exception=True)
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
 
-        serializer = self.serializer_class(alert_settings)
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(profile=profile)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def get(self, request, alert_id=None):
+        alerts = AlertSettings.objects.filter(profile__user=request.user).select_related(
+            'profile__user'
+        ).prefetch_related('profile__milestones')
+
         if alert_id:
-            alert = get_object_or_404(AlertSettings, id=alert_id, profile__user=request.user)
+            alert = get_object_or_404(alerts, id=alert_id)
             serializer = self.serializer_class(alert)
             return Response(serializer.data)
 
-        alerts = AlertSettings.objects.filter(profile__user=request.user)
         serializer = self.serializer_class(alerts, many=True)
         return Response(serializer.data)
 
@@ -117,107 +152,71 @@ class AlertSettingsView(APIView):
         return Response(serializer.data)
 
 
+class AlertSettingsBulkView(APIView):
+    """
+    Create or update the alert settings of many profiles at once, each item
+    naming its profile by ``profile_id`` or by ``platform`` and ``username``.
+    Accepts the same bodies as ProfileBulkView.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, CSVParser, JSONLinesParser, MultiPartParser]
+    serializer_class = BulkAlertSettingsSerializer
+
+    def post(self, request):
+        return Response(upsert_alert_settings(request.user, bulk_items(request), self.serializer_class(partial=True)))
+
+
 class EngagementInsightsView(APIView):
+    """
+    Served from ProfileInsightsRollup, so both the list and the detail
+    endpoint take a single query regardless of how many profiles a user has;
+    the payload is built from ``.values()`` rows (see payloads.py)
+    """
     permission_classes = [IsAuthenticated]
     serializer_class = EngagementInsightsSerializer
+    query_budget = 3
 
+    @cache_user_response
+    @read_from_replica
     def get(self, request, profile_id=None):
+        rows = insights_rows(SocialMediaProfile.objects.filter(user=request.user))
+        # The profiles are always the request user's
+        owner = request.user.username
+
         if profile_id:
-            profile = get_object_or_404(SocialMediaProfile, id=profile_id, user=request.user)
-            insights_data = self._calculate_insights(profile)
-            serializer = self.serializer_class(insights_data)
-            return Response(serializer.data)
+            return Response(insights_payload(get_object_or_404(rows, id=profile_id), owner))
 
         # Get insights for all profiles
-        profiles = SocialMediaProfile.objects.filter(user=request.user)
-        insights_list = [self._calculate_insights(profile) for profile in profiles]
-        serializer = self.serializer_class(insights_list, many=True)
-        return Response(serializer.data)
-
-    def _calculate_insights(self, profile):
-        # Get follower count 24 hours ago
-        twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
-
-        old_record = FollowerCountHistory.objects.filter(profile=profile,
-                                                         recorded_at__lte=twenty_four_hours_ago).first()
-
-        old_count = old_record.follower_count if old_record else profile.current_follower_count
-        current_count = profile.current_follower_count
-
-        follower_change = current_count - old_count
-        follower_change_percentage = ((follower_change / old_count * 100) if old_count > 0 else 0)
-
-        # Get recent history (last 10 records)
-        recent_history = FollowerCountHistory.objects.filter(profile=profile)[:10]
-
-        # Serialize recent history
-        history_serializer = FollowerCountHistorySerializer(recent_history, many=True)
-
-        return {
-            'profile_id': profile.id,
-            'username': profile.username,
-            'platform': profile.platform,
-            'current_follower_count': current_count,
-            'last_checked': profile.last_checked,
-            'follower_change_24h': follower_change,
-            'follower_change_percentage_24h': round(follower_change_percentage, 2),
-            'recent_history': history_serializer.data
-        }
+        return Response([insights_payload(row, owner) for row in rows])
 
 
 class TopFollowerInsightsView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 5
     serializer_class = TopFollowerInsightsSerializer
 
+    @cache_user_response
+    @read_from_replica
     def get(self, request):
-        """Get top follower insights"""
-        twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
-
-        # Get all profiles for the user
-        profiles = SocialMediaProfile.objects.filter(user=request.user)
-
-        top_increases = []
-        top_decreases = []
-
-        for profile in profiles:
-            # Get oldest and newest records in last 24 hours
-            history_24h = FollowerCountHistory.objects.filter(
-                profile=profile,
-                recorded_at__gte=twenty_four_hours_ago
-            )
-
-            if history_24h.count() >= 2:
-                oldest = history_24h.first()
-                newest = history_24h.last()
-
-                change = newest.follower_count - oldest.follower_count
-                change_percentage = (
-                    (change / oldest.follower_count * 100) if oldest.follower_count > 0 else 0
-                )
-
-                insight_data = {
-                    'profile_id': profile.id,
-                    'username': profile.username,
-                    'platform': profile.platform,
-                    'follower_change': change,
-                    'follower_change_percentage': round(change_percentage, 2),
-                    'old_count': oldest.follower_count,
-                    'new_count': newest.follower_count
-                }
-
-                if change > 0:
-                    top_increases.append(insight_data)
-                elif change < 0:
-                    top_decreases.append(insight_data)
-
-        # Sort and get top 5
-        top_increases = sorted(top_increases, key=lambda x: x['follower_change'], reverse=True)[:5]
-        top_decreases = sorted(top_decreases, key=lambda x: x['follower_change'])[:5]
+        """
+        Get top follower insights
+        Accepts ``period`` (e.g. ``24h``, ``7d``; default 24h) and ``limit`` (default 5)
+        """
+        period, period_label = parse_period(request.query_params.get('period', DEFAULT_TOP_PERIOD))
+        limit = parse_limit(request.query_params.get('limit'))
+
+        now = timezone.now()
+        top_increases, top_decreases = top_follower_changes(
+            SocialMediaProfile.objects.filter(user=request.user),
+            since=now - period,
+            now=now,
+            limit=limit
+        )
 
         data = {
             'top_increases': top_increases,
             'top_decreases': top_decreases,
-            'period': '24 hours'
+            'period': period_label
         }
 
         serializer = self.serializer_class(data=data)
@@ -225,23 +224,152 @@ class TopFollowerInsightsView(APIView):
         return Response(serializer.data)
 
 
-class AlertNotificationsView(APIView):
+class FollowerAnalyticsView(APIView):
+    """
+    Growth rates, moving averages, anomalies and milestone projections,
+    computed with NumPy over the history of all the user's profiles at once
+    (see analytics.py); the detail endpoint adds the point by point series
+    """
+    permission_classes = [IsAuthenticated]
+    query_budget = 5
+
+    @cache_user_response
+    @read_from_replica
+    def get(self, request, profile_id=None):
+        """
+        Accepts ``period`` (default 7d), the history analysed, and ``window``
+        (default 24h), the span of the moving averages and growth rates
+        """
+        period, period_label = parse_period(request.query_params.get('period', DEFAULT_ANALYTICS_PERIOD))
+        window, window_label = parse_period(request.query_params.get('window', DEFAULT_ANALYTICS_WINDOW), 'window')
+
+        profiles = SocialMediaProfile.objects.filter(user=request.user)
+        if profile_id:
+            profiles = profiles.filter(id=profile_id)
+        now = timezone.now()
+        resolution, payloads = profile_analytics(
+            profiles, since=now - period, window=window, now=now, series=bool(profile_id)
+        )
+
+        data = {'period': period_label, 'window': window_label, 'resolution': resolution}
+        if profile_id:
+            if not payloads:
+                raise Http404
+            return Response({**data, **payloads[0]})
+        return Response({**data, 'profiles': payloads})
+
+
+class AlertNotificationsView(CursorPaginatedMixin, APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 3
     serializer_class = AlertNotificationSerializer
+    pagination_class = NotificationCursorPagination
 
+    @cache_user_response
+    @read_from_replica
     def get(self, request, notification_id=None):
-        if notification_id:
-            notification = get_object_or_404(
-                AlertNotification,
-                id=notification_id,
-                profile__user=request.user
-            )
-            serializer = self.serializer_class(notification)
-            return Response(serializer.data)
-
         # Get all notifications for user's profiles
-        notifications = AlertNotification.objects.filter(
+        notifications = notification_rows(AlertNotification.objects.filter(
             profile__user=request.user
+        ))
+
+        if notification_id:
+            return Response(notification_payload(get_object_or_404(notifications, id=notification_id)))
+
+        return self.paginate(notifications, notification_payload)
+
+
+class FollowerHistoryView(CursorPaginatedMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    query_budget = 4
+    serializer_class = FollowerCountHistorySerializer
+    pagination_class = HistoryCursorPagination
+
+    @cache_user_response
+    @read_from_replica
+    def get(self, request, profile_id):
+        profile = get_object_or_404(SocialMediaProfile.objects.select_related('user'), id=profile_id, user=request.user)
+        label = str(profile)
+        return self.paginate(
+            FollowerCountHistory.objects.filter(profile=profile).values(*HISTORY_FIELDS),
+            lambda row: history_payload(row, label)
         )
-        serializer = self.serializer_class(notifications, many=True)
-        return Response(serializer.data)
+
+
+class FollowerSeriesView(APIView):
+    """
+    Follower counts of a profile in hourly or daily buckets, for charts
+    Read from the compacted buckets plus the database-side aggregation of
+    what is not compacted yet, so the rows read stay bounded whatever the
+    window (see series.py)
+    """
+    permission_classes = [IsAuthenticated]
+    query_budget = 7
+
+    @cache_user_response
+    @read_from_replica
+    def get(self, request, profile_id):
+        """
+        Accepts ``window`` (e.g. ``1h``, ``30d``; default 7d) and ``bucket``
+        (``hour`` or ``day``; default the finest one that fits)
+        """
+        window, window_label = parse_period(request.query_params.get('window', DEFAULT_SERIES_WINDOW), 'window')
+        bucket = parse_bucket(request.query_params.get('bucket'), window)
+        profile = get_object_or_404(SocialMediaProfile.objects.only('id'), id=profile_id, user=request.user)
+
+        now = timezone.now()
+        points, truncated = follower_series(profile.id, now - window, bucket, now)
+        return Response({
+            'profile_id': profile.id,
+            'window': window_label,
+            'bucket': bucket,
+            'truncated': truncated,
+            'points': [series_payload(point) for point in points],
+        })
+
+
+class FollowerHistoryExportView(APIView):
+    """
+    Streams the user's follower history as JSON Lines (``output=jsonl``, the
+    default) or CSV (``output=csv``), optionally for a single ``profile_id``.
+    The parameter is not called ``format``, DRF uses that to pick a renderer.
+    """
+    permission_classes = [IsAuthenticated]
+    query_budget = 4
+
+    def perform_content_negotiation(self, request, force=False):
+        # The export is not rendered by DRF, so never refuse it over the Accept header
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        output = request.query_params.get('output', 'jsonl')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'output': [f"Use one of: {', '.join(EXPORT_FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        history = FollowerCountHistory.objects.filter(profile__user=request.user)
+        profile_id = request.query_params.get('profile_id')
+        if profile_id:
+            if not profile_id.isdigit():
+                return Response({'profile_id': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+            profile = get_object_or_404(SocialMediaProfile, id=profile_id, user=request.user)
+            history = history.filter(profile=profile)
+
+        content_type, extension = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(export_lines(output, history_rows(history)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="follower-history.{extension}"'
+        return response
+
+
+class MetricsView(APIView):
+    """Per-view request metrics of this process, see instrumentation.py"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+    def delete(self, request):
+        metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
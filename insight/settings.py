@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'engagement_api.instrumentation.InstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'insight.urls'
@@ -78,12 +80,75 @@ WSGI_APPLICATION = 'insight.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default, for single-node use. Set DB_ENGINE=postgresql (needs the
+# psycopg package) to let the sweeper workers and the API write concurrently
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite').lower()
+if DB_ENGINE in ('postgres', 'postgresql'):
+    # With DB_POOL each process keeps a psycopg connection pool; Django's
+    # persistent connections (CONN_MAX_AGE) cannot be combined with it
+    DB_POOL = os.getenv('DB_POOL', 'False').lower() in ('true', '1', 'yes')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'insight'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', ''),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME') or BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # WAL lets API reads run while the sweeper writes; writers take the
+                # lock up front (IMMEDIATE) and wait for it instead of failing
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.getenv('DB_TIMEOUT', '20')),
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-65536;'
+                    'PRAGMA mmap_size=268435456;'
+                ),
+            },
+        }
     }
-}
+
+# Read replicas of the default database, comma separated: host[:port] of each
+# PostgreSQL replica, or the file of each SQLite copy. The read-only endpoints
+# read from them, see engagement_api.routing
+DB_REPLICAS = [replica.strip() for replica in os.getenv('DB_REPLICAS', '').split(',') if replica.strip()]
+DATABASE_REPLICAS = []
+for index, replica in enumerate(DB_REPLICAS, start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        # Tests read the test database through the replica alias too
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[alias]['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES['default']['PORT'])
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['engagement_api.routing.ReplicaRouter']
+# Seconds a user reads from the primary after their data was written, cover the replication lag
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', '10'))
 
 
 # Password validation
@@ -140,5 +205,103 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Cache: per-process local memory by default. Set CACHE_REDIS_URL to share the
+# cache between web processes and the polling task (needs the redis package);
+# response caching and replica pins rely on it, since the task's invalidations
+# cannot reach the web processes' local memory
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'engagement-api',
+        }
+    }
+if DATABASE_REPLICAS and not CACHE_REDIS_URL:
+    # Pins set by the polling task would never reach the web processes, whose
+    # users would then read replicas that have not caught up with their writes
+    raise ImproperlyConfigured('DB_REPLICAS needs a shared cache for its pins, set CACHE_REDIS_URL.')
+# Seconds read endpoint responses are cached per user, 0 disables caching.
+# Off without a shared cache: a local memory cache would serve responses the
+# polling task has invalidated. Only set it then for a single process setup
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', '300' if CACHE_REDIS_URL else '0'))
+
+# Request instrumentation: per-view query counts and timings, served at
+# /api/metrics/ (staff only). Server-Timing headers reveal them to every
+# client, so they are only sent in DEBUG unless enabled explicitly
+API_INSTRUMENTATION = os.getenv('API_INSTRUMENTATION', 'True').lower() in ('true', '1', 'yes')
+API_SERVER_TIMING = os.getenv('API_SERVER_TIMING', str(DEBUG)).lower() in ('true', '1', 'yes')
+
 # Telegram Bot Settings (optional - for production)
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', None)
+# Bot API base URL, point it at a local stub server for testing
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+# Outbox delivery (send_notifications command): concurrent requests, messages
+# per second overall and per chat, attempts before giving up and the base
+# delay in seconds for exponential retry backoff
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv('TELEGRAM_SEND_CONCURRENCY', '4'))
+TELEGRAM_GLOBAL_RATE_LIMIT = float(os.getenv('TELEGRAM_GLOBAL_RATE_LIMIT', '30'))
+TELEGRAM_CHAT_RATE_LIMIT = float(os.getenv('TELEGRAM_CHAT_RATE_LIMIT', '1'))
+TELEGRAM_MAX_ATTEMPTS = int(os.getenv('TELEGRAM_MAX_ATTEMPTS', '5'))
+TELEGRAM_RETRY_BACKOFF = float(os.getenv('TELEGRAM_RETRY_BACKOFF', '30'))
+
+# Follower count fetching
+# Number of concurrent lookups made by the sweeper
+FOLLOWER_FETCH_CONCURRENCY = int(os.getenv('FOLLOWER_FETCH_CONCURRENCY', '8'))
+# Accounts looked up per API call, capped by what the backend accepts
+FOLLOWER_FETCH_BATCH_SIZE = int(os.getenv('FOLLOWER_FETCH_BATCH_SIZE', '100'))
+FOLLOWER_FETCH_MAX_RETRIES = int(os.getenv('FOLLOWER_FETCH_MAX_RETRIES', '3'))
+# Base delay in seconds for exponential retry backoff
+FOLLOWER_FETCH_BACKOFF = float(os.getenv('FOLLOWER_FETCH_BACKOFF', '0.5'))
+# Requests per second allowed per platform, 0 means unlimited
+FOLLOWER_FETCH_RATE_LIMITS = {
+    'twitter': float(os.getenv('TWITTER_RATE_LIMIT', '0')),
+    'instagram': float(os.getenv('INSTAGRAM_RATE_LIMIT', '0')),
+}
+
+# Mock social media service fault injection (seconds per call, failure probability)
+MOCK_SOCIAL_LATENCY = float(os.getenv('MOCK_SOCIAL_LATENCY', '0'))
+MOCK_SOCIAL_ERROR_RATE = float(os.getenv('MOCK_SOCIAL_ERROR_RATE', '0'))
+# Mock batch lookups: accounts per call, extra seconds and failure probability per account
+MOCK_SOCIAL_BATCH_SIZE = int(os.getenv('MOCK_SOCIAL_BATCH_SIZE', '100'))
+MOCK_SOCIAL_ITEM_LATENCY = float(os.getenv('MOCK_SOCIAL_ITEM_LATENCY', '0'))
+MOCK_SOCIAL_ITEM_ERROR_RATE = float(os.getenv('MOCK_SOCIAL_ITEM_ERROR_RATE', '0'))
+# Mock follower trajectories are a function of this seed and the time, the model
+# is one of growth, decay, spike or mixed
+MOCK_SOCIAL_SEED = int(os.getenv('MOCK_SOCIAL_SEED', '0'))
+MOCK_SOCIAL_MODEL = os.getenv('MOCK_SOCIAL_MODEL', 'mixed')
+
+# Follower history retention: raw points are kept for this many days (at least 2,
+# the insights endpoints read the last 24h from raw points), hourly buckets for
+# FOLLOWER_HISTORY_HOURLY_RETENTION_DAYS, daily buckets forever
+FOLLOWER_HISTORY_RAW_RETENTION_DAYS = max(2, int(os.getenv('FOLLOWER_HISTORY_RAW_RETENTION_DAYS', '7')))
+FOLLOWER_HISTORY_HOURLY_RETENTION_DAYS = int(os.getenv('FOLLOWER_HISTORY_HOURLY_RETENTION_DAYS', '90'))
+
+# Follower history write mode: 'always' records every poll, 'on_change' only
+# records when the count moved by at least FOLLOWER_HISTORY_MIN_DELTA or the
+# last recorded point is older than FOLLOWER_HISTORY_HEARTBEAT_SECONDS
+FOLLOWER_HISTORY_WRITE_MODE = os.getenv('FOLLOWER_HISTORY_WRITE_MODE', 'always')
+FOLLOWER_HISTORY_MIN_DELTA = int(os.getenv('FOLLOWER_HISTORY_MIN_DELTA', '1'))
+FOLLOWER_HISTORY_HEARTBEAT_SECONDS = int(os.getenv('FOLLOWER_HISTORY_HEARTBEAT_SECONDS', '3600'))
+# Most rows of not yet compacted history a series request aggregates
+SERIES_MAX_TAIL_ROWS = int(os.getenv('SERIES_MAX_TAIL_ROWS', '5000'))
+# Bulk endpoints: most items per request, items written per transaction
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '10000'))
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '500'))
+
+# Live event stream (/api/async/events/): whether the sweeper publishes
+# events (off by default), seconds between each web process's poll for new
+# events, idle heartbeat interval, how long events are kept for reconnecting
+# clients, and events buffered per connection
+LIVE_EVENTS = os.getenv('LIVE_EVENTS', 'False').lower() in ('true', '1', 'yes')
+LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', '1'))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv('LIVE_HEARTBEAT_SECONDS', '15'))
+LIVE_EVENT_RETENTION_SECONDS = int(os.getenv('LIVE_EVENT_RETENTION_SECONDS', '3600'))
+LIVE_QUEUE_SIZE = int(os.getenv('LIVE_QUEUE_SIZE', '100'))